@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Compare :func:`pie.filter.emojify.emojify_text` with ``emoji.emojize``.
+
+Large Markdown documents are generated with ``--codes`` emoji codes per
+thousand words (``0`` for pages without any) and converted by both, with and
+without their colons. Both must return the same text; the best time of
+``--rounds`` is reported, and the time per call for a short definition.
+
+``--cold`` times the first call in fresh processes instead, which is what
+the one-process-per-page make pipeline pays: once with an empty cache
+directory and once with the emoji name characters already cached.
+
+Example::
+
+    python benchmarks/bench_emojify.py --words 50000 --codes 0 1 20
+    python benchmarks/bench_emojify.py --cold
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import emoji  # noqa: E402
+
+from pie.filter.emojify import emoji_names, emojify_text  # noqa: E402
+
+WORDS = "the of a to in bone muscle joint nerve see `code` **bold** [link](/a.html)".split()
+# Colons that are not emoji codes, once every 200 words.
+OTHER = ["https://example.com/a", "10:30", "Note:"]
+
+
+def document(words: int, codes: int, rng: random.Random) -> str:
+    names = sorted(emoji_names())
+    parts = []
+    for i in range(words):
+        if codes and rng.random() < codes / 1000:
+            parts.append(rng.choice(names))
+        elif rng.random() < 1 / 200:
+            parts.append(rng.choice(OTHER))
+        else:
+            parts.append(rng.choice(WORDS))
+        if i % 12 == 11:
+            parts.append("\n\n" if i % 120 == 119 else "\n")
+    return " ".join(parts)
+
+
+def best(function, text: str, rounds: int) -> float:
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function(text)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+COLD_TEXTS = ["Note: see https://example.com/a at 10:30", "A *bone* of the arm :muscle:"]
+COLD_CALLS = {
+    "emojize": "import emoji\nf = lambda t: emoji.emojize(t, language='alias')",
+    "emojify_text": "from pie.filter.emojify import emojify_text as f",
+}
+COLD_SCRIPT = """
+import sys, time
+{setup}
+start = time.perf_counter()
+f(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+
+def first_call(call: str, text: str, cache_dir: str) -> float:
+    """Return the time of the first *call* on *text* in a new process."""
+
+    env = dict(os.environ, PIE_CACHE_DIR=cache_dir)
+    env.pop("PIE_NO_CACHE", None)
+    out = subprocess.run(
+        [sys.executable, "-c", COLD_SCRIPT.format(setup=COLD_CALLS[call]), text],
+        cwd=Path(__file__).resolve().parents[1],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(out)
+
+
+def cold(rounds: int) -> None:
+    for text in COLD_TEXTS:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            empty = first_call("emojify_text", text, cache_dir)
+            reference = min(first_call("emojize", text, cache_dir) for _ in range(rounds))
+            fast = min(first_call("emojify_text", text, cache_dir) for _ in range(rounds))
+        print(
+            f"{text[:28]:30} emojize {reference * 1000:7.2f} ms"
+            f"  emojify_text {fast * 1000:7.2f} ms ({empty * 1000:.2f} ms empty cache)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=50_000)
+    parser.add_argument("--codes", type=int, nargs="+", default=[0, 1, 20])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--cold", action="store_true", help="time first calls in new processes")
+    args = parser.parse_args()
+    if args.cold:
+        cold(args.rounds)
+        return
+
+    start = time.perf_counter()
+    emoji_names()
+    print(f"name table built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    rng = random.Random(0)
+    for codes in args.codes:
+        text = document(args.words, codes, rng)
+        for variant in (text, text.replace(":", "")):
+            if emojify_text(variant) != emoji.emojize(variant, language="alias"):
+                raise SystemExit("emojify_text differs from emoji.emojize")
+            reference = best(lambda t: emoji.emojize(t, language="alias"), variant, args.rounds)
+            fast = best(emojify_text, variant, args.rounds)
+            label = f"{codes}/1000 codes" + ("" if variant is text else ", no colons")
+            print(
+                f"{label:24} {len(variant) / 1024:7.0f} KiB  emojize {reference * 1000:8.2f} ms"
+                f"  emojify_text {fast * 1000:8.2f} ms  {reference / fast:6.1f}x"
+            )
+    short = "A *bone* of the arm :muscle: see the note."
+    calls = 10_000
+    reference = best(lambda t: [emoji.emojize(t, language="alias") for _ in range(calls)], short, 3)
+    fast = best(lambda t: [emojify_text(t) for _ in range(calls)], short, 3)
+    print(
+        f"{'short definition':24} {'':12}  emojize {reference / calls * 1e6:8.2f} us"
+        f"  emojify_text {fast / calls * 1e6:8.2f} us  {reference / fast:6.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Measure template load time with and without the Jinja bytecode cache.
+
+Each round builds a fresh environment, as a new ``render-html`` process
+would, and loads every ``.jinja`` template under ``--templates`` (default
+``/press/templates``) with no bytecode cache, then with a warm
+:class:`pie.render.jinja.BytecodeCache` in a temporary directory, then
+through a :class:`pie.render.jinja.compiled.CompiledLoader` over templates
+compiled with ``pie templates compile``. Imported modules are dropped from
+``sys.modules`` between rounds.
+
+Example::
+
+    python benchmarks/bench_jinja_bytecode.py --rounds 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.pop("PIE_NO_CACHE", None)
+
+from jinja2 import Environment, FileSystemLoader  # noqa: E402
+
+from pie.render import jinja  # noqa: E402
+from pie.render.jinja.compiled import CompiledLoader, compile_templates  # noqa: E402
+
+
+def load_all(
+    directory: str,
+    names: list[str],
+    cache: jinja.BytecodeCache | None,
+    compiled: str | None = None,
+) -> float:
+    for module in [m for m in sys.modules if m.startswith("_jinja2_module_templates_")]:
+        del sys.modules[module]
+    loader = FileSystemLoader(directory)
+    if compiled is not None:
+        loader = CompiledLoader(compiled, loader)
+    env = Environment(loader=loader, bytecode_cache=cache, lstrip_blocks=True)
+    env.filters.update(jinja.env.filters)
+    start = time.perf_counter()
+    for name in names:
+        env.get_template(name)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--templates", default="/press/templates")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    names = Environment(loader=FileSystemLoader(args.templates)).list_templates(
+        extensions=["jinja"]
+    )
+    print(f"{len(names)} templates under {args.templates}")
+
+    cold = min(load_all(args.templates, names, None) for _ in range(args.rounds))
+    with tempfile.TemporaryDirectory() as tmp:
+        load_all(args.templates, names, jinja.BytecodeCache(tmp))
+        warm = min(
+            load_all(args.templates, names, jinja.BytecodeCache(tmp))
+            for _ in range(args.rounds)
+        )
+        env = Environment(loader=FileSystemLoader(args.templates), lstrip_blocks=True)
+        env.filters.update(jinja.env.filters)
+        modules = os.path.join(tmp, "modules")
+        compile_templates(env, modules)
+        imported = min(
+            load_all(args.templates, names, None, modules) for _ in range(args.rounds)
+        )
+    print(f"compile     {cold * 1000:8.2f} ms per process")
+    print(f"bytecode    {warm * 1000:8.2f} ms per process  {cold / warm:5.1f}x")
+    print(f"modules     {imported * 1000:8.2f} ms per process  {cold / imported:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
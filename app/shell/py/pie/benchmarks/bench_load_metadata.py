@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Time metadata loading with an increasing number of worker processes.
+
+Generates ``--docs`` Markdown/YAML pairs and parses them with
+:func:`pie.metadata.load_metadata_pairs` for each value of ``--jobs``,
+printing docs/s and the speed-up over a single process.
+
+Example::
+
+    python benchmarks/bench_load_metadata.py --docs 4000 --jobs 1 2 4 8 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from pie.metadata import load_metadata_pairs
+
+
+def make_site(root: Path, count: int) -> list[Path]:
+    src = root / "src"
+    src.mkdir()
+    paths = []
+    for i in range(count):
+        (src / f"doc{i}.md").write_text(
+            f"---\ntitle: Document {i}\n---\n\n{'Body text. ' * 50}\n",
+            encoding="utf-8",
+        )
+        yml = src / f"doc{i}.yml"
+        yml.write_text(
+            f"doc:\n  author: Author\n  breadcrumbs:\n"
+            f"    - title: Home\n      url: /\n    - title: Doc {i}\n"
+            f"tags: [alpha, beta, gamma]\n",
+            encoding="utf-8",
+        )
+        paths.append(Path("src") / yml.name)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument(
+        "--jobs", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1]
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_site(Path(tmp), args.docs)
+        os.chdir(tmp)
+        baseline = None
+        for jobs in args.jobs:
+            start = time.perf_counter()
+            count = sum(1 for meta in load_metadata_pairs(paths, jobs=jobs) if meta)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"jobs {jobs:3}  {count / elapsed:8.0f} docs/s  "
+                f"speed-up {baseline / elapsed:5.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare metadata store backends on a synthetic index.
+
+Writes ``--docs`` generated documents with each backend and times the index
+write, single-document lookups and a batched ``get_many``. The Redis backend
+uses fakeredis unless ``--host`` points at a real server, in which case the
+database is flushed first.
+
+Example::
+
+    python benchmarks/bench_metadata_store.py --docs 5000
+    python benchmarks/bench_metadata_store.py --host localhost --port 6379
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import fakeredis
+import redis
+from pie.store import MetadataStore, RedisMetadataStore, SqliteMetadataStore
+
+
+def make_index(count: int) -> dict[str, dict[str, Any]]:
+    """Return ``count`` documents shaped like real site metadata."""
+
+    return {
+        f"doc{i}": {
+            "id": f"doc{i}",
+            "title": f"Document {i}",
+            "url": f"/section/doc{i}.html",
+            "citation": f"doc {i}",
+            "tags": ["alpha", "beta", "gamma"][: i % 3 + 1],
+            "doc": {"author": {"name": "Author"}, "pubdate": "Jan 1, 2024"},
+        }
+        for i in range(count)
+    }
+
+
+def _timed(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run(name: str, store: MetadataStore, index: dict, lookups: int) -> None:
+    ids = list(index)
+    sample = random.Random(0).choices(ids, k=lookups)
+
+    write = _timed(lambda: store.write_index(index))
+    single = _timed(lambda: [store.get_document(i) for i in sample])
+    batch = _timed(lambda: store.get_many(sample))
+    print(
+        f"{name:8} write {write:7.3f}s  "
+        f"get {lookups / single:9.0f} docs/s  "
+        f"get_many {lookups / batch:9.0f} docs/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--host", help="Real Redis host instead of fakeredis")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    index = make_index(args.docs)
+    if args.host:
+        conn = redis.Redis(host=args.host, port=args.port, decode_responses=True)
+        conn.flushdb()
+    else:
+        conn = fakeredis.FakeRedis(decode_responses=True)
+    run("redis", RedisMetadataStore(conn), index, args.lookups)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SqliteMetadataStore(Path(tmp) / "metadata.sqlite")
+        run("sqlite", store, index, args.lookups)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Compare one ``render-html`` process per page with ``render-html --batch``.
+
+Generates ``--pages`` Markdown/YAML pages and renders them through the
+``python -m pie.render.html`` command line, first once per page (as the
+per-page picasso rules do) and then with a single batch manifest for each
+value of ``--jobs``. Pages with no metadata lookups are used, so the numbers
+show process start-up and environment set-up costs.
+
+Example::
+
+    python benchmarks/bench_render_batch.py --pages 500 --jobs 1 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TEMPLATE = "{% filter press %}{% include markdown_path with context %}{% endfilter %}"
+
+
+def make_site(root: Path, count: int) -> list[dict[str, str]]:
+    (root / "template.html.jinja").write_text(TEMPLATE, encoding="utf-8")
+    (root / "macros.jinja").write_text(
+        "{% macro anchor(id) %}{% endmacro %}", encoding="utf-8"
+    )
+    manifest = []
+    for i in range(count):
+        (root / f"page{i}.md").write_text(
+            f"---\n---\n# {{{{ title }}}}\n\n{'Body text. ' * 50}\n",
+            encoding="utf-8",
+        )
+        (root / f"page{i}.yml").write_text(f"title: Page {i}\n", encoding="utf-8")
+        manifest.append(
+            {
+                "template": "template.html.jinja",
+                "markdown": f"page{i}.md",
+                "context": f"page{i}.yml",
+                "output": f"page{i}.html",
+            }
+        )
+    return manifest
+
+
+def _command(*args: str) -> list[str]:
+    return [sys.executable, "-m", "pie.render.html", *args]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(Path(__file__).resolve().parents[1]), env.get("PYTHONPATH")])
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = make_site(Path(tmp), args.pages)
+        env["PIE_DATA_DIR"] = tmp
+
+        start = time.perf_counter()
+        for page in manifest:
+            subprocess.run(_command(*page.values()), cwd=tmp, env=env, check=True)
+        per_page = time.perf_counter() - start
+        print(f"per page     {args.pages / per_page:8.1f} pages/s")
+
+        lines = "\n".join(json.dumps(page) for page in manifest)
+        for jobs in args.jobs:
+            start = time.perf_counter()
+            subprocess.run(
+                _command("--batch", "-", "--jobs", str(jobs)),
+                cwd=tmp,
+                env=env,
+                input=lines,
+                text=True,
+                check=True,
+                capture_output=True,
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                f"batch -j {jobs:<3} {args.pages / elapsed:8.1f} pages/s  "
+                f"{per_page / elapsed:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Time a clean ``render-html --batch`` build with a cold and a warm render cache.
+
+Generates the pages of ``bench_render_batch.py`` and renders them with an
+empty :class:`pie.render.cache.RenderCache`, then removes every output, as
+``make clean`` would, and renders them again from the warm cache.
+
+Example::
+
+    python benchmarks/bench_render_cache.py --pages 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from bench_render_batch import _command, make_site
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("PIE_NO_CACHE", None)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(Path(__file__).resolve().parents[1]), env.get("PYTHONPATH")])
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "site"
+        root.mkdir()
+        manifest = make_site(root, args.pages)
+        env["PIE_DATA_DIR"] = str(root)
+        env["PIE_RENDER_CACHE_DIR"] = str(Path(tmp) / "render-cache")
+        lines = "\n".join(json.dumps(page) for page in manifest)
+
+        timings = []
+        for _ in range(2):
+            for page in manifest:
+                for path in (page["output"], page["output"] + ".d"):
+                    (root / path).unlink(missing_ok=True)
+            start = time.perf_counter()
+            subprocess.run(
+                _command("--batch", "-", "--jobs", str(args.jobs)),
+                cwd=root,
+                env=env,
+                input=lines,
+                text=True,
+                check=True,
+                capture_output=True,
+            )
+            timings.append(time.perf_counter() - start)
+        cold, warm = timings
+        print(f"cold cache  {cold:7.2f} s  {args.pages / cold:8.1f} pages/s")
+        print(f"warm cache  {warm:7.2f} s  {args.pages / warm:8.1f} pages/s  {cold / warm:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
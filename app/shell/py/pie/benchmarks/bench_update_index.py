@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Measure update-index peak memory and throughput as the site grows.
+
+For each size in ``--docs`` a directory of generated YAML documents is
+indexed in a fresh subprocess. The subprocess reports its peak RSS and the
+write rate in keys/s, so a streaming index run should show flat memory.
+The SQLite backend is used unless ``--host`` names a Redis server, whose
+database is flushed before every run.
+
+Example::
+
+    python benchmarks/bench_update_index.py --docs 1000 5000 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import redis
+from pie.store import RedisMetadataStore, SqliteMetadataStore
+from pie.update import index as update_index
+
+
+def make_site(root: Path, count: int) -> None:
+    src = root / "src"
+    src.mkdir()
+    for i in range(count):
+        (src / f"doc{i}.yml").write_text(
+            f"title: Document {i}\n"
+            f"tags: [alpha, beta, gamma]\n"
+            f"doc:\n  author: Author\n  summary: {'lorem ipsum ' * 20}\n",
+            encoding="utf-8",
+        )
+
+
+def child(args: argparse.Namespace) -> None:
+    root = Path(args.child)
+    # Source paths are recorded relative to the working directory.
+    os.chdir(root)
+    if args.host:
+        conn = redis.Redis(host=args.host, port=args.port, decode_responses=True)
+        conn.flushdb()
+        store = RedisMetadataStore(conn)
+    else:
+        store = SqliteMetadataStore("metadata.sqlite")
+
+    start = time.perf_counter()
+    paths = update_index.collect_metadata_paths(Path("src"))
+    update_index.update_store(
+        store,
+        update_index.iter_metadata(paths, args.jobs),
+        batch_size=args.batch_size,
+        workers=args.connections,
+    )
+    elapsed = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"keys": store.keys_written, "elapsed": elapsed, "rss": rss}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--host", help="Real Redis host instead of SQLite")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    for count in args.docs:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_site(Path(tmp), count)
+            cmd = [sys.executable, __file__, "--child", tmp]
+            cmd += ["--batch-size", str(args.batch_size)]
+            cmd += ["--connections", str(args.connections)]
+            cmd += ["--jobs", str(args.jobs)]
+            if args.host:
+                cmd += ["--host", args.host, "--port", str(args.port)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{count:7} docs  {result['keys']:8} keys  "
+            f"{result['keys'] / result['elapsed']:9.0f} keys/s  "
+            f"peak RSS {result['rss'] / 1024:7.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,13 @@ Use ``help(pie.<module>)`` to view documentation for any of the individual
 modules.
 """
 
+from importlib.metadata import PackageNotFoundError, version
+
+try:
+    __version__ = version("pie")
+except PackageNotFoundError:  # run from a source tree without installing
+    __version__ = "0+unknown"
+
 __all__ = [
     "filter",
     "metadata",
@@ -0,0 +1,44 @@
+"""The ``pie`` command: subcommands that are not standalone console scripts.
+
+Run ``pie <command> --help`` for the options of each command. ``python -m
+pie`` works the same way.
+"""
+
+from __future__ import annotations
+
+import sys
+from importlib import import_module
+
+#: Subcommand names mapped to their ``module:function`` and a summary.
+COMMANDS: dict[str, tuple[str, str]] = {
+    "build": ("pie.build.scheduler:main", "build the site with the in-process scheduler"),
+    "cache-server": ("pie.cache_server:main", "serve a shared build cache over HTTP"),
+    "templates": ("pie.render.templates:main", "inspect the Jinja templates"),
+}
+
+
+def _usage() -> str:
+    lines = ["usage: pie <command> [options]", "", "commands:"]
+    width = max(map(len, COMMANDS))
+    for name, (_, summary) in COMMANDS.items():
+        lines.append(f"  {name:<{width}}  {summary}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int | None:
+    """Dispatch to the subcommand named by the first argument."""
+
+    args = list(sys.argv[1:] if argv is None else argv)
+    if not args or args[0] in {"-h", "--help"}:
+        print(_usage())
+        return 0
+    if args[0] not in COMMANDS:
+        print(_usage(), file=sys.stderr)
+        print(f"\npie: unknown command {args[0]!r}", file=sys.stderr)
+        return 2
+    module, _, function = COMMANDS[args[0]][0].partition(":")
+    return getattr(import_module(module), function)(args[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,30 +6,53 @@ source root and build root can be overridden via function parameters or
 command–line arguments. The script also emits dependency rules for
 cross-document links and ``include-filter`` directives so that changes to
 referenced files trigger a rebuild.
+
+With ``--batch`` pages are rendered by one ``render-html --batch`` call per
+directory, or per shard of ``--shard-size`` pages, instead of one process per
+page.
+
+With ``--rules DIR`` the rules of each source are written to a fragment of
+their own, made from that source alone, so the makefile only regenerates the
+fragments of the sources that changed.
 """
 
+from __future__ import annotations
+
 import argparse
 import ast
+import json
+import os
 from collections import defaultdict
 import re
 import sys
 from pathlib import Path
-from typing import Callable, Iterable
+from typing import Any, Callable, Iterable, Mapping
 
+from pie.cli import add_cache_argument, add_jobs_argument
+from pie.dependencies import stamp_path
 from pie.logging import logger, add_log_argument, configure_logging
-from pie.metadata import load_metadata_pair
+from pie.metadata import load_metadata_pair, load_metadata_pairs, log_parse_cache_stats
+from pie.utils import batched, write_utf8
 
 # WARNING: picasso generates build rules; cannot rely on redis updates because
 # redis updates rely on the build infrastructure to work
 
-_TEMPLATE_PATH = Path(__file__).parent.parent / "templates" / "picasso.rule.mk.jinja"
-_RULE_TEMPLATE = _TEMPLATE_PATH.read_text()
+_TEMPLATE_DIR = Path(__file__).parent.parent / "templates"
+_PREPROCESS_TEMPLATE = (_TEMPLATE_DIR / "picasso.preprocess.mk.jinja").read_text()
+_RENDER_TEMPLATE = (_TEMPLATE_DIR / "picasso.render.mk.jinja").read_text()
+_BATCH_TEMPLATE = (_TEMPLATE_DIR / "picasso.batch.mk.jinja").read_text()
+
+# Pages per ``render-html --batch`` rule. The manifest is passed inline in the
+# recipe, which the shell receives as one argument of at most 128 KiB.
+DEFAULT_SHARD_SIZE = 200
 
 
 def generate_rule(
     input_path: Path,
     src_root: Path = Path("src"),
     build_root: Path = Path("build"),
+    metadata: Mapping[str, Any] | None = None,
+    render: bool = True,
 ) -> str:
     """Generate a Makefile rule for a given metadata file.
 
@@ -37,6 +60,11 @@ def generate_rule(
         input_path (Path): Path to the source metadata file.
         src_root (Path): Directory that contains the source files.
         build_root (Path): Directory where build artifacts are written.
+        metadata (Mapping | None): Already loaded metadata for
+            ``input_path``. It is loaded with :func:`load_metadata_pair` when
+            omitted.
+        render (bool): Include the rule rendering the HTML page. Batch
+            builds leave it to :func:`generate_batch_rules`.
 
     Returns:
         str: A multi-line string defining the Makefile rule.
@@ -47,36 +75,109 @@ def generate_rule(
         build/foo/bar.yml: src/foo/bar.yml
             $(call status,Preprocess $<)
             $(Q)mkdir -p $(dir build/foo/bar.yml)
-            $(Q)cp $< $@
-        build/foo/bar.html: build/foo/bar.md build/foo/bar.yml $(HTML_TEMPLATE) $(BUILD_DIR)/.process-yamls
-            $(call status,Generate HTML $@)
-            $(Q)render-html --template $(HTML_TEMPLATE) $< $@ -c build/foo/bar.yml
-            $(Q)check-bad-jinja-output $@
+            $(Q)cp $< $@; process-yaml $@
+        build/foo/bar.html.stamp: build/foo/bar.md build/foo/bar.yml $(HTML_TEMPLATE) | $(BUILD_DIR)/.update-index
+            $(call status,Generate HTML build/foo/bar.html)
+            $(Q)render-html $(HTML_TEMPLATE) build/foo/bar.md build/foo/bar.yml build/foo/bar.html
+            $(Q)touch $@
     """
-    # Compute the path of ``input_path`` relative to the source root
-    relative = input_path.relative_to(src_root)
+    if metadata is None:
+        metadata = load_metadata_pair(input_path)
+    page = page_paths(input_path, src_root, build_root, metadata)
+
+    template = _PREPROCESS_TEMPLATE
+    if render:
+        template += "\n" + _RENDER_TEMPLATE
+    rule = template.format(
+        input_path=input_path.as_posix(),
+        preprocess_cmd="cp $< $@; process-yaml $@",
+        **page,
+    )
+    return f"\n{rule}"
 
-    # Build output paths under ``build_root`` while preserving directory layout
-    output_html = (build_root / relative.with_suffix(".html")).as_posix()
-    preprocessed_md = (build_root / relative.with_suffix(".md")).as_posix()
-    preprocessed_yml = (build_root / relative.with_suffix(".yml")).as_posix()
 
-    preprocess_cmd = "cp $< $@; process-yaml $@"
-    metadata = load_metadata_pair(input_path)
+def page_paths(
+    input_path: Path,
+    src_root: Path,
+    build_root: Path,
+    metadata: Mapping[str, Any] | None,
+) -> dict[str, str]:
+    """Return the build paths and template used to render *input_path*."""
+
+    # Build output paths under ``build_root`` while preserving directory layout
+    relative = input_path.relative_to(src_root)
     tmpl = metadata.get("template") if metadata else None
-    template = Path(tmpl).as_posix() if tmpl else None
+    return {
+        "output_html": (build_root / relative.with_suffix(".html")).as_posix(),
+        "preprocessed_md": (build_root / relative.with_suffix(".md")).as_posix(),
+        "preprocessed_yml": (build_root / relative.with_suffix(".yml")).as_posix(),
+        "template_dep": Path(tmpl).as_posix() if tmpl else "$(HTML_TEMPLATE)",
+    }
 
-    template_dep = template or "$(HTML_TEMPLATE)"
 
-    rule = _RULE_TEMPLATE.format(
-        input_path=input_path.as_posix(),
-        preprocessed_yml=preprocessed_yml,
-        output_html=output_html,
-        preprocessed_md=preprocessed_md,
-        template_dep=template_dep,
-        preprocess_cmd=preprocess_cmd,
-    )
-    return f"\n{rule}"
+def _shell_quote(text: str) -> str:
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+def generate_batch_rules(
+    pages: Iterable[tuple[Path, Mapping[str, Any] | None]],
+    src_root: Path = Path("src"),
+    build_root: Path = Path("build"),
+    shard_size: int = DEFAULT_SHARD_SIZE,
+) -> list[str]:
+    """Return grouped-target rules rendering *pages* with ``render-html --batch``.
+
+    *pages* pairs each metadata file with its loaded metadata. Pages are
+    grouped by output directory and split into shards of at most
+    *shard_size*. Each shard is one GNU make 4.3 grouped target (``&:``)
+    whose recipe pipes a JSON Lines manifest to a single warm
+    ``render-html`` process. The targets are the pages' stamps
+    (:func:`pie.dependencies.stamp_path`), as unchanged pages keep their
+    modification time. ``--stale-only`` skips pages rendered since their
+    sources last changed, and the stamps are touched afterwards so make sees
+    the whole shard as up to date.
+    """
+
+    groups: dict[str, list[dict[str, str]]] = defaultdict(list)
+    for input_path, metadata in pages:
+        page = page_paths(input_path, src_root, build_root, metadata)
+        groups[Path(page["output_html"]).parent.as_posix()].append(page)
+
+    rules: list[str] = []
+    for directory in sorted(groups):
+        shards = list(batched(groups[directory], max(1, shard_size)))
+        for number, shard in enumerate(shards, 1):
+            name = directory
+            if len(shards) > 1:
+                name += f" ({number}/{len(shards)})"
+            prerequisites = dict.fromkeys(
+                dep
+                for page in shard
+                for dep in (
+                    page["preprocessed_md"],
+                    page["preprocessed_yml"],
+                    page["template_dep"],
+                )
+            )
+            entries = [
+                json.dumps(
+                    {
+                        "template": page["template_dep"],
+                        "markdown": page["preprocessed_md"],
+                        "context": page["preprocessed_yml"],
+                        "output": page["output_html"],
+                    }
+                )
+                for page in shard
+            ]
+            rule = _BATCH_TEMPLATE.format(
+                stamps=" ".join(stamp_path(page["output_html"]) for page in shard),
+                prerequisites=" ".join(prerequisites),
+                name=name,
+                entries=" \\\n".join(f"\t  {_shell_quote(e)}" for e in entries),
+            )
+            rules.append(f"\n{rule}")
+    return rules
 
 
 LINK_RE = re.compile(r"\{\{\s*[\"']([^\"']+)[\"']\s*\|\s*link[\w]*")
@@ -85,13 +186,28 @@ PY_BLOCK_RE = re.compile(r"```python\n(.*?)```", re.DOTALL)
 INCLUDE_RE = re.compile(r"(include(?:_deflist_entry)?)\(\s*([^)]*)\)")
 
 
-def collect_ids(src_root: Path) -> dict[str, Path]:
-    """Return a mapping of metadata ``id`` values to source files."""
+def _load_metadata(path: Path) -> Mapping[str, Any] | None:
+    """Return metadata for *path*, logging instead of raising on bad input."""
+
+    try:
+        return load_metadata_pair(path)
+    except Exception:
+        logger.warning("Failed to parse metadata", file=str(path))
+        return None
+
+
+def collect_ids(src_root: Path, jobs: int = 1) -> dict[str, Path]:
+    """Return a mapping of metadata ``id`` values to source files.
+
+    Metadata pairs are parsed in ``jobs`` worker processes when greater than
+    one; see :func:`pie.metadata.load_metadata_pairs`.
+    """
 
     id_map: dict[str, Path] = {}
     processed: set[Path] = set()
+    paths: list[Path] = []
 
-    for path in src_root.rglob("*"):
+    for path in sorted(src_root.rglob("*")):
         if path.suffix.lower() not in {".md", ".yml", ".yaml"}:
             continue
 
@@ -99,15 +215,12 @@ def collect_ids(src_root: Path) -> dict[str, Path]:
         if base in processed:
             continue
         processed.add(base)
+        paths.append(path)
 
-        doc_id = None
-        try:
-            metadata = load_metadata_pair(path)
-            if metadata:
-                doc_id = metadata.get("id")
-        except Exception:
-            logger.warning("Failed to parse metadata", file=str(path))
-
+    for path, metadata in zip(
+        paths, load_metadata_pairs(paths, jobs=jobs, loader=_load_metadata)
+    ):
+        doc_id = metadata.get("id") if metadata else None
         if not doc_id:
             doc_id = path.stem
 
@@ -158,13 +271,15 @@ def _resolve_include_paths(
     src_root: Path,
     build_root: Path,
     build_path: Callable[[Path], str],
+    directories: list[Path] | None = None,
 ) -> list[str]:
     """Return dependency rules for an ``include``/``include_deflist_entry`` call.
 
     ``generate_dependencies`` previously inlined this logic; extracting it makes
     the path handling easier to reason about and unit test.  ``func`` is the
     function name (``include`` or ``include_deflist_entry``) and ``arglist`` is
-    the raw argument string captured by ``INCLUDE_RE``.
+    the raw argument string captured by ``INCLUDE_RE``. Included directories
+    and their subdirectories are appended to *directories* when given.
     """
 
     logger.debug(
@@ -209,6 +324,9 @@ def _resolve_include_paths(
         """Yield files referenced by ``path`` (directory or single file)."""
 
         if path.is_dir():
+            if directories is not None:
+                directories.append(path)
+                directories.extend(p for p in path.rglob("*") if p.is_dir())
             pattern = glob if func == "include_deflist_entry" else "*"
             yield from (p for p in path.rglob(pattern) if p.is_file())
         else:
@@ -264,50 +382,77 @@ def _build_path(p: Path, *, src_root: Path, build_root: Path) -> str:
     return out.as_posix()
 
 
-def _file_dependencies(
+def _scan_references(text: str) -> dict[str, list]:
+    """Return the link ids and include calls found in *text*."""
+
+    # Jinja link references like {{"id"|link}} or {{link("id")}}
+    links = LINK_RE.findall(text) + LINK_GLOBAL_RE.findall(text)
+    # ``include-filter`` blocks such as include("file.md")
+    includes = [
+        list(call)
+        for block in PY_BLOCK_RE.findall(text)
+        for call in INCLUDE_RE.findall(block)
+    ]
+    return {"links": links, "includes": includes}
+
+
+def _reference_rules(
     path: Path,
-    text: str,
-    id_map: dict[str, Path],
+    references: Mapping[str, list],
+    id_map: Mapping[str, Path],
     *,
     src_root: Path,
     build_root: Path,
 ) -> set[str]:
-    """Return dependency rules for a single source file."""
+    """Return dependency rules for *references* found in *path*."""
 
     build = lambda p: _build_path(p, src_root=src_root, build_root=build_root)
     src_build = Path(build(path)).with_suffix(path.suffix)
     rules: set[str] = set()
 
-    # Jinja link references like {{"id"|link}} or {{link("id")}}
-    ref_ids = LINK_RE.findall(text) + LINK_GLOBAL_RE.findall(text)
-    for ref_id in ref_ids:
+    for ref_id in references["links"]:
         ref_path = id_map.get(ref_id)
         if ref_path is None:
             continue
         dep_build = Path(build(ref_path)).with_suffix(ref_path.suffix)
         rules.add(f"{src_build.as_posix()}: {dep_build.as_posix()}")
 
-    # ``include-filter`` blocks such as include("file.md")
-    for block in PY_BLOCK_RE.findall(text):
-        for func, arglist in INCLUDE_RE.findall(block):
-            rules.update(
-                _resolve_include_paths(
-                    func,
-                    arglist,
-                    src_build=src_build,
-                    src_root=src_root,
-                    build_root=build_root,
-                    build_path=build,
-                )
+    for func, arglist in references["includes"]:
+        rules.update(
+            _resolve_include_paths(
+                func,
+                arglist,
+                src_build=src_build,
+                src_root=src_root,
+                build_root=build_root,
+                build_path=build,
             )
+        )
 
     return rules
 
 
-def generate_dependencies(src_root: Path, build_root: Path) -> list[str]:
+def _file_dependencies(
+    path: Path,
+    text: str,
+    id_map: dict[str, Path],
+    *,
+    src_root: Path,
+    build_root: Path,
+) -> set[str]:
+    """Return dependency rules for a single source file."""
+
+    return _reference_rules(
+        path, _scan_references(text), id_map, src_root=src_root, build_root=build_root
+    )
+
+
+def generate_dependencies(
+    src_root: Path, build_root: Path, jobs: int = 1
+) -> list[str]:
     """Return Makefile dependency rules based on Jinja links and include blocks."""
 
-    id_map = collect_ids(src_root)
+    id_map = collect_ids(src_root, jobs)
     rules: set[str] = set()
 
     for path in src_root.rglob("*"):
@@ -333,6 +478,179 @@ def generate_dependencies(src_root: Path, build_root: Path) -> list[str]:
     return _remove_circular_dependencies(rules)
 
 
+# Fragments written by ``--rules``, under the rules directory.
+PAGES_DIR = "pages"
+BATCH_DIR = "batch"
+_SOURCE_SUFFIXES = {".md", ".yml", ".yaml"}
+_VARIABLE_CHARS = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.-"
+)
+
+
+def id_variable(doc_id: str) -> str:
+    """Return the make variable holding the source files of *doc_id*.
+
+    Characters make does not allow in a variable name are written as ``+``
+    and the hex digits of their UTF-8 bytes.
+    """
+
+    name = "".join(
+        c if c in _VARIABLE_CHARS else "".join(f"+{b:02X}" for b in c.encode("utf-8"))
+        for c in doc_id
+    )
+    return f"pie_id_{name}"
+
+
+def source_fragment(
+    files: list[Path],
+    metadata: Mapping[str, Any] | None,
+    *,
+    src_root: Path,
+    build_root: Path,
+    target: Path,
+    batch: bool = False,
+) -> str:
+    """Return the rule fragment of one source, made from its own *files*.
+
+    *files* are the Markdown and metadata files sharing a base name and
+    *metadata* their merged metadata. The fragment sets :func:`id_variable`
+    of the document id to *files*, so links are written as
+    ``$$(value pie_id_<id>)`` and resolve through the fragment of the linked
+    source once make has read them all (``.SECONDEXPANSION``). Directories
+    read by ``include`` blocks become prerequisites of *target*, the
+    fragment itself, so adding a file to them writes it again.
+    """
+
+    doc_id = (metadata.get("id") if metadata else None) or files[0].stem
+    parts = [f"{id_variable(str(doc_id))} := {' '.join(f.as_posix() for f in files)}"]
+    parts.extend(
+        generate_rule(f, src_root, build_root, metadata, render=not batch)
+        for f in files
+        if f.suffix.lower() in {".yml", ".yaml"}
+    )
+
+    build = lambda p: _build_path(p, src_root=src_root, build_root=build_root)
+    rules: set[str] = set()
+    directories: list[Path] = []
+    for f in files:
+        try:
+            text = f.read_text(encoding="utf-8")
+        except Exception:
+            logger.warning("Failed to read file", file=str(f))
+            continue
+        references = _scan_references(text)
+        src_build = Path(build(f)).with_suffix(f.suffix)
+        for ref_id in references["links"]:
+            rules.add(f"{src_build.as_posix()}: $$(value {id_variable(ref_id)})")
+        for func, arglist in references["includes"]:
+            rules.update(
+                _resolve_include_paths(
+                    func,
+                    arglist,
+                    src_build=src_build,
+                    src_root=src_root,
+                    build_root=build_root,
+                    build_path=build,
+                    directories=directories,
+                )
+            )
+    parts.extend(sorted(rules))
+    if directories:
+        dirs = " ".join(sorted({d.as_posix() for d in directories}))
+        parts.append(f"{target.as_posix()}: {dirs}")
+    return "\n".join(parts) + "\n"
+
+
+def batch_fragment(
+    directory: Path,
+    *,
+    src_root: Path,
+    build_root: Path,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    jobs: int = 1,
+) -> str:
+    """Return the ``--batch`` rules rendering the pages of *directory*."""
+
+    yamls = sorted(
+        p for p in directory.iterdir() if p.suffix.lower() in {".yml", ".yaml"}
+    )
+    loaded = load_metadata_pairs(yamls, jobs=jobs, loader=_load_metadata)
+    rules = generate_batch_rules(zip(yamls, loaded), src_root, build_root, shard_size)
+    return "".join(f"{rule}\n" for rule in rules)
+
+
+def write_rules(
+    src_root: Path,
+    build_root: Path,
+    rules_dir: Path,
+    paths: Iterable[Path] = (),
+    *,
+    batch: bool = False,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    jobs: int = 1,
+) -> list[Path]:
+    """Write the rule fragments of *paths* under *rules_dir*.
+
+    Each source file in *paths* writes the fragment of its source,
+    ``src/blog/post.{md,yml}`` to ``<rules_dir>/pages/blog/post.mk``, from
+    the files of that source alone; see :func:`source_fragment`. With
+    *batch*, each directory in *paths* writes the grouped rules of its pages
+    to ``<rules_dir>/batch/src/blog.mk``. Without *paths* every fragment is
+    written. Fragments whose text is unchanged are only touched, as they are
+    make targets. Returns the fragments in a stable order.
+    """
+
+    paths = list(paths)
+    if not paths:
+        paths = sorted(p for p in src_root.rglob("*") if p.suffix.lower() in _SOURCE_SUFFIXES)
+        if batch:
+            paths += sorted({p.parent for p in paths if p.suffix.lower() in {".yml", ".yaml"}})
+
+    sources: dict[Path, list[Path]] = defaultdict(list)
+    directories: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            directories.append(path)
+        elif path.suffix.lower() in _SOURCE_SUFFIXES:
+            sources[path.relative_to(src_root).with_suffix("")].append(path)
+
+    texts: dict[Path, str] = {}
+    bases = sorted(sources)
+    first = [sorted(sources[base])[0] for base in bases]
+    for base, path, metadata in zip(
+        bases, first, load_metadata_pairs(first, jobs=jobs, loader=_load_metadata)
+    ):
+        target = rules_dir / PAGES_DIR / f"{base.as_posix()}.mk"
+        texts[target] = source_fragment(
+            sorted(set(sources[base])),
+            metadata,
+            src_root=src_root,
+            build_root=build_root,
+            target=target,
+            batch=batch,
+        )
+    if batch:
+        for directory in sorted(set(directories)):
+            target = rules_dir / BATCH_DIR / f"{directory.as_posix()}.mk"
+            texts[target] = batch_fragment(
+                directory,
+                src_root=src_root,
+                build_root=build_root,
+                shard_size=shard_size,
+                jobs=jobs,
+            )
+
+    written = 0
+    for target, text in texts.items():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if write_utf8(text, str(target)):
+            written += 1
+        else:
+            os.utime(target)
+    logger.debug("Updated picasso rules", fragments=len(texts), written=written)
+    return list(texts)
+
+
 def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     """Parse command-line arguments."""
 
@@ -349,6 +667,32 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
         default="build",
         help="Directory where build artifacts are written",
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Render each directory with one render-html --batch call",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help=f"Pages per --batch rule (default: {DEFAULT_SHARD_SIZE})",
+    )
+    parser.add_argument(
+        "--rules",
+        metavar="DIR",
+        help="Write the rule fragments of PATH under DIR instead of printing rules",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        type=Path,
+        metavar="PATH",
+        help="With --rules, source files, or directories with --batch, to write "
+        "fragments for (default: all)",
+    )
+    add_jobs_argument(parser)
+    add_cache_argument(parser)
     add_log_argument(parser)
     parser.add_argument(
         "-v",
@@ -371,12 +715,46 @@ def main(argv: list[str] | None = None) -> None:
         logger.error("Directory does not exist", directory=str(src_root))
         sys.exit(1)
 
-    for path in sorted(src_root.rglob("*")):
-        if path.suffix.lower() in {".yml", ".yaml"}:
-            print(generate_rule(path, src_root=src_root, build_root=build_root))
+    if args.rules:
+        write_rules(
+            src_root,
+            build_root,
+            Path(args.rules),
+            args.paths,
+            batch=args.batch,
+            shard_size=args.shard_size,
+            jobs=args.jobs,
+        )
+        log_parse_cache_stats()
+        return
+
+    yamls = [
+        path
+        for path in sorted(src_root.rglob("*"))
+        if path.suffix.lower() in {".yml", ".yaml"}
+    ]
+    loaded = list(
+        load_metadata_pairs(yamls, jobs=args.jobs, loader=load_metadata_pair)
+    )
+    for path, metadata in zip(yamls, loaded):
+        print(
+            generate_rule(
+                path,
+                src_root=src_root,
+                build_root=build_root,
+                metadata=metadata,
+                render=not args.batch,
+            )
+        )
+    if args.batch:
+        for rule in generate_batch_rules(
+            zip(yamls, loaded), src_root, build_root, args.shard_size
+        ):
+            print(rule)
 
-    for rule in generate_dependencies(src_root, build_root):
+    for rule in generate_dependencies(src_root, build_root, args.jobs):
         print(rule)
+    log_parse_cache_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,741 @@
+"""Build the site from an in-memory dependency graph.
+
+``pie build`` is an alternative to the recursive make pipeline
+(``makefile`` → ``build/.rules`` fragments → per-page recipes). It builds the same
+graph from the data :mod:`pie.build.picasso` uses for its rules:
+
+* preprocess ``src`` YAML and Markdown into ``build``
+* update the metadata index (``build/.update-index``)
+* render each page with ``render-html``
+* ``build/sitemap.xml``, ``build/permalinks.conf``, CSS and ``robots.txt``
+* optionally ``check-all``
+
+Steps run on a pool of worker processes that import the rendering modules
+once and keep their metadata caches between pages. A node is rebuilt when a
+target is missing or older than one of its prerequisites, like make. Outputs
+keep their modification time when they did not change, so the targets of
+pages are their depfiles and the sitemap and permalinks have stamp files,
+as in the makefile.
+Order-only prerequisites, such as the index for rendered pages, only affect
+ordering. When the build finishes the critical path is printed with the time
+spent in each node along it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from importlib import import_module
+from pathlib import Path
+from typing import Iterable, Sequence
+
+from pie.cli import add_jobs_argument, create_parser
+from pie.logging import configure_logging, logger
+
+__all__ = [
+    "BuildResult",
+    "Node",
+    "build",
+    "build_graph",
+    "critical_path",
+    "main",
+]
+
+#: Modules imported by each worker before its first step.
+WORKER_PRELOAD = (
+    "pie.render.html",
+    "pie.process_yaml",
+    "pie.metadata",
+)
+
+# A step is a ``module:function`` called with an argv list, the same calling
+# convention as the console scripts' ``main`` functions.
+Step = tuple[str, tuple[str, ...]]
+
+
+@dataclass
+class Node:
+    """One unit of work in the build graph.
+
+    ``targets`` are the files the node produces; a node without targets is
+    phony and always runs. ``deps`` are prerequisites whose modification
+    times are compared with the targets, ``order_only`` prerequisites only
+    have to be built first. ``discovered`` prerequisites come from the depfile
+    the node's last run wrote; a missing one forces a rebuild instead of
+    failing the build.
+    """
+
+    name: str
+    label: str
+    targets: list[str] = field(default_factory=list)
+    deps: list[str] = field(default_factory=list)
+    order_only: list[str] = field(default_factory=list)
+    discovered: list[str] = field(default_factory=list)
+    steps: list[Step] = field(default_factory=list)
+    #: Bump the metadata epoch in the workers once this node has run.
+    updates_index: bool = False
+
+
+@dataclass
+class BuildResult:
+    """Outcome of :func:`build`."""
+
+    built: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+    durations: dict[str, float] = field(default_factory=dict)
+    elapsed: float = 0.0
+    #: Render cache and output file counters summed over every node that ran.
+    cache: Counter = field(default_factory=Counter)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+# ---------------------------------------------------------------------------
+# Steps
+# ---------------------------------------------------------------------------
+
+
+def copy_file(argv: Sequence[str]) -> None:
+    """Copy ``argv[0]`` to ``argv[1]``, creating the parent directory."""
+
+    src, dst = argv
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    shutil.copyfile(src, dst)
+
+
+def touch(argv: Sequence[str]) -> None:
+    """Create or update the modification time of each path in *argv*."""
+
+    for path in argv:
+        Path(path).touch()
+
+
+def run_command(argv: Sequence[str]) -> int:
+    """Run an external command and return its exit status."""
+
+    return subprocess.call(list(argv))
+
+
+def _exit_status(code: object) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def run_step(target: str, argv: Sequence[str]) -> int:
+    """Call ``module:function`` *target* with *argv* and return its status."""
+
+    module, _, function = target.partition(":")
+    try:
+        return _exit_status(getattr(import_module(module), function)(list(argv)))
+    except SystemExit as exc:
+        return _exit_status(exc.code)
+    except Exception as exc:
+        logger.opt(exception=exc).error("Build step failed", step=target, error=str(exc))
+        return 1
+
+
+# Index generation the metadata caches of this process belong to.
+_epoch = 0
+
+
+def _init_worker(preload: Iterable[str]) -> None:
+    for module in preload:
+        try:
+            import_module(module)
+        except Exception as exc:  # pragma: no cover - depends on environment
+            logger.debug("Could not preload module", module=module, error=str(exc))
+
+
+def _cache_counts() -> Counter:
+    """Return the render cache and output file counters of this process."""
+
+    counts = Counter()
+    utils = sys.modules.get("pie.utils")
+    if utils is not None:
+        counts["files_written"] = utils.write_stats.written
+        counts["files_unchanged"] = utils.write_stats.skipped
+    html = sys.modules.get("pie.render.html")
+    if html is None:
+        return counts
+    stats = html.render_cache.stats()
+    counts.update({k: stats[k] for k in ("hits", "remote_hits", "misses", "writes")})
+    return counts
+
+
+def run_node(steps: Sequence[Step], epoch: int) -> tuple[int, float, Counter]:
+    """Run *steps* in order and return the exit status and elapsed seconds.
+
+    The render cache and output file counters the steps changed are
+    returned too. *epoch*
+    counts the index updates finished so far. When it moved on since this
+    process last ran a node, cached metadata is dropped first.
+    """
+
+    global _epoch
+    if epoch != _epoch:
+        _epoch = epoch
+        metadata = sys.modules.get("pie.metadata")
+        if metadata is not None:
+            metadata.refresh_metadata()
+
+    before = _cache_counts()
+    start = time.perf_counter()
+    status = 0
+    for target, argv in steps:
+        status = run_step(target, argv)
+        if status:
+            break
+    return status, time.perf_counter() - start, _cache_counts() - before
+
+
+# ---------------------------------------------------------------------------
+# Graph
+# ---------------------------------------------------------------------------
+
+
+def _add(graph: dict[str, Node], node: Node) -> None:
+    graph[node.name] = node
+
+
+def build_graph(
+    src_root: Path = Path("src"),
+    build_root: Path = Path("build"),
+    *,
+    template: str | None = None,
+    log_dir: Path = Path("log"),
+    check: bool = False,
+    jobs: int = 1,
+) -> dict[str, Node]:
+    """Return the build graph for the site under *src_root*.
+
+    Pages, their templates and the cross-document dependencies come from
+    :mod:`pie.build.picasso`. *template* replaces ``$(HTML_TEMPLATE)``
+    (default ``<src_root>/templates/template.html.jinja``). Pages that were
+    rendered before also depend on the files in their ``<output>.d``
+    depfile, which is also their target. Nodes are keyed by the file they
+    produce, or by name for phony nodes.
+    """
+
+    from pie.build.picasso import generate_dependencies, page_paths
+    from pie.dependencies import depfile_path, read_depfile
+    from pie.metadata import load_metadata_pair, load_metadata_pairs
+
+    if template is None:
+        template = (src_root / "templates" / "template.html.jinja").as_posix()
+    src = src_root.as_posix()
+    build_dir = build_root.as_posix()
+    graph: dict[str, Node] = {}
+
+    files = sorted(p for p in src_root.rglob("*") if p.is_file())
+    yamls = [p for p in files if p.suffix.lower() in {".yml", ".yaml"}]
+    markdowns = [p for p in files if p.suffix.lower() == ".md"]
+    stamp = f"{build_dir}/.update-index"
+
+    _add(
+        graph,
+        Node(
+            name=stamp,
+            label="Updating index",
+            targets=[stamp],
+            deps=[p.as_posix() for p in yamls],
+            steps=[
+                ("pie.update.index:main", (src,)),
+                ("pie.build.scheduler:touch", (stamp,)),
+            ],
+            updates_index=True,
+        ),
+    )
+
+    for path in markdowns:
+        out = (build_root / path.relative_to(src_root)).as_posix()
+        _add(
+            graph,
+            Node(
+                name=out,
+                label=f"Preprocess {path.as_posix()}",
+                targets=[out],
+                deps=[path.as_posix()],
+                steps=[("pie.build.scheduler:copy_file", (path.as_posix(), out))],
+            ),
+        )
+
+    htmls: list[str] = []
+    markdown_set = set(markdowns)
+    loaded = load_metadata_pairs(yamls, jobs=jobs, loader=load_metadata_pair)
+    for path, metadata in zip(yamls, loaded):
+        page = page_paths(path, src_root, build_root, metadata)
+        yml = page["preprocessed_yml"]
+        _add(
+            graph,
+            Node(
+                name=yml,
+                label=f"Preprocess {path.as_posix()}",
+                targets=[yml],
+                deps=[path.as_posix()],
+                steps=[
+                    ("pie.build.scheduler:copy_file", (path.as_posix(), yml)),
+                    ("pie.process_yaml:main", (yml,)),
+                ],
+            ),
+        )
+        if path.with_suffix(".md") not in markdown_set:
+            continue
+        page_template = page["template_dep"].replace("$(HTML_TEMPLATE)", template)
+        html = page["output_html"]
+        htmls.append(html)
+        _add(
+            graph,
+            Node(
+                name=html,
+                label=f"Generate HTML {html}",
+                targets=[depfile_path(html)],
+                deps=[page["preprocessed_md"], yml, page_template],
+                order_only=[stamp],
+                discovered=read_depfile(depfile_path(html)),
+                steps=[
+                    (
+                        "pie.render.html:main",
+                        (page_template, page["preprocessed_md"], yml, html),
+                    )
+                ],
+            ),
+        )
+
+    yaml_set = set(yamls)
+    for path in markdowns:
+        if not any(path.with_suffix(s) in yaml_set for s in (".yml", ".yaml")):
+            logger.warning("Markdown page has no metadata file", file=path.as_posix())
+
+    # Links and include-filter directives, as emitted by picasso.
+    for rule in generate_dependencies(src_root, build_root, jobs):
+        target, _, dep = rule.partition(":")
+        node = graph.get(target.strip())
+        if node is not None and dep.strip() not in node.deps:
+            node.deps.append(dep.strip())
+
+    for path in sorted(src_root.glob("css/*.css")):
+        out = f"{build_dir}/css/{path.name}"
+        _add(
+            graph,
+            Node(
+                name=out,
+                label=f"Compile SCSS {path.as_posix()}",
+                targets=[out],
+                deps=[path.as_posix()],
+                steps=[("pie.build.scheduler:run_command", ("pysassc", path.as_posix(), out))],
+            ),
+        )
+    robots = src_root / "robots.txt"
+    if robots.is_file():
+        out = f"{build_dir}/robots.txt"
+        _add(
+            graph,
+            Node(
+                name=out,
+                label=f"Copy {robots.as_posix()}",
+                targets=[out],
+                deps=[robots.as_posix()],
+                steps=[("pie.build.scheduler:copy_file", (robots.as_posix(), out))],
+            ),
+        )
+
+    sitemap = f"{build_dir}/sitemap.xml"
+    sitemap_stamp = f"{build_dir}/.sitemap"
+    _add(
+        graph,
+        Node(
+            name=sitemap,
+            label="Generate sitemap",
+            targets=[sitemap_stamp],
+            deps=[depfile_path(html) for html in htmls],
+            steps=[
+                ("pie.sitemap:main", (build_dir,)),
+                ("pie.build.scheduler:touch", (sitemap_stamp,)),
+            ],
+        ),
+    )
+    permalinks = f"{build_dir}/permalinks.conf"
+    permalinks_stamp = f"{build_dir}/.permalinks"
+    _add(
+        graph,
+        Node(
+            name=permalinks,
+            label="Generate permalink redirects",
+            targets=[permalinks_stamp],
+            deps=[p.as_posix() for p in markdowns + yamls],
+            steps=[
+                (
+                    "pie.nginx_permalinks:main",
+                    (src, "-o", permalinks, "--log", (log_dir / "nginx-permalinks.txt").as_posix()),
+                ),
+                ("pie.build.scheduler:touch", (permalinks_stamp,)),
+            ],
+        ),
+    )
+
+    if check:
+        _add(
+            graph,
+            Node(
+                name="check",
+                label="Run checks",
+                deps=[name for name in graph],
+                steps=[("pie.check.all:main", ())],
+            ),
+        )
+    return graph
+
+
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _is_stale(node: Node) -> bool:
+    """Return ``True`` when *node* has to run, using make's rules."""
+
+    if not node.targets:
+        return True
+    built = [_mtime(t) for t in node.targets]
+    if None in built:
+        return True
+    oldest = min(built)
+    for dep in node.deps + node.discovered:
+        mtime = _mtime(dep)
+        if mtime is None or mtime > oldest:
+            return True
+    return False
+
+
+def _producers(graph: dict[str, Node]) -> dict[str, str]:
+    return {target: node.name for node in graph.values() for target in node.targets}
+
+
+def _node_deps(graph: dict[str, Node], producers: dict[str, str]) -> dict[str, list[str]]:
+    """Map each node to the nodes producing its prerequisites."""
+
+    result: dict[str, list[str]] = {}
+    for node in graph.values():
+        names = []
+        for dep in node.deps + node.order_only:
+            producer = producers.get(dep, dep if dep in graph else None)
+            if producer is not None and producer != node.name and producer not in names:
+                names.append(producer)
+        result[node.name] = names
+    return result
+
+
+def _heights(deps: dict[str, list[str]]) -> dict[str, int]:
+    """Return the length of the longest chain of dependents of each node."""
+
+    dependents: dict[str, list[str]] = {name: [] for name in deps}
+    for name, names in deps.items():
+        for dep in names:
+            dependents[dep].append(name)
+    heights: dict[str, int] = {}
+
+    def height(name: str) -> int:
+        if name not in heights:
+            heights[name] = 0
+            heights[name] = 1 + max((height(d) for d in dependents[name]), default=0)
+        return heights[name]
+
+    for name in deps:
+        height(name)
+    return heights
+
+
+def _select(goals: Iterable[str], deps: dict[str, list[str]]) -> set[str]:
+    selected: set[str] = set()
+    stack = list(goals)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(deps[name])
+    return selected
+
+
+def build(
+    graph: dict[str, Node],
+    goals: Iterable[str] | None = None,
+    *,
+    jobs: int = 1,
+    keep_going: bool = False,
+    dry_run: bool = False,
+) -> BuildResult:
+    """Run the out-of-date nodes needed for *goals* and return the outcome.
+
+    *goals* are node names (targets); every node is built when omitted.
+    With ``jobs`` greater than one the steps run in that many worker
+    processes (``0`` uses every CPU), otherwise in this process. Nodes that
+    are ready are started longest-chain-first. After a failure no new nodes
+    are started unless *keep_going* is set. *dry_run* only prints the nodes
+    that would run.
+    """
+
+    producers = _producers(graph)
+    deps = _node_deps(graph, producers)
+    selected = _select(
+        (producers.get(goal, goal) for goal in goals) if goals else graph, deps
+    )
+    heights = _heights(deps)
+    waiting = {name: {d for d in deps[name] if d in selected} for name in selected}
+    dependents: dict[str, list[str]] = {name: [] for name in selected}
+    for name in selected:
+        for dep in waiting[name]:
+            dependents[dep].append(name)
+
+    ready = [(-heights[name], name) for name in selected if not waiting[name]]
+    heapq.heapify(ready)
+    result = BuildResult()
+    failed: set[str] = set()
+    ran: set[str] = set()
+    epoch = 0
+    stopping = False
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    executor = None
+    if jobs > 1 and not dry_run:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(WORKER_PRELOAD,)
+        )
+    running: dict = {}
+
+    def release(name: str) -> None:
+        for dependent in dependents[name]:
+            waiting[dependent].discard(name)
+            if not waiting[dependent]:
+                heapq.heappush(ready, (-heights[dependent], dependent))
+
+    def finish(
+        name: str, status: int, seconds: float, cache: Counter | None = None
+    ) -> None:
+        nonlocal epoch, stopping
+        result.durations[name] = seconds
+        result.cache.update(cache or {})
+        if status:
+            logger.error("Build step failed", node=name, status=status)
+            result.failed.append(name)
+            failed.add(name)
+            stopping = not keep_going
+        else:
+            result.built.append(name)
+            ran.add(name)
+            if graph[name].updates_index:
+                epoch += 1
+        release(name)
+
+    start = time.perf_counter()
+    try:
+        while ready or running:
+            while ready and not stopping and len(running) < max(jobs, 1):
+                _, name = heapq.heappop(ready)
+                node = graph[name]
+                if any(dep in failed for dep in deps[name]):
+                    failed.add(name)
+                    release(name)
+                    continue
+                missing = [
+                    dep
+                    for dep in node.deps
+                    if dep not in producers and dep not in graph and _mtime(dep) is None
+                ]
+                if missing:
+                    logger.error("No rule to make target", target=missing[0], needed_by=name)
+                    finish(name, 1, 0.0)
+                    continue
+                dirty = dry_run and any(
+                    producers.get(dep) in ran for dep in node.deps
+                )
+                if not (dirty or _is_stale(node)):
+                    result.skipped.append(name)
+                    result.durations[name] = 0.0
+                    release(name)
+                    continue
+                print(f"==> {node.label}", flush=True)
+                if dry_run:
+                    finish(name, 0, 0.0)
+                elif executor is None:
+                    finish(name, *run_node(node.steps, epoch))
+                else:
+                    running[executor.submit(run_node, node.steps, epoch)] = name
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as exc:
+                        logger.error("Build worker failed", node=name, error=str(exc))
+                        outcome = (1, 0.0, Counter())
+                    finish(name, *outcome)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def critical_path(
+    graph: dict[str, Node], durations: dict[str, float]
+) -> tuple[float, list[str]]:
+    """Return the length and nodes of the slowest dependency chain.
+
+    Only nodes present in *durations* (those visited by :func:`build`) are
+    considered; nodes that were up to date count as zero seconds.
+    """
+
+    deps = _node_deps(graph, _producers(graph))
+    best: dict[str, tuple[float, str | None]] = {}
+
+    def finish_time(name: str) -> float:
+        if name not in best:
+            prev = max(
+                ((finish_time(d), d) for d in deps[name] if d in durations),
+                default=(0.0, None),
+            )
+            best[name] = (prev[0] + durations[name], prev[1])
+        return best[name][0]
+
+    if not durations:
+        return 0.0, []
+    end = max(durations, key=finish_time)
+    path = []
+    name: str | None = end
+    while name is not None:
+        path.append(name)
+        name = best[name][1]
+    path.reverse()
+    return best[end][0], path
+
+
+def report(graph: dict[str, Node], result: BuildResult, jobs: int) -> None:
+    """Print the build summary and the critical path."""
+
+    print(
+        f"==> Built {len(result.built)}, up to date {len(result.skipped)}, "
+        f"failed {len(result.failed)} in {result.elapsed:.2f}s (-j {jobs})"
+    )
+    cache = result.cache
+    if cache["hits"] or cache["misses"]:
+        print(
+            f"==> Render cache: {cache['hits']} restored "
+            f"({cache['remote_hits']} remote), {cache['misses']} rendered, "
+            f"{cache['writes']} stored"
+        )
+    if cache["files_written"] or cache["files_unchanged"]:
+        print(
+            f"==> Output files: {cache['files_written']} written, "
+            f"{cache['files_unchanged']} unchanged"
+        )
+    length, path = critical_path(graph, result.durations)
+    busy = sum(result.durations.values())
+    if not busy:
+        return
+    print(f"==> Critical path {length:.2f}s of {busy:.2f}s total work")
+    for name in path:
+        seconds = result.durations[name]
+        if seconds:
+            print(f"    {seconds:8.2f}s  {graph[name].label}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+
+    parser = create_parser("Build the site with the in-process scheduler")
+    parser.prog = "pie build"
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help="Files to build (default: everything)",
+    )
+    parser.add_argument("--src", default="src", help="Source directory")
+    parser.add_argument("--build", default="build", help="Build directory")
+    parser.add_argument(
+        "--template",
+        help="Default page template (default: <src>/templates/template.html.jinja)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Run check-all after the build",
+    )
+    parser.add_argument(
+        "-k",
+        "--keep-going",
+        action="store_true",
+        help="Keep building nodes that do not depend on a failed one",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Print the nodes that would run without running them",
+    )
+    add_jobs_argument(parser, "running build steps")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entry point for ``pie build``."""
+
+    args = parse_args(argv)
+    configure_logging(args.verbose, args.log)
+    src_root = Path(args.src)
+    if not src_root.is_dir():
+        logger.error("Directory does not exist", directory=str(src_root))
+        raise SystemExit(1)
+
+    graph = build_graph(
+        src_root,
+        Path(args.build),
+        template=args.template,
+        check=args.check,
+        jobs=args.jobs,
+    )
+    unknown = [t for t in args.targets if t not in graph and t not in _producers(graph)]
+    if unknown:
+        logger.error("No rule to make target", target=unknown[0])
+        raise SystemExit(1)
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    result = build(
+        graph,
+        args.targets or None,
+        jobs=jobs,
+        keep_going=args.keep_going,
+        dry_run=args.dry_run,
+    )
+    # Build steps reconfigure logging; restore this command's settings.
+    configure_logging(args.verbose, args.log)
+    report(graph, result, jobs)
+    if not result.ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":  # pragma: no cover - convenience
+    main()
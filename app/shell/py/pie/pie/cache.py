@@ -0,0 +1,187 @@
+"""On-disk caches shared by the ``pie`` tools.
+
+Caches live under ``build/.cache`` (or ``PIE_CACHE_DIR``) so ``make clean``
+removes them with the rest of the build. Entries are pickled to one file per
+key and written atomically, which makes a cache safe to share between
+parallel build jobs. Setting ``PIE_NO_CACHE`` (``--no-cache`` on the command
+line) disables every cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import shutil
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from pie.logging import logger
+
+__all__ = [
+    "DEFAULT_CACHE_ROOT",
+    "DiskCache",
+    "MISSING",
+    "cache_key",
+    "caching_enabled",
+    "code_digest",
+    "parse_size",
+    "trim_lru",
+]
+
+DEFAULT_CACHE_ROOT = Path(os.getenv("PIE_CACHE_DIR", "build/.cache"))
+
+# Returned by :meth:`DiskCache.get` on a miss; ``None`` is a valid entry.
+MISSING: Any = object()
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def caching_enabled() -> bool:
+    """Return ``False`` when ``PIE_NO_CACHE`` is set."""
+
+    return not os.getenv("PIE_NO_CACHE")
+
+
+@cache
+def code_digest() -> str:
+    """Return the SHA1 of every source file of the :mod:`pie` package.
+
+    Cache keys include it instead of ``pie.__version__``, which stays the
+    same while the code changes. The files are read once per process.
+    """
+
+    root = Path(__file__).parent
+    sha1 = hashlib.sha1()
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or "__pycache__" in path.parts:
+            continue
+        sha1.update(path.relative_to(root).as_posix().encode("utf-8") + b"\0")
+        sha1.update(path.read_bytes())
+    return sha1.hexdigest()
+
+
+def cache_key(*parts: Any) -> str:
+    """Return a hex digest identifying *parts*.
+
+    Parts must have a stable ``repr`` such as strings, numbers and tuples.
+    """
+
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Pickle entries keyed by :func:`cache_key` under *directory*.
+
+    Hits, misses, writes and errors are counted for :meth:`stats`. Unreadable
+    entries are treated as misses.
+    """
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return caching_enabled()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pickle"
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """Return the entry for *key* or *default*."""
+
+        if not self.enabled:
+            return default
+        try:
+            with open(self._path(key), "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        except Exception as exc:
+            self.errors += 1
+            self.misses += 1
+            logger.debug("Ignoring unreadable cache entry", key=key, error=str(exc))
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store *value* under *key*, replacing any existing entry."""
+
+        if not self.enabled:
+            return
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as exc:
+            self.errors += 1
+            logger.debug("Failed to write cache entry", key=key, error=str(exc))
+            tmp.unlink(missing_ok=True)
+            return
+        self.writes += 1
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and the hit rate."""
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def parse_size(text: str) -> int:
+    """Return the number of bytes in *text* such as ``512M`` or ``2G``."""
+
+    text = text.strip().upper().removesuffix("B")
+    unit = text[-1:] if text[-1:] in _UNITS else ""
+    return int(float(text[: len(text) - len(unit)]) * _UNITS[unit])
+
+
+def trim_lru(directory: str | Path, limit: int) -> int:
+    """Remove the least recently modified files of *directory* over *limit*.
+
+    Files are removed oldest first until at most 90% of *limit* bytes are
+    left, so the next few writes do not trim again. Temporary ``*.tmp``
+    files are left alone. Returns the number of files removed.
+    """
+
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".tmp") or not entry.is_file():
+                continue
+            st = entry.stat()
+            files.append((st.st_mtime_ns, st.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    if total <= limit:
+        return 0
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= limit * 9 // 10:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
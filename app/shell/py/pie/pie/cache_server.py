@@ -0,0 +1,175 @@
+"""``pie cache-server``: a small HTTP server for the shared build cache.
+
+Serves the protocol described in :mod:`pie.remote_cache` from a directory,
+for local use, tests, or a team without a dedicated cache service. Content
+uploaded under ``/cas/<sha1>`` must match its digest. ``GET /status``
+returns the request counters as JSON. Each kind is split into 256
+directories, and a directory is trimmed to its share of ``--max-size``,
+least recently used first, after each upload.
+
+Example::
+
+    pie cache-server --port 8765 --root /var/cache/pie
+    PIE_REMOTE_CACHE=http://cache-host:8765 make
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from pie.cache import parse_size, trim_lru
+from pie.cli import create_parser
+from pie.logging import configure_logging, logger
+from pie.remote_cache import KINDS
+
+__all__ = ["CacheServer", "main", "parse_args"]
+
+DEFAULT_PORT = 8765
+MAX_BODY = 64 << 20
+SHARDS = 256
+_path_re = re.compile(rf"^/({'|'.join(KINDS)})/([0-9a-f]{{40}})$")
+
+
+class CacheServer(ThreadingHTTPServer):
+    """Serve cache entries stored under *root*, at most *max_size* bytes."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], root: str | Path, max_size: int) -> None:
+        super().__init__(address, _Handler)
+        self.root = Path(root)
+        self.max_size = max_size
+        self.counts = {"hits": 0, "misses": 0, "puts": 0, "rejected": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] += n
+
+    def path(self, kind: str, key: str) -> Path:
+        return self.root / kind / key[:2] / key
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY each
+    # kept-alive response waits for the client's delayed ACK.
+    disable_nagle_algorithm = True
+    server: CacheServer
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args, client=self.client_address[0])
+
+    def _reply(
+        self, status: int, body: bytes = b"", content_type: str = "application/octet-stream"
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _target(self) -> Path | None:
+        match = _path_re.match(self.path)
+        if match is None:
+            self._reply(404)
+            return None
+        return self.server.path(*match.groups())
+
+    def do_GET(self) -> None:
+        if self.path == "/status":
+            body = json.dumps(self.server.counts, sort_keys=True).encode()
+            self._reply(200, body, "application/json")
+            return
+        path = self._target()
+        if path is None:
+            return
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.server.count("misses")
+            self._reply(404)
+            return
+        os.utime(path)
+        self.server.count("hits")
+        self._reply(200, data)
+
+    do_HEAD = do_GET
+
+    def do_PUT(self) -> None:
+        path = self._target()
+        if path is None:
+            return
+        length = int(self.headers.get("Content-Length", -1))
+        if not 0 <= length <= MAX_BODY:
+            self.server.count("rejected")
+            self.close_connection = True
+            self._reply(411 if length < 0 else 413)
+            return
+        data = self.rfile.read(length)
+        if path.parent.parent.name == "cas" and hashlib.sha1(data).hexdigest() != path.name:
+            self.server.count("rejected")
+            self._reply(400, b"digest mismatch\n", "text/plain")
+            return
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.server.count("puts")
+        self.server.count(
+            "evictions", trim_lru(path.parent, self.server.max_size // (SHARDS * len(KINDS)))
+        )
+        self._reply(201)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+
+    parser = create_parser("Serve a shared build cache over HTTP")
+    parser.prog = "pie cache-server"
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})"
+    )
+    parser.add_argument(
+        "--root",
+        default=os.getenv("PIE_CACHE_SERVER_ROOT", "cache-server"),
+        help="Directory holding the entries (default: env PIE_CACHE_SERVER_ROOT "
+        "or ./cache-server)",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=parse_size,
+        default="10G",
+        help="Size limit, for example 512M or 10G (default: 10G)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entry point for ``pie cache-server``."""
+
+    args = parse_args(argv)
+    configure_logging(args.verbose, args.log)
+    server = CacheServer((args.host, args.port), args.root, args.max_size)
+    host, port = server.server_address[:2]
+    logger.info("Serving build cache", url=f"http://{host}:{port}", root=args.root)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("Cache server stopped", **server.counts)
+
+
+if __name__ == "__main__":  # pragma: no cover - convenience
+    main()
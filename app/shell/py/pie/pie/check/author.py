@@ -8,9 +8,13 @@ from pathlib import Path
 from typing import Iterator
 from itertools import chain
 
-from pie.cli import create_parser
+from pie.cli import add_jobs_argument, create_parser
 from pie.logging import logger, configure_logging
-from pie.metadata import load_metadata_pair
+from pie.metadata import (
+    load_metadata_pair,
+    load_metadata_pairs,
+    log_parse_cache_stats,
+)
 from pie.utils import load_exclude_file
 
 DEFAULT_LOG = "log/check-author.txt"
@@ -29,6 +33,7 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
         default="src",
         help="Root directory to scan for metadata files",
     )
+    add_jobs_argument(parser)
     parser.add_argument(
         "-x",
         "--exclude",
@@ -43,14 +48,17 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
 def _iter_metadata(
     root: Path,
     base_dir: Path,
+    jobs: int = 1,
 ) -> Iterator[tuple[Path, list[Path], dict | None]]:
     """Yield ``(metadata_path, paths, metadata)`` for files under *root*.
 
     Each metadata pair is loaded with :func:`load_metadata_pair` to ensure that
-    companion Markdown/YAML files are merged.
+    companion Markdown/YAML files are merged, in ``jobs`` worker processes
+    when greater than one.
     """
 
     processed: set[Path] = set()
+    found: list[tuple[Path, Path]] = []
 
     for path in chain(
         root.rglob("*.md"),
@@ -67,7 +75,11 @@ def _iter_metadata(
             source = path.relative_to(base_dir)
         except ValueError:
             source = path
-        meta = load_metadata_pair(source)
+        found.append((path, source))
+
+    sources = [source for _, source in found]
+    loaded = load_metadata_pairs(sources, jobs=jobs, loader=load_metadata_pair)
+    for (path, _), meta in zip(found, loaded):
         if meta and "path" in meta:
             paths = []
             for raw in meta["path"]:
@@ -100,7 +112,7 @@ def main(argv: list[str] | None = None) -> int:
 
     ok = True
     base_dir = scan_root.parent
-    for metadata_path, paths, meta in _iter_metadata(scan_root, base_dir):
+    for metadata_path, paths, meta in _iter_metadata(scan_root, base_dir, args.jobs):
         if metadata_path in exclude:
             continue
         doc = meta.get("doc") if meta else None
@@ -119,6 +131,7 @@ def main(argv: list[str] | None = None) -> int:
             else:
                 logger.error("Missing doc.author", path=str(display_path))
                 ok = False
+    log_parse_cache_stats()
     if ok:
         logger.info("All metadata files define doc.author.")
     return 0 if ok else 1
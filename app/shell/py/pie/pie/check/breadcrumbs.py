@@ -8,9 +8,13 @@ from pathlib import Path
 from typing import Iterable
 from itertools import chain
 
-from pie.cli import create_parser
+from pie.cli import add_jobs_argument, create_parser
 from pie.logging import logger, configure_logging
-from pie.metadata import load_metadata_pair
+from pie.metadata import (
+    load_metadata_pair,
+    load_metadata_pairs,
+    log_parse_cache_stats,
+)
 from pie.utils import load_exclude_file
 
 DEFAULT_LOG = "log/check-breadcrumbs.txt"
@@ -29,6 +33,7 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
         default="src",
         help="Root directory to scan for metadata files",
     )
+    add_jobs_argument(parser)
     parser.add_argument(
         "-x",
         "--exclude",
@@ -40,14 +45,18 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     return parser.parse_args(argv)
 
 
-def _iter_metadata(root: Path) -> Iterable[tuple[list[Path], dict | None]]:
+def _iter_metadata(
+    root: Path, jobs: int = 1
+) -> Iterable[tuple[list[Path], dict | None]]:
     """Yield ``(paths, metadata)`` pairs for files under *root*.
 
     Each metadata pair is loaded with :func:`load_metadata_pair` to ensure that
-    companion Markdown/YAML files are merged.
+    companion Markdown/YAML files are merged, in ``jobs`` worker processes
+    when greater than one.
     """
 
     processed: set[Path] = set()
+    found: list[Path] = []
 
     for path in chain(root.rglob("*.md"), root.rglob("*.yml"), root.rglob("*.yaml")):
         if not path.is_file():
@@ -56,7 +65,10 @@ def _iter_metadata(root: Path) -> Iterable[tuple[list[Path], dict | None]]:
         if base in processed:
             continue
         processed.add(base)
-        meta = load_metadata_pair(path)
+        found.append(path)
+
+    loaded = load_metadata_pairs(found, jobs=jobs, loader=load_metadata_pair)
+    for path, meta in zip(found, loaded):
         if meta and "path" in meta:
             paths = [Path(p) for p in meta["path"]]
         else:
@@ -80,7 +92,7 @@ def main(argv: list[str] | None = None) -> int:
     exclude = load_exclude_file(exclude_file, root)
 
     ok = True
-    for paths, meta in _iter_metadata(root):
+    for paths, meta in _iter_metadata(root, args.jobs):
         doc = meta.get("doc") if meta else None
         breadcrumbs = doc.get("breadcrumbs") if isinstance(doc, dict) else None
         for path in paths:
@@ -91,6 +103,7 @@ def main(argv: list[str] | None = None) -> int:
             else:
                 logger.error("Missing breadcrumbs", path=str(path))
                 ok = False
+    log_parse_cache_stats()
     if ok:
         logger.info("All metadata files define breadcrumbs.")
     return 0 if ok else 1
@@ -1,17 +1,43 @@
 from __future__ import annotations
 
 import argparse
+import os
 
 from pie.logging import add_log_argument
 
-__all__ = ["create_parser"]
+__all__ = ["add_cache_argument", "add_jobs_argument", "create_parser"]
+
+
+class _NoCacheAction(argparse.Action):
+    """Set ``PIE_NO_CACHE`` as soon as ``--no-cache`` is parsed.
+
+    Using the environment lets worker processes and child tools inherit the
+    setting.
+    """
+
+    def __init__(self, option_strings, dest, **kwargs) -> None:
+        super().__init__(option_strings, dest, nargs=0, default=False, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None) -> None:
+        os.environ["PIE_NO_CACHE"] = "1"
+        setattr(namespace, self.dest, True)
+
+
+def add_cache_argument(parser: argparse.ArgumentParser) -> None:
+    """Add ``--no-cache`` disabling the caches under ``build/.cache``."""
+
+    parser.add_argument(
+        "--no-cache",
+        action=_NoCacheAction,
+        help="Ignore and do not update the caches under build/.cache",
+    )
 
 
 def create_parser(description: str, *, log_default: str | None = None) -> argparse.ArgumentParser:
     """Return an :class:`argparse.ArgumentParser` with standard options.
 
-    The parser includes ``--log`` and ``--verbose`` arguments used throughout
-    the ``pie`` command line tools.
+    The parser includes ``--log``, ``--verbose`` and ``--no-cache`` arguments
+    used throughout the ``pie`` command line tools.
 
     Parameters
     ----------
@@ -29,4 +55,24 @@ def create_parser(description: str, *, log_default: str | None = None) -> argpar
         action="store_true",
         help="Enable debug logging",
     )
+    add_cache_argument(parser)
     return parser
+
+
+def add_jobs_argument(
+    parser: argparse.ArgumentParser, purpose: str = "loading metadata"
+) -> None:
+    """Add ``-j``/``--jobs`` selecting worker processes for *purpose*.
+
+    The default comes from ``PIE_JOBS`` and falls back to ``1``, which works
+    in-process. ``0`` uses every CPU.
+    """
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=int(os.getenv("PIE_JOBS", "1")),
+        help=f"Worker processes for {purpose}; 0 uses all CPUs "
+        "(default: env PIE_JOBS or 1)",
+    )
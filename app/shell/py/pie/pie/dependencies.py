@@ -0,0 +1,198 @@
+"""Record the metadata and files a render reads and write make depfiles.
+
+The metadata helpers (:func:`pie.metadata.get_cached_metadata` and friends),
+:func:`pie.utils.read_json` and the ``read_yaml`` template global report each
+document id and file they resolve to the recorders opened with
+:func:`record_dependencies`. ``render-html`` opens one per page and writes the
+result next to the output as ``<output>.d``::
+
+    build/a.html.stamp: \\
+     src/b.md \\
+     src/b.yml \\
+     src/toc.yml
+    src/b.md src/b.yml src/toc.yml:
+
+A document id stands for the source files listed in its ``path`` field. The
+empty rules keep make working after a prerequisite is deleted, like
+``gcc -MP``. The rule names the page's make stamp (:func:`stamp_path`)
+rather than the output, as outputs keep their modification time when a
+render does not change them.
+"""
+
+from __future__ import annotations
+
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping
+
+__all__ = [
+    "Dependencies",
+    "depfile_path",
+    "format_depfile",
+    "read_depfile",
+    "record",
+    "record_dependencies",
+    "record_document",
+    "record_file",
+    "stamp_path",
+    "write_depfile",
+]
+
+
+@dataclass(eq=False)
+class Dependencies:
+    """Document ids and files read while a recorder was open.
+
+    ``unresolved`` holds ids whose metadata was not at hand when they were
+    read, for example ids looked up key by key; see :meth:`resolve`.
+    ``direct`` holds the files reported with :func:`record_file` rather than
+    through the ``path`` of a document.
+    """
+
+    ids: set[str] = field(default_factory=set)
+    files: set[str] = field(default_factory=set)
+    unresolved: set[str] = field(default_factory=set)
+    direct: set[str] = field(default_factory=set)
+
+    def add_document(self, doc_id: str, data: Mapping[str, Any] | None) -> None:
+        if data is None:
+            if doc_id not in self.ids:
+                self.unresolved.add(doc_id)
+            self.ids.add(doc_id)
+            return
+        self.ids.add(doc_id)
+        self.unresolved.discard(doc_id)
+        paths = data.get("path") if isinstance(data, Mapping) else None
+        if isinstance(paths, str):
+            paths = [paths]
+        self.files.update(str(p) for p in paths or ())
+
+    def update(self, other: Dependencies) -> None:
+        """Add everything recorded in *other*."""
+
+        self.unresolved -= other.ids - other.unresolved
+        self.unresolved |= other.unresolved - self.ids
+        self.ids |= other.ids
+        self.files |= other.files
+        self.direct |= other.direct
+
+    def resolve(self) -> None:
+        """Fetch the ``path`` of each unresolved id from the metadata store."""
+
+        if not self.unresolved:
+            return
+        from pie.metadata import get_store
+
+        ids = sorted(self.unresolved)
+        for doc_id, data in zip(ids, get_store().get_many(ids)):
+            if data is not None:
+                self.add_document(doc_id, data)
+        # Ids the store does not know have no source file to depend on.
+        self.unresolved.clear()
+
+
+# Open recorders, innermost last. Every access is reported to all of them.
+_active: list[Dependencies] = []
+
+
+def record_document(doc_id: str, data: Mapping[str, Any] | None = None) -> None:
+    """Report that the metadata of *doc_id* (loaded as *data*) was read."""
+
+    for deps in _active:
+        deps.add_document(doc_id, data)
+
+
+def record_file(path: str | Path) -> None:
+    """Report that *path* was read."""
+
+    for deps in _active:
+        deps.files.add(str(path))
+        deps.direct.add(str(path))
+
+
+def record(recorded: Dependencies) -> None:
+    """Report everything in *recorded* again, for example from a cache."""
+
+    for deps in _active:
+        deps.update(recorded)
+
+
+@contextmanager
+def record_dependencies() -> Iterator[Dependencies]:
+    """Collect the documents and files read inside the ``with`` block."""
+
+    deps = Dependencies()
+    _active.append(deps)
+    try:
+        yield deps
+    finally:
+        _active.remove(deps)
+
+
+def depfile_path(output: str | Path) -> str:
+    """Return the depfile written for *output*."""
+
+    return f"{output}.d"
+
+
+def stamp_path(output: str | Path) -> str:
+    """Return the file make touches once *output* is rendered."""
+
+    return f"{output}.stamp"
+
+
+def _escape(path: str) -> str:
+    return path.replace("$", "$$").replace(" ", "\\ ").replace("#", "\\#")
+
+
+def format_depfile(target: str, prerequisites: Iterable[str]) -> str:
+    """Return make rules making *target* depend on *prerequisites*."""
+
+    prereqs = [_escape(p) for p in sorted(set(prerequisites))]
+    lines = [f"{_escape(target)}:"]
+    for prereq in prereqs:
+        lines[-1] += " \\"
+        lines.append(f" {prereq}")
+    text = "\n".join(lines) + "\n"
+    if prereqs:
+        text += " ".join(prereqs) + ":\n"
+    return text
+
+
+def write_depfile(target: str, deps: Dependencies, path: str | None = None) -> None:
+    """Write the depfile for *target* listing the files in *deps*.
+
+    The rule is written for the make stamp of *target*; the target itself,
+    its stamp and its depfile are left out. *path* defaults to
+    :func:`depfile_path`. The depfile is touched even when its text is the
+    same, so its modification time records the last render, which
+    ``render-html --stale-only`` and ``pie build`` compare with the sources.
+    """
+
+    from pie.utils import write_utf8  # pie.utils imports this module
+
+    path = path or depfile_path(target)
+    stamp = stamp_path(target)
+    prerequisites = deps.files - {target, stamp, path}
+    if not write_utf8(format_depfile(stamp, prerequisites), str(path)):
+        os.utime(path)
+
+
+def read_depfile(path: str | Path) -> list[str]:
+    """Return the prerequisites listed in the depfile at *path*.
+
+    A missing depfile yields an empty list.
+    """
+
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return []
+    rule = text.replace("\\\n", " ").split("\n", 1)[0]
+    _, _, prereqs = rule.partition(": ")
+    words = prereqs.replace("\\ ", "\0").split()
+    return [
+        w.replace("\0", " ").replace("\\#", "#").replace("$$", "$") for w in words
+    ]
@@ -1,14 +1,175 @@
+"""Replace ``:emoji:`` codes with Unicode characters.
+
+:func:`emojify_text` gives the same result as
+``emoji.emojize(text, language="alias")``, which scans the whole text and
+searches the emoji data for every code it finds. Here text without a
+``:name:`` candidate is returned before any emoji data is read. Codes are
+found with one compiled pattern. The first few are searched for like
+``emoji.emojize`` does, and past those a table of the English names and
+aliases is built once per process, so short texts cost no more than before.
+
+The pattern accepts every character of every emoji name in every language,
+like ``emoji.emojize``. Reading all the languages is slow, so those
+characters are kept in ``build/.cache/emoji`` keyed by the ``emoji``
+version. If an ``emoji`` release changes its data in a way the table cannot
+follow, :func:`emojify_text` logs a warning and calls ``emoji.emojize``
+instead.
+"""
+
 from __future__ import annotations
 
 import argparse
+import re
 import sys
+import unicodedata
 
 import emoji
+from pie.cache import DEFAULT_CACHE_ROOT, MISSING, DiskCache, cache_key
 from pie.cli import create_parser
 from pie.logging import logger, configure_logging
 
+_WORD_RE = re.compile(r"\w")
+# Every code matches this: names hold neither white space nor colons.
+_CANDIDATE_RE = re.compile(r":[^\s:]+:")
+
+name_chars_cache = DiskCache(DEFAULT_CACHE_ROOT / "emoji")
+
+_DATA_ERRORS = (AttributeError, KeyError, TypeError, ValueError, NotImplementedError)
+# ``emoji.emojize`` scans the emoji data once per code. Up to this many
+# distinct codes are resolved the same way; past it the full table is built.
+_SCAN_LIMIT = 8
+
+# Cleared when the emoji data cannot be read; ``emoji.emojize`` is used then.
+_supported = True
+_pattern: re.Pattern[str] | None = None
+# Resolved ``:name:`` keys, ``None`` for unknown ones; all names once complete.
+_names: dict[str, str | None] = {}
+_complete = False
+
+
+def _name_chars(names: list[str]) -> set[str]:
+    """Return the non-word characters of *names*, decomposed forms included."""
+
+    chars = set("".join(name[1:-1] for name in names))
+    chars |= set(unicodedata.normalize("NFD", "".join(chars)))
+    return {c for c in chars if not _WORD_RE.match(c)}
+
+
+def _all_name_chars() -> str:
+    """Return the non-word characters of every name in every language."""
+
+    key = cache_key("name-chars", emoji.__version__)
+    chars = name_chars_cache.get(key)
+    if chars is MISSING:
+        for language in emoji.LANGUAGES:
+            emoji.load_from_json(language)
+        names: list[str] = []
+        for data in emoji.EMOJI_DATA.values():
+            for language, value in data.items():
+                if language in emoji.LANGUAGES or language == "alias":
+                    names.extend([value] if isinstance(value, str) else value)
+        chars = "".join(sorted(_name_chars(names)))
+        name_chars_cache.set(key, chars)
+    return chars
+
+
+def _code_pattern() -> re.Pattern[str]:
+    global _pattern
+    if _pattern is None:
+        # Like ``emoji.emojize``: a code may hold any character of any name.
+        _pattern = re.compile(f"(:[\\w{re.escape(_all_name_chars())}]++:)")
+    return _pattern
+
+
+def _scan(key: str) -> str | None:
+    """Return the emoji named *key*, searched like ``emoji.emojize`` does."""
+
+    emoji.load_from_json("alias")
+    fully_qualified = emoji.STATUS["fully_qualified"]
+    for emj, data in emoji.EMOJI_DATA.items():
+        if key in data.get("alias", ()) and data["status"] <= fully_qualified:
+            return emj
+    for emj, data in emoji.EMOJI_DATA.items():
+        if data.get("en") == key and data["status"] <= fully_qualified:
+            return emj
+    return None
+
+
+def _build_names() -> dict[str, str]:
+    # ``emoji.emojize(..., language="alias")`` resolves these two only.
+    emoji.load_from_json("alias")
+    fully_qualified = emoji.STATUS["fully_qualified"]
+    names: dict[str, str] = {}
+    aliases: dict[str, str] = {}
+    for emj, data in emoji.EMOJI_DATA.items():
+        if data["status"] > fully_qualified:
+            continue
+        if "en" in data:
+            names.setdefault(data["en"], emj)
+        for alias in data.get("alias", ()):
+            aliases.setdefault(alias, emj)
+    names.update(aliases)
+    return names
+
+
+def _resolve(key: str) -> str | None:
+    global _complete
+    if key in _names or _complete:
+        return _names.get(key)
+    if len(_names) < _SCAN_LIMIT:
+        emj = _names[key] = _scan(key)
+        return emj
+    _names.update(_build_names())
+    _complete = True
+    return _names.get(key)
+
+
+def emoji_names() -> dict[str, str]:
+    """Return every emoji by ``:name:``, aliases included.
+
+    Names resolve like ``emoji.emojize(..., language="alias")``: the first
+    fully-qualified emoji with a matching alias, else the first with a
+    matching English name. The table is empty if the emoji data could not
+    be read.
+    """
+
+    global _complete
+    if not _complete:
+        try:
+            _names.update(_build_names())
+        except _DATA_ERRORS as exc:
+            logger.warning("Unsupported emoji data", error=str(exc))
+            return {}
+        _complete = True
+    return {name: emj for name, emj in _names.items() if emj}
+
+
+def _lookup(code: str) -> str:
+    key = code if code.isascii() else f":{unicodedata.normalize('NFKC', code[1:-1])}:"
+    return _resolve(key) or code
+
+
+def _emojify(text: str) -> str:
+    # Odd items are the codes the pattern captured.
+    parts = _code_pattern().split(text)
+    if len(parts) == 1:
+        return text
+    parts[1::2] = [_lookup(code) for code in parts[1::2]]
+    return "".join(parts)
+
+
 def emojify_text(text: str) -> str:
     """Return *text* with ``:emoji:`` codes replaced by Unicode characters."""
+
+    global _supported
+    if ":" not in text or not _CANDIDATE_RE.search(text):
+        return text
+    if _supported:
+        try:
+            return _emojify(text)
+        except _DATA_ERRORS as exc:
+            logger.warning("Unsupported emoji data, using emoji.emojize", error=str(exc))
+            _supported = False
     return emoji.emojize(text, language="alias")
 
 
@@ -22,7 +22,7 @@ def getopt_show(meta: Mapping[str, Any]) -> bool:
 
 
 def load_from_redis(path: Path) -> Mapping[str, Any] | None:
-    """Fetch metadata for *path* from Redis."""
+    """Fetch metadata for *path* from the metadata store."""
 
     filepath = str(path)
     doc_id = get_metadata_by_path(filepath, "id")
@@ -30,10 +30,10 @@ def load_from_redis(path: Path) -> Mapping[str, Any] | None:
         logger.debug("No doc_id found", path=filepath)
         return None
 
-    meta = metadata.build_from_redis(f"{doc_id}.") or {}
+    meta = metadata.get_metadata(doc_id) or {}
     if "id" not in meta:
         meta["id"] = doc_id
-    logger.debug("Fetched metadata via build_from_redis", path=filepath, id=doc_id)
+    logger.debug("Fetched metadata via get_metadata", path=filepath, id=doc_id)
     return meta
 
 
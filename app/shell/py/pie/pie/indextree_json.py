@@ -9,6 +9,7 @@ from pie.cli import create_parser
 from pie.logging import logger, configure_logging
 
 from pie.index_tree import walk, getopt_link, getopt_show, sort_entries
+from pie.utils import log_write_stats, write_utf8
 
 
 def process_dir(directory: Path, tag: str | None = None) -> Iterator[dict]:
@@ -87,7 +88,8 @@ def main(argv: list[str] | None = None) -> int:
 
     json_data = json.dumps(data, indent=2)
     if args.output:
-        Path(args.output).write_text(json_data, encoding="utf-8")
+        write_utf8(json_data, args.output)
+        log_write_stats()
     else:
         print(json_data)
     return 0
@@ -3,19 +3,25 @@
 
 from __future__ import annotations
 
-import json
 import os
 import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Mapping, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, Mapping, Optional
 from urllib.parse import urljoin
 
 import redis
-from flatten_dict import unflatten
+from pie.cache import DEFAULT_CACHE_ROOT, MISSING, DiskCache, cache_key, code_digest
+from pie.dependencies import record_document, record_file
 from pie.logging import logger
 from pie.yaml import YAML_EXTS, read_yaml, yaml
 from ruamel.yaml import YAMLError
 from pie.schema import DEFAULT_SCHEMA
+from pie.store import MetadataStore, RedisMetadataStore, default_backend, open_store
+from pie.store.flatten import decode_value as _decode_value
+from pie.utils import batched
 
 
 def get_url(filename: str) -> Optional[str]:
@@ -253,6 +259,7 @@ def _get_redis_value(key: str, *, required: bool = False):
     1
     """
 
+    record_document(key.split(".", 1)[0])
     conn = _get_conn()
     try:
         val = conn.get(key)
@@ -260,42 +267,17 @@ def _get_redis_value(key: str, *, required: bool = False):
         logger.error("Redis lookup failed", key=key, exception=str(exc))
         raise SystemExit(1)
 
-    if val is None:
-        if required:
-            logger.error("Missing metadata", key=key)
-            raise SystemExit(1)
-        return None
-
-    try:
-        return json.loads(val)
-    except Exception:
-        return val
-
-
-def _convert_lists(obj):
-    """Recursively convert dictionaries with integer keys to lists.
-
-    Example
-    -------
-    >>> _convert_lists({"0": "a", "2": {"0": "b"}})
-    ['a', None, ['b']]
-    """
-
-    if isinstance(obj, dict):
-        if obj and all(isinstance(k, str) and k.isdigit() for k in obj):
-            arr = [None] * (max(int(k) for k in obj) + 1)
-            for k, v in obj.items():
-                arr[int(k)] = _convert_lists(v)
-            return arr
-        return {k: _convert_lists(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_convert_lists(v) for v in obj]
-    return obj
+    return _decode_value(key, val, required=required)
 
 
 def build_from_redis(prefix: str) -> dict | list | None:
     """Return a nested structure for all keys starting with ``prefix``.
 
+    ``prefix`` starts with a document id and is resolved in the generation
+    pinned by the store. Keys are read from the ``<prefix>__keys__`` manifest
+    when available so the lookup costs O(fields) instead of a scan over every
+    key in the database. All values are then fetched with a single ``MGET``.
+
     Example
     -------
     >>> conn = _get_conn()
@@ -305,71 +287,375 @@ def build_from_redis(prefix: str) -> dict | list | None:
     {'1': {'title': 'Hi'}}
     """
 
-    conn = _get_conn()
+    record_document(prefix.split(".", 1)[0])
+    store = get_store()
+    if not isinstance(store, RedisMetadataStore):
+        store = RedisMetadataStore(_get_conn())
+    return store.fetch_prefixes([store.qualify(prefix)])[0]
+
+
+# Store used by the lookup helpers. ``None`` selects the backend named by
+# ``PIE_METADATA_BACKEND`` on first use; assign a store to override it.
+metadata_store: MetadataStore | None = None
+_redis_store: RedisMetadataStore | None = None
 
-    keys = conn.keys(prefix + "*")
-    if not keys:
-        return None
 
-    flat = {}
-    for k in keys:
-        val = _get_redis_value(k, required=True)
-        flat[k[len(prefix) :].lstrip(".")] = val
+def get_store() -> MetadataStore:
+    """Return the :class:`~pie.store.MetadataStore` used for lookups.
 
-    data = unflatten(flat, splitter="dot")
-    return _convert_lists(data)
+    The Redis backend follows :data:`redis_conn`, so replacing the connection
+    also replaces the store.
+    """
+
+    global metadata_store, _redis_store
+    if metadata_store is None and default_backend() != "redis":
+        metadata_store = open_store()
+    if metadata_store is not None:
+        return metadata_store
+    conn = _get_conn()
+    if _redis_store is None or _redis_store.conn is not conn:
+        _redis_store = RedisMetadataStore(conn)
+    return _redis_store
 
 
-_metadata_cache: dict[str, dict[str, Any]] = {}
+# Documents fetched by :func:`get_cached_metadata`. A plain dict that lives
+# for the whole process unless :func:`enable_metadata_cache` swaps in a
+# bounded :class:`MetadataCache`.
+_metadata_cache: dict[str, dict[str, Any]] | MetadataCache = {}
 
 
 def get_metadata(name: str) -> dict[str, Any] | None:
-    """Return metadata dictionary for ``name`` from Redis."""
+    """Return metadata dictionary for ``name`` from the metadata store."""
+
+    data = get_store().get_document(name)
+    record_document(name, data)
+    return data
+
+
+def get_metadata_many(names: Iterable[str]) -> dict[str, dict[str, Any] | None]:
+    """Return metadata for each of ``names`` and cache the documents found.
+
+    Documents already in the cache are reused; the rest are fetched together
+    so N lookups cost a constant number of round trips. Unknown names
+    map to ``None`` and are not cached.
+    """
+
+    found = {n: _metadata_cache.get(n) for n in dict.fromkeys(names)}
+    missing = [n for n, data in found.items() if data is None]
+    for name, data in zip(missing, get_store().get_many(missing) if missing else []):
+        if data is not None:
+            _metadata_cache[name] = data
+            found[name] = data
+    for name, data in found.items():
+        record_document(name, data)
+    return found
+
+
+# Seconds a renderer waits, once per process, for an index to be published.
+DEFAULT_INDEX_TIMEOUT = 1.5
+
+
+@dataclass
+class IndexState:
+    """Readiness information for the index behind a store."""
+
+    store: MetadataStore
+    generation: str | None = None
+    ids: frozenset[str] = frozenset()
+    missing: set[str] = field(default_factory=set)
+
+    @property
+    def ready(self) -> bool:
+        return self.generation is not None
+
+    def may_contain(self, doc_id: str) -> bool:
+        """Return ``False`` when ``doc_id`` is known not to be indexed."""
+
+        if doc_id in self.missing:
+            return False
+        return not self.ready or doc_id in self.ids
+
+
+_index_state: IndexState | None = None
+
+
+def get_index_state() -> IndexState:
+    """Return the :class:`IndexState` for the current connection.
+
+    The first call per store waits up to ``PIE_INDEX_TIMEOUT`` seconds
+    for ``update-index`` to publish a generation and then loads the set of
+    known ids. Indexes written without a generation are treated as not ready,
+    in which case every id is assumed to possibly exist.
+    """
+
+    global _index_state
+    store = get_store()
+    if _index_state is None or _index_state.store is not store:
+        timeout = float(os.getenv("PIE_INDEX_TIMEOUT", DEFAULT_INDEX_TIMEOUT))
+        try:
+            generation = store.wait_for_generation(timeout)
+            ids = store.known_ids() if generation else frozenset()
+        except Exception as exc:
+            logger.error("Index lookup failed", exception=str(exc))
+            raise SystemExit(1)
+        if generation is None:
+            logger.debug("No index generation published", timeout=timeout)
+        _index_state = IndexState(store, generation, ids)
+    return _index_state
+
+
+class MetadataCache:
+    """Bounded LRU cache of documents tied to the published index generation.
+
+    Entries are evicted least recently used first once ``maxsize`` is
+    exceeded. At most every ``check_interval`` seconds a lookup compares
+    ``__index__.generation`` with the generation the entries were read from
+    and drops everything when ``update-index`` has published a new one. The
+    store is refreshed at the same time, so long-lived processes move to the
+    new generation instead of serving stale metadata.
+    """
+
+    def __init__(self, maxsize: int = 1024, check_interval: float = 1.0) -> None:
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.generation: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._checked: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __setitem__(self, key: str, value: dict[str, Any]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the entry for ``key`` and mark it as recently used."""
+
+        self.validate()
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def validate(self) -> None:
+        """Drop all entries if the index generation has changed."""
+
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            generation = get_store().generation()
+        except Exception as exc:
+            logger.warning("Could not check index generation", exception=str(exc))
+            return
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+                logger.debug(
+                    "Index generation changed; dropping cached metadata",
+                    old=self.generation,
+                    new=generation,
+                    entries=len(self._entries),
+                )
+            self._entries.clear()
+            self.generation = generation
+            get_store().refresh()
+            _reset_index_state()
+
+    def stats(self) -> dict[str, Any]:
+        """Return counters describing cache effectiveness."""
+
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+        }
+
+
+def enable_metadata_cache(
+    maxsize: int = 1024, check_interval: float = 1.0
+) -> MetadataCache:
+    """Use a bounded, generation-checked :class:`MetadataCache`.
+
+    Intended for long-lived processes such as a development server or watch
+    loop. ``PIE_METADATA_CACHE_SIZE`` enables it at import time, with
+    ``PIE_METADATA_CACHE_INTERVAL`` overriding ``check_interval``.
+    """
+
+    global _metadata_cache
+    _metadata_cache = MetadataCache(maxsize, check_interval)
+    return _metadata_cache
+
+
+def metadata_cache_stats() -> dict[str, Any] | None:
+    """Return :meth:`MetadataCache.stats` or ``None`` when the cache is off."""
 
-    return build_from_redis(f"{name}.")
+    if isinstance(_metadata_cache, MetadataCache):
+        return _metadata_cache.stats()
+    return None
+
+
+def _reset_index_state() -> None:
+    global _index_state
+    _index_state = None
 
 
 def get_cached_metadata(key: str) -> dict[str, Any]:
     """Return cached metadata for ``key``.
 
     Metadata is looked up from Redis on the first request and stored in a
-    module-level cache. Subsequent lookups reuse the cached value.
+    module-level cache. Subsequent lookups reuse the cached value. Once a
+    lookup misses, :func:`get_index_state` is consulted so unknown ids fail
+    immediately instead of being retried.
     """
 
-    if key not in _metadata_cache:
-        data: dict[str, Any] | None = None
-        for _ in range(3):
-            data = get_metadata(key)
-            if data is not None:
-                break
-            time.sleep(0.5)
+    cached = _metadata_cache.get(key)
+    if cached is not None:
+        record_document(key, cached)
+        return cached
+
+    state = _index_state
+    if state is not None and state.store is not get_store():
+        state = None
+    data: dict[str, Any] | None = None
+    if state is None or state.may_contain(key):
+        data = get_metadata(key)
         if data is None:
-            logger.error("Missing metadata", id=key)
-            raise SystemExit(1)
-        _metadata_cache[key] = data
-    return _metadata_cache[key]
+            state = get_index_state()
+            if state.ready and key in state.ids:
+                # Indexed after the first read; the generation is final now.
+                data = get_metadata(key)
+    if data is None:
+        state = state or get_index_state()
+        state.missing.add(key)
+        logger.error(
+            "Missing metadata",
+            id=key,
+            generation=state.generation,
+            indexed=key in state.ids,
+        )
+        raise SystemExit(1)
+    _metadata_cache[key] = data
+    return data
 
 
 def clear_cached_metadata() -> None:
-    """Reset the metadata cache used by :func:`get_cached_metadata`."""
+    """Reset the metadata cache and index state used by :func:`get_cached_metadata`."""
 
     _metadata_cache.clear()
+    _reset_index_state()
+
+
+def refresh_metadata() -> None:
+    """Forget cached lookups and re-pin the store after the index changed.
+
+    Long-lived processes such as ``pie build`` workers call this once a new
+    index generation has been committed. A store that has not been opened
+    yet is left alone.
+    """
+
+    clear_cached_metadata()
+    store = metadata_store or _redis_store
+    if store is not None:
+        store.refresh()
 
 
 def get_metadata_by_path(filepath: str, keypath: str) -> Any | None:
     """Return metadata value for ``keypath`` associated with ``filepath``.
 
     The function first looks up the document ``id`` stored under ``filepath``
-    in Redis and then retrieves ``<id>.<keypath>``.
+    and then retrieves ``<id>.<keypath>`` from the metadata store.
     """
 
-    conn = _get_conn()
+    record_file(filepath)
+    return get_store().get_by_path(filepath, keypath)
+
+
+# Parsed metadata pairs, reused until one of the files changes.
+PARSE_CACHE_DIR = DEFAULT_CACHE_ROOT / "metadata"
+parse_cache = DiskCache(PARSE_CACHE_DIR)
+
+
+def _parse_cache_key(
+    path: Path, meta_file: Path | None, markdown_file: Path | None
+) -> str | None:
+    """Return the :data:`parse_cache` key for a pair, or ``None`` if disabled.
 
-    doc_id = conn.get(filepath)
-    if not doc_id:
-        logger.warning("unknown metadata", filepath=filepath, keypath=keypath)
+    Derived fields depend on the path as given, the working directory and
+    ``BASE_URL``, so those are part of the key too.
+    """
+
+    if not parse_cache.enabled:
         return None
-    return conn.get(f"{doc_id}.{keypath}")
+    parts: list[Any] = [code_digest(), os.getcwd(), str(path), os.getenv("BASE_URL", "")]
+    for f in (meta_file, markdown_file):
+        if f is None:
+            parts.append(None)
+            continue
+        try:
+            st = f.stat()
+        except OSError:
+            return None
+        parts.append((str(f), st.st_mtime_ns, st.st_size))
+    return cache_key(*parts)
+
+
+def _cached_metadata_pair(path: Path) -> Any:
+    """Return the cached pair for *path* or :data:`~pie.cache.MISSING`."""
+
+    key = _parse_cache_key(path, *metadata_pair_files(path))
+    return MISSING if key is None else parse_cache.get(key)
+
+
+def log_parse_cache_stats() -> None:
+    """Log :data:`parse_cache` statistics at debug level."""
+
+    if parse_cache.enabled:
+        logger.debug("Metadata parse cache", **parse_cache.stats())
+
+
+def metadata_pair_files(path: Path) -> tuple[Path | None, Path | None]:
+    """Return the ``(metadata, markdown)`` files combined for ``path``.
+
+    Either item is ``None`` when no such sibling exists. ``.yml`` is preferred
+    over ``.yaml`` and ``.md`` over ``.mdi``.
+    """
+
+    base = path.with_suffix("")
+
+    def first(*suffixes: str) -> Path | None:
+        for suffix in suffixes:
+            candidate = base.with_suffix(suffix)
+            if candidate.exists():
+                return candidate
+        return None
+
+    return first(".yml", ".yaml"), first(".md", ".mdi")
 
 
 def load_metadata_pair(path: Path) -> Mapping[str, Any] | None:
@@ -380,6 +666,9 @@ def load_metadata_pair(path: Path) -> Mapping[str, Any] | None:
     those from Markdown when keys conflict and a :class:`UserWarning` is
     emitted. Returns ``None`` if neither file contains metadata.
 
+    Results are kept in :data:`parse_cache`, keyed by the pair's paths,
+    modification times and sizes, so unchanged files are not parsed again.
+
     Example
     -------
     >>> (tmp / 'post.md').write_text('---\ntitle: Draft\n---\n')
@@ -390,29 +679,31 @@ def load_metadata_pair(path: Path) -> Mapping[str, Any] | None:
     {'title': 'Example', 'id': 'post', 'path': ['post.yml', 'post.md']}
     """
 
-    base = path.with_suffix("")
-    md_path = base.with_suffix(".md")
-    mdi_path = base.with_suffix(".mdi")
-    yml_path = base.with_suffix(".yml")
-    yaml_path = base.with_suffix(".yaml")
+    meta_file, markdown_file = metadata_pair_files(path)
+    key = _parse_cache_key(path, meta_file, markdown_file)
+    if key is not None:
+        cached = parse_cache.get(key)
+        if cached is not MISSING:
+            return cached
+
+    combined = _load_metadata_pair(path, meta_file, markdown_file)
+    if key is not None:
+        parse_cache.set(key, combined)
+    return combined
+
+
+def _load_metadata_pair(
+    path: Path, meta_file: Path | None, markdown_file: Path | None
+) -> Mapping[str, Any] | None:
+    """Parse and merge ``meta_file`` and ``markdown_file`` for ``path``."""
 
     md_data = None
-    markdown_file: Path | None = None
-    if md_path.exists():
-        markdown_file = md_path
-    elif mdi_path.exists():
-        markdown_file = mdi_path
     if markdown_file:
         md_data = _read_from_markdown(str(markdown_file))
 
     meta_data = None
-    meta_file: Path | None = None
-    if yml_path.exists():
-        meta_file = yml_path
-        meta_data = read_from_yaml(str(yml_path))
-    elif yaml_path.exists():
-        meta_file = yaml_path
-        meta_data = read_from_yaml(str(yaml_path))
+    if meta_file:
+        meta_data = read_from_yaml(str(meta_file))
 
     if md_data is None and meta_data is None:
         return None
@@ -446,3 +737,53 @@ def load_metadata_pair(path: Path) -> Mapping[str, Any] | None:
 
     logger.debug("returning", combined=combined)
     return combined
+
+
+# Paths handed to each worker process at a time.
+DEFAULT_CHUNKSIZE = 16
+
+
+def load_metadata_pairs(
+    paths: Iterable[Path],
+    *,
+    jobs: int = 1,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    loader: Callable[[Path], Mapping[str, Any] | None] = load_metadata_pair,
+) -> Iterator[Mapping[str, Any] | None]:
+    """Yield ``loader(path)`` for each of *paths*, in order.
+
+    Parsing YAML holds the GIL, so with ``jobs`` greater than one the pairs
+    are parsed in a process pool using chunked ``map``. ``jobs`` of ``0``
+    uses every CPU. Only a bounded window of paths is submitted at a time,
+    which keeps memory flat for callers that stream the results. ``loader``
+    must be a module level function so it can be pickled; exceptions it
+    raises propagate to the caller. In a pool, when ``loader`` is
+    :func:`load_metadata_pair`, pairs found in :data:`parse_cache` are
+    returned by the parent without calling it, so cache statistics stay
+    accurate. Other loaders are always called.
+    """
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if jobs == 1:
+        for path in paths:
+            yield loader(path)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for window in batched(paths, jobs * chunksize * 4):
+            if loader is load_metadata_pair:
+                cached = [_cached_metadata_pair(path) for path in window]
+            else:
+                cached = [MISSING] * len(window)
+            misses = [path for path, hit in zip(window, cached) if hit is MISSING]
+            loaded = executor.map(loader, misses, chunksize=chunksize)
+            for hit in cached:
+                yield next(loaded) if hit is MISSING else hit
+
+
+if os.getenv("PIE_METADATA_CACHE_SIZE"):
+    enable_metadata_cache(
+        int(os.environ["PIE_METADATA_CACHE_SIZE"]),
+        float(os.getenv("PIE_METADATA_CACHE_INTERVAL", "1.0")),
+    )
@@ -12,10 +12,11 @@ from pathlib import Path
 from pie.cli import create_parser
 from pie.logging import logger, configure_logging
 from pie.metadata import (
+    get_metadata,
     get_metadata_by_path,
-    build_from_redis,
     load_metadata_pair,
 )
+from pie.utils import write_utf8
 
 
 def _load_metadata(filepath: str) -> dict | None:
@@ -23,7 +24,7 @@ def _load_metadata(filepath: str) -> dict | None:
     try:
         doc_id = get_metadata_by_path(filepath, "id")
         if doc_id:
-            meta = build_from_redis(f"{doc_id}.") or {}
+            meta = get_metadata(doc_id) or {}
             if "id" not in meta:
                 meta["id"] = doc_id
             logger.debug("Loaded metadata from redis", path=filepath, id=doc_id)
@@ -105,9 +106,10 @@ def main(argv: Sequence[str] | None = None) -> None:
     redirects = collect_redirects(args.source_dir)
     output = format_redirects(redirects)
     if args.output:
-        with open(args.output, "w", encoding="utf-8") as fh:
-            fh.write(output)
-        logger.info("Redirects written", path=args.output)
+        if write_utf8(output, args.output):
+            logger.info("Redirects written", path=args.output)
+        else:
+            logger.info("Redirects unchanged", path=args.output)
     else:
         print(output, end="")
 
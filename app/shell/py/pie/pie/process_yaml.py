@@ -14,7 +14,7 @@ from pie.filter.emojify import emojify_text
 from pie.logging import configure_logging, logger
 from pie.metadata import generate_missing_metadata
 from pie.render import jinja as render_jinja
-from pie.utils import write_yaml
+from pie.utils import log_write_stats, write_yaml
 from pie.yaml import yaml
 from ruamel.yaml import YAMLError
 
@@ -57,8 +57,9 @@ def main(argv: Iterable[str] | None = None) -> None:
     for path_str in args.paths:
         path = Path(path_str)
         metadata = _process_path(path)
-        write_yaml(metadata, str(path))
-        logger.debug("Processed YAML written", path=str(path))
+        if write_yaml(metadata, str(path)):
+            logger.debug("Processed YAML written", path=str(path))
+    log_write_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+"""Client for a build cache shared over HTTP.
+
+Set ``PIE_REMOTE_CACHE`` to the URL of a server, such as one started with
+``pie cache-server``, and the :class:`~pie.render.cache.RenderCache` of every
+machine reads and writes the same entries. The protocol has two namespaces,
+addressed by hex digests::
+
+    GET /ac/<key>       entry manifest, 200 or 404
+    PUT /ac/<key>       replace it
+    GET /cas/<sha1>     content whose SHA1 is <sha1>, 200 or 404
+    PUT /cas/<sha1>     store it
+
+Requests reuse keep-alive connections, at most
+``PIE_REMOTE_CACHE_CONNECTIONS`` at a time per process. Uploads are queued
+and sent by background threads while the build goes on. :func:`flush` waits
+for them, and so does every process, pool workers included, before it
+exits. Downloaded content is checked against its digest. A server that
+cannot be reached is reported once and then ignored for the rest of the
+process.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import http.client
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+from urllib.parse import urlsplit
+
+from pie.logging import logger
+
+__all__ = ["KINDS", "RemoteCache", "flush", "remote_cache"]
+
+#: Namespaces of the protocol: entry manifests and content by SHA1.
+KINDS = ("ac", "cas")
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_TIMEOUT = 10.0
+# Connection failures in a row after which the server is ignored.
+MAX_FAILURES = 3
+
+
+class RemoteCache:
+    """Get and put blobs on the cache server at *url*.
+
+    *connections* bounds the requests in flight and the upload threads.
+    With *upload* ``False`` the cache is only read. Requests, hits, bytes and
+    errors are counted for :meth:`stats`.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        connections: int = DEFAULT_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+        upload: bool = True,
+    ) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise ValueError(f"Unsupported remote cache URL: {url!r}")
+        self.url = url
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip("/")
+        self.connections = max(1, connections)
+        self.timeout = timeout
+        self.upload = upload
+        self.hits = 0
+        self.misses = 0
+        self.uploads = 0
+        self.bytes_down = 0
+        self.bytes_up = 0
+        self.errors = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        # Connections, threads and locks do not survive fork; workers that
+        # inherit this object start their own.
+        self._pid = os.getpid()
+        self._idle: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.connections)
+        self._uploader: ThreadPoolExecutor | None = None
+        self._pending: set[Future] = set()
+        self._lock = threading.Lock()
+
+    def _check_fork(self) -> None:
+        if os.getpid() != self._pid:
+            self._reset()
+
+    @property
+    def available(self) -> bool:
+        """``False`` once the server failed :data:`MAX_FAILURES` times in a row."""
+
+        return self._failures < MAX_FAILURES
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._scheme == "https":
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def _request(self, method: str, kind: str, key: str, body: bytes | None = None):
+        """Return the status and body of one request, reusing a connection."""
+
+        self._check_fork()
+        path = f"{self._prefix}/{kind}/{key}"
+        headers = {"Content-Type": "application/octet-stream"} if body is not None else {}
+        with self._slots:
+            # A reused connection may have been closed by the server; retry
+            # once on a new one.
+            for attempt in range(2):
+                try:
+                    conn = self._idle.get_nowait()
+                    reused = True
+                except queue.Empty:
+                    conn = self._connect()
+                    reused = False
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    data = response.read()
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._idle.put(conn)
+                return response.status, data
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def _failed(self, method: str, kind: str, key: str, exc: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+            self._failures += 1
+            failures = self._failures
+        if failures == MAX_FAILURES:
+            logger.warning(
+                "Remote cache unavailable, continuing without it",
+                url=self.url,
+                error=str(exc),
+            )
+        else:
+            logger.debug(
+                "Remote cache request failed", method=method, kind=kind, key=key, error=str(exc)
+            )
+
+    def get(self, kind: str, key: str) -> bytes | None:
+        """Return the blob stored under *kind*/*key*, or ``None``."""
+
+        if not self.available:
+            return None
+        try:
+            status, data = self._request("GET", kind, key)
+        except (OSError, http.client.HTTPException) as exc:
+            self._failed("GET", kind, key, exc)
+            return None
+        with self._lock:
+            self._failures = 0
+            if status != 200:
+                self.misses += 1
+                if status != 404:
+                    self.errors += 1
+                return None
+            if kind == "cas" and hashlib.sha1(data).hexdigest() != key:
+                self.errors += 1
+                self.misses += 1
+                logger.debug("Ignoring corrupt remote cache entry", key=key)
+                return None
+            self.hits += 1
+            self.bytes_down += len(data)
+        return data
+
+    def put(self, kind: str, key: str, data: bytes) -> bool:
+        """Store *data* under *kind*/*key* now and return whether it worked."""
+
+        if not (self.upload and self.available):
+            return False
+        try:
+            status, _ = self._request("PUT", kind, key, data)
+        except (OSError, http.client.HTTPException) as exc:
+            self._failed("PUT", kind, key, exc)
+            return False
+        with self._lock:
+            self._failures = 0
+            if status not in {200, 201, 204}:
+                self.errors += 1
+                return False
+            self.uploads += 1
+            self.bytes_up += len(data)
+        return True
+
+    def put_later(self, kind: str, key: str, data: bytes) -> None:
+        """Queue *data* for upload by a background thread."""
+
+        if not (self.upload and self.available):
+            return
+        self._check_fork()
+        with self._lock:
+            if self._uploader is None:
+                self._uploader = ThreadPoolExecutor(
+                    max_workers=self.connections, thread_name_prefix="pie-cache-upload"
+                )
+            future = self._uploader.submit(self.put, kind, key, data)
+            self._pending.add(future)
+        future.add_done_callback(self._uploaded)
+
+    def _uploaded(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def flush(self) -> None:
+        """Wait for the queued uploads."""
+
+        if os.getpid() != self._pid:
+            return
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.result()
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters, bytes moved and the hit rate."""
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uploads": self.uploads,
+            "bytes_down": self.bytes_down,
+            "bytes_up": self.bytes_up,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_remote: RemoteCache | None = None
+_remote_url: str | None = None
+
+
+def remote_cache() -> RemoteCache | None:
+    """Return the :class:`RemoteCache` for ``PIE_REMOTE_CACHE``, if set.
+
+    ``PIE_REMOTE_CACHE_CONNECTIONS`` bounds concurrent requests and
+    ``PIE_REMOTE_CACHE_UPLOAD=0`` makes the cache read-only.
+    """
+
+    global _remote, _remote_url
+    url = os.getenv("PIE_REMOTE_CACHE") or None
+    if url != _remote_url:
+        _remote_url = url
+        _remote = None
+        if url:
+            try:
+                _remote = RemoteCache(
+                    url,
+                    connections=int(
+                        os.getenv("PIE_REMOTE_CACHE_CONNECTIONS", DEFAULT_CONNECTIONS)
+                    ),
+                    upload=os.getenv("PIE_REMOTE_CACHE_UPLOAD", "1") != "0",
+                )
+            except ValueError as exc:
+                logger.warning("Ignoring remote cache", error=str(exc))
+    return _remote
+
+
+def flush() -> None:
+    """Wait for the uploads queued by :func:`remote_cache`."""
+
+    if _remote is not None:
+        _remote.flush()
@@ -0,0 +1,400 @@
+"""Content-addressed cache of rendered pages.
+
+Make only compares timestamps, so after ``make clean``, on a fresh checkout
+or on a CI runner every page is rendered again. ``render-html`` first looks
+each page up in a :class:`RenderCache` and restores the output it rendered
+last time when none of the page's inputs changed.
+
+A page is looked up in two steps, like ccache's manifest mode:
+
+1. The *page key* hashes what is known before rendering: the template, the
+   Markdown and context files (by content), the digest of the ``pie``
+   sources, the Jinja version and the settings in :data:`ENVIRONMENT`.
+2. The manifest stored under the page key lists the inputs recorded by
+   earlier renders (see :mod:`pie.dependencies`): the SHA1 of every file in
+   the page's depfile and the source digests stored for every metadata
+   document it read. The first entry whose inputs all still match names the
+   rendered output. Pages reading a document without stored digests, such
+   as one loaded from a JSON index, are not cached: nothing would notice a
+   change to it.
+
+Outputs are stored once per content hash. A restore copies the entry after
+checking its SHA1, so tools that rewrite outputs in place cannot change the
+cache and a damaged entry is dropped. The cache lives outside ``build`` so
+``make clean`` keeps it. With ``PIE_REMOTE_CACHE`` set, pages missing locally are fetched
+from a shared server and new entries are uploaded to it (see
+:mod:`pie.remote_cache`). It is split into :data:`SHARDS` directories, and after each write
+the least recently used files of that directory are removed to keep it
+within its share of the size limit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+import jinja2
+
+from pie.cache import cache_key, caching_enabled, code_digest, parse_size, trim_lru
+from pie.logging import logger
+from pie.remote_cache import RemoteCache, remote_cache
+from pie.utils import write_utf8
+
+__all__ = [
+    "DEFAULT_MAX_SIZE",
+    "ENVIRONMENT",
+    "RenderCache",
+    "file_digest",
+    "render_cache_dir",
+]
+
+#: Settings that change rendered output and so are part of every page key.
+ENVIRONMENT = ("BASE_URL", "PIE_DATA_DIR")
+
+DEFAULT_MAX_SIZE = 1 << 30
+SHARDS = 256
+# Input sets remembered per page key, most recent first.
+MAX_CANDIDATES = 4
+
+
+def render_cache_dir() -> Path:
+    """Return ``PIE_RENDER_CACHE_DIR`` or ``$XDG_CACHE_HOME/pie/render``."""
+
+    if os.getenv("PIE_RENDER_CACHE_DIR"):
+        return Path(os.environ["PIE_RENDER_CACHE_DIR"])
+    base = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pie" / "render"
+
+
+# ``{path: (mtime_ns, size, sha1)}``, so a file is read once per process.
+_digests: dict[str, tuple[int, int, str]] = {}
+
+
+def file_digest(path: str | Path) -> str | None:
+    """Return the SHA1 of the file at *path*, or ``None`` if it is missing."""
+
+    path = str(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    cached = _digests.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha1").hexdigest()
+    except OSError:
+        return None
+    _digests[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def _stored_digests(ids: Iterable[str]) -> dict[str, dict[str, str]]:
+    """Return the source digests stored for *ids*, ``{}`` for unknown ids."""
+
+    from pie.metadata import get_store
+
+    ids = sorted(ids)
+    stored = get_store().stored_digests(ids) if ids else {}
+    return {i: stored.get(i, {}) for i in ids}
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _copy_atomic(source: Path, path: Path) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class RenderCache:
+    """Rendered pages stored under *directory*, at most *max_size* bytes.
+
+    *directory* defaults to :func:`render_cache_dir` and *max_size* to
+    ``PIE_RENDER_CACHE_SIZE`` or 1 GiB. Pages missing locally are looked up
+    in *remote*, by default the :func:`~pie.remote_cache.remote_cache` named
+    by ``PIE_REMOTE_CACHE``, and new entries are uploaded to it. Restores,
+    stores, evicted files, uncacheable pages and errors are counted for
+    :meth:`stats`. Any
+    failure to read or write the cache is logged at debug level and the page
+    is rendered as usual.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        max_size: int | None = None,
+        remote: RemoteCache | None = None,
+    ) -> None:
+        self.directory = Path(directory) if directory else render_cache_dir()
+        if max_size is None:
+            size = os.getenv("PIE_RENDER_CACHE_SIZE")
+            max_size = parse_size(size) if size else DEFAULT_MAX_SIZE
+        self.max_size = max_size
+        self._remote = remote
+        self.hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.uncacheable = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return caching_enabled()
+
+    @property
+    def remote(self) -> RemoteCache | None:
+        return self._remote or remote_cache()
+
+    def _path(self, name: str, suffix: str) -> Path:
+        return self.directory / name[:2] / f"{name}{suffix}"
+
+    def page_key(
+        self, template: str, template_file: str | None, markdown: str, context: str | None
+    ) -> str:
+        """Return the key for rendering *markdown* into *template*."""
+
+        return cache_key(
+            "render-html",
+            code_digest(),
+            jinja2.__version__,
+            template,
+            template_file and file_digest(template_file),
+            markdown,
+            file_digest(markdown),
+            context,
+            context and file_digest(context),
+            tuple(os.getenv(name, "") for name in ENVIRONMENT),
+        )
+
+    def _parse_manifest(self, key: str, data: bytes) -> list[dict[str, Any]]:
+        try:
+            entries = json.loads(data)
+            if isinstance(entries, list) and all(
+                {"files", "ids", "output"} <= set(e) for e in entries
+            ):
+                return entries
+            raise ValueError("not a list of entries")
+        except Exception as exc:
+            self.errors += 1
+            logger.debug("Ignoring unreadable render manifest", key=key, error=str(exc))
+            return []
+
+    def _manifest(self, key: str) -> list[dict[str, Any]]:
+        try:
+            data = self._path(key, ".manifest").read_bytes()
+        except FileNotFoundError:
+            return []
+        return self._parse_manifest(key, data)
+
+    def _matches(self, entry: dict[str, Any]) -> bool:
+        if any(file_digest(p) != d for p, d in entry["files"].items()):
+            return False
+        if not entry["ids"]:
+            return True
+        stored = _stored_digests(entry["ids"])
+        return all(stored.values()) and stored == entry["ids"]
+
+    def restore(self, key: str, output: str | Path) -> list[str] | None:
+        """Restore the output cached under *key* to *output*.
+
+        Returns the files the cached render depended on, or ``None`` on a
+        miss.
+        """
+
+        try:
+            for entry in self._manifest(key):
+                source = self._path(entry["output"], ".html")
+                if not source.exists() or not self._matches(entry):
+                    continue
+                if not self._copy(source, entry["output"], Path(output)):
+                    continue
+                os.utime(self._path(key, ".manifest"))
+                self.hits += 1
+                return sorted(entry["files"])
+            files = self._restore_remote(key, Path(output))
+            if files is not None:
+                self.hits += 1
+                self.remote_hits += 1
+                return files
+        except Exception as exc:
+            self.errors += 1
+            logger.debug("Render cache lookup failed", key=key, error=str(exc))
+        self.misses += 1
+        return None
+
+    def _restore_remote(self, key: str, output: Path) -> list[str] | None:
+        remote = self.remote
+        if remote is None:
+            return None
+        data = remote.get("ac", key)
+        if data is None:
+            return None
+        for entry in self._parse_manifest(key, data):
+            if not self._matches(entry):
+                continue
+            source = self._path(entry["output"], ".html")
+            if not source.exists():
+                content = remote.get("cas", entry["output"])
+                if content is None:
+                    continue
+                _write_atomic(source, content)
+            if not self._copy(source, entry["output"], output):
+                continue
+            self._add_entry(key, entry)
+            for shard in {source.parent, self._path(key, "").parent}:
+                self.trim(shard)
+            return sorted(entry["files"])
+        return None
+
+    def _copy(self, source: Path, digest: str, output: Path) -> bool:
+        """Copy the entry *source* to *output* if its SHA1 is still *digest*.
+
+        A damaged entry is removed and ``False`` returned. An output already
+        holding the page is left alone.
+        """
+
+        data = source.read_bytes()
+        if hashlib.sha1(data).hexdigest() != digest:
+            self.errors += 1
+            logger.debug("Dropping damaged render cache entry", file=str(source))
+            source.unlink(missing_ok=True)
+            return False
+        write_utf8(data.decode("utf-8"), str(output))
+        # Marks the entry as recently used for trim().
+        os.utime(source)
+        return True
+
+    def _add_entry(self, key: str, entry: dict[str, Any]) -> bytes:
+        """Put *entry* first in the manifest of *key* and return the manifest."""
+
+        entries = [e for e in self._manifest(key) if e != entry]
+        entries.insert(0, entry)
+        data = json.dumps(entries[:MAX_CANDIDATES], sort_keys=True).encode("utf-8")
+        _write_atomic(self._path(key, ".manifest"), data)
+        return data
+
+    def store(
+        self, key: str, html: str, files: Iterable[str], ids: Iterable[str]
+    ) -> None:
+        """Record that *files* and documents *ids* rendered to *html*."""
+
+        data = html.encode("utf-8")
+        self._store(
+            key,
+            hashlib.sha1(data).hexdigest(),
+            files,
+            ids,
+            lambda output: _write_atomic(output, data),
+            lambda: data,
+        )
+
+    def store_file(
+        self, key: str, path: str | Path, files: Iterable[str], ids: Iterable[str]
+    ) -> None:
+        """Like :meth:`store`, for a page already written to *path*.
+
+        The page is copied into the cache rather than read into memory. It
+        is read whole only to upload it to the remote cache.
+        """
+
+        digest = file_digest(path)
+        if digest is None:
+            self.errors += 1
+            logger.debug("Rendered page missing", key=key, path=str(path))
+            return
+        self._store(
+            key,
+            digest,
+            files,
+            ids,
+            lambda output: _copy_atomic(Path(path), output),
+            lambda: Path(path).read_bytes(),
+        )
+
+    def _store(
+        self,
+        key: str,
+        digest: str,
+        files: Iterable[str],
+        ids: Iterable[str],
+        write: Callable[[Path], None],
+        read: Callable[[], bytes],
+    ) -> None:
+        try:
+            stored = _stored_digests(set(ids))
+            unknown = [doc_id for doc_id, digests in stored.items() if not digests]
+            if unknown:
+                self.uncacheable += 1
+                logger.debug("Not caching page reading undigested documents", key=key, ids=unknown)
+                return
+            output = self._path(digest, ".html")
+            if output.exists():
+                os.utime(output)
+            else:
+                write(output)
+            entry = {
+                "files": {p: file_digest(p) for p in sorted(set(files))},
+                "ids": stored,
+                "output": digest,
+            }
+            manifest = self._add_entry(key, entry)
+        except Exception as exc:
+            self.errors += 1
+            logger.debug("Failed to write render cache entry", key=key, error=str(exc))
+            return
+        self.writes += 1
+        remote = self.remote
+        if remote is not None:
+            try:
+                remote.put_later("cas", digest, read())
+            except OSError as exc:
+                logger.debug("Failed to read rendered page", key=key, error=str(exc))
+            else:
+                remote.put_later("ac", key, manifest)
+        for shard in {output.parent, self._path(key, "").parent}:
+            self.trim(shard)
+
+    def trim(self, shard: Path) -> None:
+        """Remove the least recently used files of *shard* over its share."""
+
+        self.evictions += trim_lru(shard, self.max_size // SHARDS)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and the hit rate."""
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "remote_hits": self.remote_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "uncacheable": self.uncacheable,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
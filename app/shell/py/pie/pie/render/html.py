@@ -7,26 +7,51 @@ The module exposes :func:`render_page` and a small CLI used by the
 matter which is merged into the Jinja context before rendering. Markdown is
 converted using the :mod:`cmarkgfm` library which supports GitHub Flavored
 Markdown, including tables, to match behaviour used across the press tooling.
+
+``render-html --batch MANIFEST`` renders many pages in one process, so
+imports, the Jinja environment and fetched metadata are shared between them.
+
+Pages whose inputs are unchanged since an earlier render are restored from
+:data:`render_cache` instead (see :mod:`pie.render.cache`).
 """
 
 from __future__ import annotations
 
 import argparse
+import json
+import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Mapping
+from typing import Any, Iterable, Iterator, Mapping, NamedTuple
 
 import cmarkgfm
 
-from pie.cli import create_parser
-from pie.logging import configure_logging
-from pie.utils import read_utf8, write_utf8
+from pie.cli import add_jobs_argument, create_parser
+from pie.dependencies import (
+    Dependencies,
+    depfile_path,
+    read_depfile,
+    record_dependencies,
+    write_depfile,
+)
+from pie.logging import configure_logging, logger
+from pie.utils import log_write_stats, read_utf8, write_utf8_chunks
 from pie.yaml import yaml, read_yaml as load_yaml_file
-from .jinja import create_env, render_jinja
+from .cache import RenderCache
+from .jinja import env, link_memo, markdown_cache
+from .jinja.snippets import snippet_cache
 
 _front_matter_re = re.compile(r"^---\n(.*?)\n---\n(.*)", re.DOTALL)
 
-env = create_env()
+# ``env`` is the environment :mod:`pie.render.jinja` builds at import, so it
+# is created once per process. Assign another one here to override it.
+
+# Rendered pages, kept across ``make clean``.
+render_cache = RenderCache()
 
 def _parse_markdown(path: str | Path) -> tuple[dict, str]:
     text = read_utf8(str(path))
@@ -56,32 +81,260 @@ def render_page(
         Optional mapping providing variables merged with any YAML metadata
         from the Markdown file.
     """
+    return "".join(stream_page(template_path, markdown_path, context))
+
+
+def stream_page(
+    template_path: str | Path,
+    markdown_path: str | Path,
+    context: Mapping[str, Any] | None = None,
+) -> Iterator[str]:
+    """Yield the HTML of :func:`render_page` piece by piece.
+
+    The template is rendered with :meth:`jinja2.Template.generate`, so the
+    whole page is never held in memory at once.
+    """
     metadata, md_text = _parse_markdown(markdown_path)
     ctx = dict(context or {})
     ctx.update(metadata)
     ctx['markdown_path'] = markdown_path
     tmpl = env.get_template(template_path)
-    html_text = tmpl.render(**ctx)
-    return html_text
+    return tmpl.generate(**ctx)
+
+class RenderJob(NamedTuple):
+    """One page listed in a ``render-html --batch`` manifest."""
+
+    template: str
+    markdown: str
+    context: str | None
+    output: str
+
+
+def read_manifest(path: str) -> list[RenderJob]:
+    """Return the jobs in the JSON Lines manifest *path* (``-`` for stdin).
+
+    Each line is an object with ``template``, ``markdown``, ``context`` and
+    ``output`` keys, or a list of those four values. Blank lines are skipped.
+    """
+
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    jobs: list[RenderJob] = []
+    try:
+        for lineno, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if isinstance(entry, dict):
+                    jobs.append(RenderJob(**entry))
+                else:
+                    jobs.append(RenderJob(*entry))
+            except (TypeError, ValueError) as exc:
+                logger.error(
+                    "Invalid manifest entry", manifest=path, line=lineno, error=str(exc)
+                )
+                raise SystemExit(1)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return jobs
+
+
+@lru_cache(maxsize=None)
+def _template_file(name: str) -> str | None:
+    """Return the file *name* is loaded from, or ``None`` if not found."""
+
+    if os.path.exists(name):
+        return name
+    try:
+        return env.loader.get_source(env, name)[1]
+    except Exception:
+        return None
+
+
+def is_stale(job: RenderJob) -> bool:
+    """Return ``True`` unless *job*'s depfile is newer than its sources.
+
+    The depfile is written on every render, while an unchanged output keeps
+    its modification time, so it stands for the last render. The sources
+    include the files listed in the depfile. A missing output is stale.
+    """
+
+    try:
+        built = os.stat(depfile_path(job.output)).st_mtime_ns
+    except FileNotFoundError:
+        return True
+    if not os.path.exists(job.output):
+        return True
+    sources = [_template_file(job.template), job.markdown]
+    if job.context:
+        sources.append(job.context)
+    sources.extend(read_depfile(depfile_path(job.output)))
+    for source in sources:
+        try:
+            if source is None or os.stat(source).st_mtime_ns > built:
+                return True
+        except FileNotFoundError:
+            return True
+    return False
+
+
+def write_page(job: RenderJob) -> bool:
+    """Render *job* to its output file and write the output's depfile.
+
+    The depfile lists the source files of every document and the data files
+    the render read; see :mod:`pie.dependencies`. A page found in
+    :data:`render_cache` is restored with its depfile instead of rendered.
+    Returns ``False`` if the output already held the rendered page.
+    """
+
+    key = None
+    if render_cache.enabled:
+        key = render_cache.page_key(
+            job.template, _template_file(job.template), job.markdown, job.context
+        )
+        files = render_cache.restore(key, job.output)
+        if files is not None:
+            write_depfile(job.output, Dependencies(files=set(files)))
+            return True
+    ctx = load_yaml_file(job.context) if job.context else {}
+    with record_dependencies() as deps:
+        # An unchanged output keeps its mtime; the depfile is the stamp.
+        changed = write_utf8_chunks(stream_page(job.template, job.markdown, ctx), job.output)
+    deps.resolve()
+    write_depfile(job.output, deps)
+    if key is not None:
+        render_cache.store_file(key, job.output, deps.files - {job.output}, deps.ids)
+    return changed
+
+
+def render_job(job: RenderJob) -> tuple[bool, str | None]:
+    """Render *job* to its output file.
+
+    Returns whether the output changed and an error message on failure.
+    """
+
+    try:
+        changed = write_page(job)
+    except (Exception, SystemExit) as exc:
+        logger.opt(exception=exc).debug("Render failed", output=job.output)
+        return False, f"{type(exc).__name__}: {exc}"
+    logger.debug("Rendered", output=job.output, changed=changed)
+    return changed, None
+
+
+def render_batch(
+    manifest: Iterable[RenderJob], *, jobs: int = 1, stale_only: bool = False
+) -> dict[str, int]:
+    """Render every page in *manifest* and return counts by outcome.
+
+    Pages are rendered in this process, or in ``jobs`` forked workers that
+    inherit its environment when greater than one (``0`` uses every CPU).
+    Each worker keeps its own metadata cache across the pages it renders. A
+    failing page is logged and does not stop the others. ``unchanged``
+    counts the rendered pages whose output already held the same bytes.
+    """
+
+    pending = list(manifest)
+    counts = {"rendered": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    if stale_only:
+        stale = [job for job in pending if is_stale(job)]
+        counts["skipped"] = len(pending) - len(stale)
+        pending = stale
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(pending))
+    if jobs <= 1:
+        results = map(render_job, pending)
+        outcomes = list(zip(pending, results))
+    else:
+        chunksize = max(1, len(pending) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = executor.map(render_job, pending, chunksize=chunksize)
+            outcomes = list(zip(pending, results))
+
+    for job, (changed, error) in outcomes:
+        if error is None:
+            counts["rendered"] += 1
+            counts["unchanged"] += not changed
+        else:
+            counts["failed"] += 1
+            logger.error("Failed to render page", output=job.output, error=error)
+    return counts
+
+
+def log_render_cache_stats() -> None:
+    """Log the render, snippet, link and Markdown cache statistics at debug level.
+
+    Queued uploads to the remote cache are waited for first.
+    """
+
+    logger.debug("Snippet cache", **snippet_cache.stats())
+    logger.debug("Link memo", **link_memo.stats())
+    logger.debug("Markdown cache", **markdown_cache.stats())
+    if not render_cache.enabled:
+        return
+    logger.debug("Render cache", **render_cache.stats())
+    remote = render_cache.remote
+    if remote is not None:
+        remote.flush()
+        logger.debug("Remote cache", url=remote.url, **remote.stats())
+
 
 def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     """Parse command line arguments."""
     parser = create_parser(
         "Render a Markdown file into an HTML template",
     )
-    parser.add_argument("template_path", help="Jinja template file")
-    parser.add_argument("markdown_path", help="Markdown source file")
-    parser.add_argument("context")
-    parser.add_argument("output")
-    return parser.parse_args(argv)
+    parser.add_argument("template_path", nargs="?", help="Jinja template file")
+    parser.add_argument("markdown_path", nargs="?", help="Markdown source file")
+    parser.add_argument("context", nargs="?")
+    parser.add_argument("output", nargs="?")
+    parser.add_argument(
+        "--batch",
+        metavar="MANIFEST",
+        help="Render every page listed in a JSON Lines manifest ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--stale-only",
+        action="store_true",
+        help="With --batch, skip pages whose output is newer than its sources",
+    )
+    add_jobs_argument(parser, "rendering --batch pages")
+    args = parser.parse_args(argv)
+    positional = [args.template_path, args.markdown_path, args.context, args.output]
+    if args.batch is not None and any(positional):
+        parser.error("--batch does not take template, markdown, context or output")
+    if args.batch is None and not all(positional):
+        parser.error("template_path, markdown_path, context and output are required")
+    return args
+
 
 def main(argv: list[str] | None = None) -> None:
     """Entry point for the ``render-html`` console script."""
     args = parse_args(argv)
     configure_logging(args.verbose, args.log)
-    ctx = load_yaml_file(args.context) if args.context else {}
-    rendered = render_page(args.template_path, args.markdown_path, ctx)
-    write_utf8(rendered, args.output)
+    if args.batch is not None:
+        start = time.perf_counter()
+        manifest = read_manifest(args.batch)
+        counts = render_batch(manifest, jobs=args.jobs, stale_only=args.stale_only)
+        logger.info(
+            "batch complete",
+            pages=len(manifest),
+            **counts,
+            elapsed=f"{time.perf_counter() - start:.2f}s",
+        )
+        log_render_cache_stats()
+        log_write_stats()
+        if counts["failed"]:
+            raise SystemExit(1)
+        return
+    write_page(
+        RenderJob(args.template_path, args.markdown_path, args.context, args.output)
+    )
+    log_render_cache_stats()
+    log_write_stats()
 
 if __name__ == "__main__":
     main()
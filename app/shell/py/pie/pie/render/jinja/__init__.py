@@ -12,29 +12,38 @@ import json
 import os
 import re
 import sys
+from collections import OrderedDict
 from pathlib import Path
 
 import cmarkgfm
 import emoji
+import jinja2
 import pie
 import pie.metadata as metadata_module
 from jinja2 import (
     Environment,
+    FileSystemBytecodeCache,
     FileSystemLoader,
     StrictUndefined,
     TemplateNotFound,
     TemplateSyntaxError,
 )
 from markupsafe import Markup
-from pie.metadata import get_cached_metadata, get_metadata
+from pie.metadata import get_cached_metadata, get_metadata, get_metadata_many
+from pie.cache import DEFAULT_CACHE_ROOT, cache_key, caching_enabled, code_digest
 from pie.cli import create_parser
+from pie.dependencies import record_file
+from pie.filter.emojify import emojify_text
 from pie.logging import configure_logging, logger
-from pie.utils import read_json, read_utf8, write_utf8
+from pie.utils import log_write_stats, read_json, read_utf8, write_utf8_chunks
 from pie.yaml import read_yaml as load_yaml_file
 from pie.yaml import yaml
 from ruamel.yaml import YAMLError
 
+from .compiled import compiled_loader
 from .figure import render as render_figure
+from .markdown import create_markdown_cache, package_version
+from .snippets import snippet_cache
 
 figure = render_figure
 
@@ -104,6 +113,60 @@ def _resolve_citation(desc: dict, selector: str) -> tuple[str, bool]:
     return citation_val, needs_parens
 
 
+class LinkMemo:
+    """Bounded LRU memo of the link HTML rendered for metadata ids.
+
+    Entries are keyed by the call's arguments and remember the metadata
+    documents they were rendered from. An entry is only used while
+    :func:`get_cached_metadata` still returns those same objects, so links
+    are rendered again once a new index generation is loaded. Entries are
+    evicted least recently used first once *maxsize* is exceeded; hits,
+    misses and evictions are counted for :meth:`stats`.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, tuple[tuple, str]] = OrderedDict()
+
+    def get(self, key: tuple, docs, render) -> str:
+        """Return the HTML for *key*, calling *render* unless memoized."""
+
+        cached = self._entries.get(key)
+        if cached is not None and all(a is b for a, b in zip(cached[0], docs)):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        html = render()
+        self._entries[key] = (tuple(docs), html)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return html
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the hit rate."""
+
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+link_memo = LinkMemo(int(os.getenv("PIE_LINK_MEMO_SIZE", 4096)))
+
+
 def render_link(
     desc,
     *,
@@ -121,15 +184,26 @@ def render_link(
     character. ``use_icon`` defaults to ``False``; when set to ``True`` any
     ``icon`` field is prefixed to the citation. ``citation`` selects which field
     under ``doc.citation`` to use or overrides the citation text entirely; pass
-    ``"short"`` to use ``doc.citation["short"]``.
+    ``"short"`` to use ``doc.citation["short"]``. Anchors for string ids are
+    memoized in :data:`link_memo`.
     """
 
     if isinstance(desc, str):
-        desc = get_cached_metadata(desc)
-    elif not isinstance(desc, dict):
+        doc = get_cached_metadata(desc)
+        return link_memo.get(
+            ("link", desc, style, use_icon, citation, anchor),
+            (doc,),
+            lambda: _format_link(doc, style, use_icon, citation, anchor),
+        )
+    if not isinstance(desc, dict):
         logger.error("Invalid descriptor type", type=str(type(desc)))
         raise SystemExit(1)
+    return _format_link(desc, style, use_icon, citation, anchor)
+
 
+def _format_link(
+    desc: dict, style: str, use_icon: bool, citation: str, anchor: str | None
+) -> str:
     citation_text, needs_parens = _resolve_citation(desc, citation)
 
     # Apply requested capitalisation style
@@ -222,18 +296,29 @@ def definition(desc):
 def cite(*names: str) -> str:
     """Return Chicago style citation links for ``names``.
 
-    Each ``name`` is looked up using :func:`get_cached_metadata`.
+    Each ``name`` is looked up using :func:`get_cached_metadata`. When
+    several ids are given they are prefetched in one batch with
+    :func:`get_metadata_many`.
     ``doc.citation`` may be a simple string (legacy format) or a mapping with
     ``author``, ``year`` and ``page`` keys. When multiple references share the
     same author, year and URL their page numbers are combined.
 
     When a single reference is provided the parentheses are included inside the
     returned anchor.  Multiple references are separated by ``;`` with the outer
-    parentheses wrapping the entire group.
+    parentheses wrapping the entire group. Citations of ids only are memoized
+    in :data:`link_memo`.
     """
 
+    ids = [n for n in names if isinstance(n, str)]
+    if len(ids) > 1:
+        get_metadata_many(ids)
     descs = [get_cached_metadata(n) if isinstance(n, str) else n for n in names]
+    if len(ids) < len(names):
+        return _format_citations(descs)
+    return link_memo.get(("cite", *names), descs, lambda: _format_citations(descs))
 
+
+def _format_citations(descs: list[dict]) -> str:
     groups: list[dict] = []
     for d in descs:
         cit = d.get("doc", {}).get("citation")
@@ -344,9 +429,13 @@ def get_desc(name):
 
 
 def render_jinja(snippet):
-    """Render a Jinja snippet using the current environment."""
+    """Render a Jinja snippet using the current environment.
+
+    Compiled snippets, and optionally their output, are reused through
+    :data:`~pie.render.jinja.snippets.snippet_cache`.
+    """
     logger.debug("", snippet=snippet)
-    return env.from_string(snippet).render()
+    return snippet_cache.render(env, snippet)
 
 
 def to_alpha_index(i):
@@ -358,6 +447,7 @@ def to_alpha_index(i):
 def read_yaml(filename):
     """Read ``filename`` as YAML and yield the ``toc`` sequence."""
 
+    record_file(filename)
     y = yaml.load(read_utf8(filename))
     yield from y["toc"]
 
@@ -380,24 +470,129 @@ def load_config(path: str | Path = DEFAULT_CONFIG) -> dict:
         raise SystemExit(1)
 
 
+# cmark options of the ``press`` filter.
+PRESS_OPTIONS = (
+    cmarkgfm.Options.CMARK_OPT_UNSAFE | cmarkgfm.Options.CMARK_OPT_FOOTNOTES
+)
+
+markdown_cache = create_markdown_cache(
+    "press",
+    int(PRESS_OPTIONS),
+    emoji.__version__,
+    package_version("cmarkgfm"),
+    code_digest(),
+)
+
+
+def _press_html(text: str) -> str:
+    text = emojify_text(text)
+    return cmarkgfm.github_flavored_markdown_to_html(text, options=PRESS_OPTIONS)
+
+
 def render_press(text):
-    text = emoji.emojize(text, language='alias')
-    return Markup(
-        cmarkgfm.github_flavored_markdown_to_html(
-            text,
-            options=(
-                cmarkgfm.Options.CMARK_OPT_UNSAFE
-                | cmarkgfm.Options.CMARK_OPT_FOOTNOTES
-            ),
-        )
-    )
+    """Return Markdown *text* with emoji aliases as HTML.
+
+    Repeated texts are converted once, see
+    :mod:`pie.render.jinja.markdown`.
+    """
 
-def create_env():
-    """Create and configure the Jinja2 environment."""
+    return Markup(markdown_cache.get(text, _press_html))
+
+
+def _template_dependency(filename: str) -> str:
+    """Return *filename* relative to the working directory when inside it."""
+
+    relative = os.path.relpath(filename)
+    return filename if relative.startswith("..") else relative
+
+
+class DependencyEnvironment(Environment):
+    """Environment that reports every template file it hands out.
+
+    ``extends``, ``include`` and ``import`` resolve templates through
+    :meth:`get_template` and :meth:`select_template`, including templates
+    already in the cache, so open :func:`pie.dependencies.record_dependencies`
+    recorders see the full transitive set a page used. ``global_templates``
+    are loaded once when the environment is created, like ``macros.jinja``,
+    and are reported with every template.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.global_templates: list[str] = []
+
+    def _record(self, template):
+        if template.filename:
+            record_file(_template_dependency(template.filename))
+        for filename in self.global_templates:
+            record_file(_template_dependency(filename))
+        return template
+
+    def get_template(self, *args, **kwargs):
+        return self._record(super().get_template(*args, **kwargs))
+
+    def select_template(self, *args, **kwargs):
+        return self._record(super().select_template(*args, **kwargs))
+
+
+# Compiled templates shared by every render process.
+BYTECODE_CACHE_DIR = DEFAULT_CACHE_ROOT / "jinja"
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """Jinja bytecode cache under ``build/.cache/jinja``.
+
+    Entries are keyed by template name, file and Jinja version, and Jinja
+    discards an entry whose source checksum no longer matches, so an edited
+    template is compiled again. Files are replaced atomically, which makes the
+    directory safe to share between parallel renders. ``PIE_NO_CACHE`` is
+    checked on every lookup like :class:`pie.cache.DiskCache`.
+    """
+
+    def __init__(self, directory: str | Path = BYTECODE_CACHE_DIR) -> None:
+        super().__init__(str(directory), "%s.jinja-bytecode")
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get_cache_key(self, name, filename=None):
+        return cache_key(name, filename, jinja2.__version__)
+
+    def load_bytecode(self, bucket):
+        if not caching_enabled():
+            return
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def dump_bytecode(self, bucket):
+        if not caching_enabled():
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            super().dump_bytecode(bucket)
+        except OSError as exc:
+            logger.debug("Failed to write Jinja bytecode", error=str(exc))
+            return
+        self.writes += 1
+
+
+def create_env(bytecode_cache: jinja2.BytecodeCache | None = None):
+    """Create and configure the Jinja2 environment.
+
+    Compiled templates are shared through *bytecode_cache*, a
+    :class:`BytecodeCache` under :data:`BYTECODE_CACHE_DIR` by default.
+    Templates written by ``pie templates compile`` are imported instead of
+    compiled while their sources are unchanged (see
+    :mod:`pie.render.jinja.compiled`).
+    """
 
     data_dir = os.environ.get("PIE_DATA_DIR", "/data")
-    env = Environment(
-        loader=FileSystemLoader([data_dir, "/press/templates"]),
+    env = DependencyEnvironment(
+        loader=compiled_loader(FileSystemLoader([data_dir, "/press/templates"])),
+        bytecode_cache=bytecode_cache or BytecodeCache(),
         undefined=StrictUndefined,
         autoescape=False,
         lstrip_blocks=True,
@@ -419,9 +614,9 @@ def create_env():
     env.globals["render_jinja"] = render_jinja
     env.globals["to_alpha_index"] = to_alpha_index
     env.filters["press"] = render_press
-    env.globals["anchor"] = env.get_template(
-        "macros.jinja"
-    ).module.anchor
+    macros = env.get_template("macros.jinja")
+    env.global_templates.append(os.path.abspath(macros.filename))
+    env.globals["anchor"] = macros.module.anchor
     return env
 
 
@@ -460,8 +655,8 @@ def main(argv: list[str] | None = None) -> None:
     global config
     config = load_config(args.config)
     template = env.get_template(args.template)
-    rendered = template.render()
-    write_utf8(rendered, args.output)
+    write_utf8_chunks(template.generate(), args.output)
+    log_write_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+"""Ahead-of-time compiled templates loaded through Jinja's ``ModuleLoader``.
+
+``pie templates compile`` runs :meth:`jinja2.Environment.compile_templates`
+over the template search path and writes the Python modules, byte compiled,
+to :data:`DEFAULT_COMPILED_PATH`, a directory, or to a zip archive. A
+``manifest.json`` next to the modules records the source file, size and
+modification time of each template.
+
+:func:`pie.render.jinja.create_env` wraps its loader in a
+:class:`CompiledLoader` when the compiled templates exist. A template whose
+source still matches the manifest is imported from its module, with no
+source read or parse. A template that is missing from the manifest or whose
+source changed is loaded from the file system as before.
+"""
+
+from __future__ import annotations
+
+import compileall
+import json
+import os
+import py_compile
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from jinja2 import BaseLoader, Environment, ModuleLoader
+from jinja2.utils import internalcode
+
+from pie.cache import DEFAULT_CACHE_ROOT, caching_enabled
+from pie.logging import logger
+
+__all__ = [
+    "DEFAULT_COMPILED_PATH",
+    "CompiledLoader",
+    "compile_templates",
+    "compiled_loader",
+    "compiled_templates_path",
+]
+
+DEFAULT_COMPILED_PATH = DEFAULT_CACHE_ROOT / "jinja-modules"
+MANIFEST = "manifest.json"
+
+
+def compiled_templates_path() -> Path | None:
+    """Return the compiled templates to load, or ``None``.
+
+    ``PIE_COMPILED_TEMPLATES`` overrides :data:`DEFAULT_COMPILED_PATH`.
+    Nothing is returned when the path does not exist or ``PIE_NO_CACHE`` is
+    set.
+    """
+
+    if not caching_enabled():
+        return None
+    path = Path(os.getenv("PIE_COMPILED_TEMPLATES", DEFAULT_COMPILED_PATH))
+    return path if path.exists() else None
+
+
+def _read_manifest(path: Path) -> dict[str, dict[str, Any]]:
+    if path.is_dir():
+        return json.loads((path / MANIFEST).read_text(encoding="utf-8"))
+    with zipfile.ZipFile(path) as archive:
+        return json.loads(archive.read(MANIFEST))
+
+
+def _signature(filename: str) -> list[int] | None:
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class CompiledLoader(BaseLoader):
+    """Load templates from compiled modules, falling back to *fallback*.
+
+    Templates still load from source if the manifest does not list them or
+    their source file changed since compiling. Compiled templates report
+    the source file as their ``filename``, so dependency tracking is
+    unchanged, and go stale in the environment's cache when it changes.
+    """
+
+    def __init__(self, path: str | Path, fallback: BaseLoader) -> None:
+        self.path = Path(path)
+        self.fallback = fallback
+        self.modules = ModuleLoader(self.path)
+        self.manifest = _read_manifest(self.path)
+        self.compiled = 0
+        self.stale = 0
+
+    def get_source(self, environment: Environment, template: str):
+        return self.fallback.get_source(environment, template)
+
+    def list_templates(self) -> list[str]:
+        return self.fallback.list_templates()
+
+    @internalcode
+    def load(self, environment: Environment, name: str, globals=None):
+        entry = self.manifest.get(name)
+        if entry is not None and _signature(entry["filename"]) == entry["signature"]:
+            template = self.modules.load(environment, name, globals)
+            filename = entry["filename"]
+            template.filename = filename
+            template._uptodate = lambda: _signature(filename) == entry["signature"]
+            self.compiled += 1
+            return template
+        if entry is not None:
+            self.stale += 1
+        return self.fallback.load(environment, name, globals)
+
+
+def compiled_loader(fallback: BaseLoader) -> BaseLoader:
+    """Return a :class:`CompiledLoader` over *fallback* if templates were compiled.
+
+    Unreadable compiled templates are reported and ignored.
+    """
+
+    path = compiled_templates_path()
+    if path is None:
+        return fallback
+    try:
+        return CompiledLoader(path, fallback)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as exc:
+        logger.warning("Ignoring compiled templates", path=str(path), error=str(exc))
+        return fallback
+
+
+def compile_templates(
+    env: Environment,
+    target: str | Path = DEFAULT_COMPILED_PATH,
+    *,
+    extensions: Iterable[str] = ("jinja",),
+    zip: bool = False,
+    log_function: Callable[[str], None] | None = None,
+) -> dict[str, dict[str, Any]]:
+    """Compile the templates *env*'s loader lists into *target*.
+
+    *env* should load from source; its filters and settings are used for
+    compiling. The modules and their byte code are written to a directory,
+    or to a zip archive with *zip*, and replace *target* once complete.
+    Templates that fail to compile are skipped and load from source later.
+    Returns the manifest.
+    """
+
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    compiled: list[str] = []
+
+    def log(message: str) -> None:
+        if message.startswith('Compiled "'):
+            compiled.append(message.split('"')[1])
+        if log_function is not None:
+            log_function(message)
+
+    modules = tmp.with_suffix(".modules") if zip else tmp
+    env.compile_templates(
+        modules, extensions=list(extensions), zip=None, log_function=log
+    )
+    manifest: dict[str, dict[str, Any]] = {}
+    for name in compiled:
+        _, filename, _ = env.loader.get_source(env, name)
+        filename = os.path.abspath(filename)
+        manifest[name] = {"filename": filename, "signature": _signature(filename)}
+    (modules / MANIFEST).write_text(
+        json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8"
+    )
+    # Write the byte code too: imports then skip compiling the modules, even
+    # where PYTHONDONTWRITEBYTECODE is set. The manifest decides staleness.
+    compileall.compile_dir(
+        modules,
+        quiet=1,
+        legacy=zip,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+    if zip:
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as archive:
+            for path in sorted(modules.iterdir()):
+                archive.write(path, path.name)
+        shutil.rmtree(modules)
+
+    old = target.with_name(f"{target.name}.{os.getpid()}.old")
+    if target.exists():
+        os.replace(target, old)
+    os.replace(tmp, target)
+    if old.is_dir():
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        old.unlink(missing_ok=True)
+    return manifest
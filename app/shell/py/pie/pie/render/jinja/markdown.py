@@ -0,0 +1,140 @@
+"""Reuse the HTML :func:`~pie.render.jinja.render_press` makes from Markdown.
+
+Definitions, glossary entries and included fragments go through the
+``press`` filter on many pages with the same text, and every call runs
+``emoji.emojize`` and cmark again. :class:`MarkdownCache` keeps the output
+in memory, keyed by the text, and optionally on disk under
+``build/.cache/md``, keyed by the SHA1 of the text. The disk key also covers
+the converter's options and library versions, passed as *salt*.
+
+``PIE_MD_CACHE_SIZE`` bounds the memory cache (default ``32M``, ``0``
+disables it). ``PIE_MD_CACHE_DISK=1`` adds the disk cache, bounded by
+``PIE_MD_CACHE_DISK_SIZE`` (default ``256M``) and shared by every render
+process of a build.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Callable
+
+from pie.cache import DEFAULT_CACHE_ROOT, MISSING, DiskCache, cache_key, parse_size, trim_lru
+
+__all__ = [
+    "MARKDOWN_CACHE_DIR",
+    "MarkdownCache",
+    "create_markdown_cache",
+    "package_version",
+]
+
+MARKDOWN_CACHE_DIR = DEFAULT_CACHE_ROOT / "md"
+DEFAULT_MEMORY_SIZE = "32M"
+DEFAULT_DISK_SIZE = "256M"
+SHARDS = 256
+
+
+def package_version(name: str) -> str | None:
+    """Return the installed version of distribution *name*, if any."""
+
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+class MarkdownCache:
+    """HTML converted from Markdown, kept for the texts seen most recently.
+
+    At most *max_size* characters of Markdown and HTML are kept in memory,
+    least recently used first out. With *disk*, misses are looked up there
+    before converting, and each shard of it is trimmed to its share of
+    *disk_size* bytes after a write. Hits and misses are counted for
+    :meth:`stats`.
+    """
+
+    def __init__(
+        self,
+        salt: tuple = (),
+        max_size: int = parse_size(DEFAULT_MEMORY_SIZE),
+        disk: DiskCache | None = None,
+        disk_size: int = parse_size(DEFAULT_DISK_SIZE),
+    ) -> None:
+        self.salt = salt
+        self.max_size = max_size
+        self.disk = disk
+        self.disk_size = disk_size
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    def _remember(self, text: str, html: str) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[text] = html
+        self.size += len(text) + len(html)
+        while self.size > self.max_size and self._entries:
+            old_text, old_html = self._entries.popitem(last=False)
+            self.size -= len(old_text) + len(old_html)
+            self.evictions += 1
+
+    def get(self, text: str, convert: Callable[[str], str]) -> str:
+        """Return ``convert(text)``, converting only on a miss."""
+
+        html = self._entries.get(text)
+        if html is not None:
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return html
+        disk = self.disk if self.disk is not None and self.disk.enabled else None
+        key = None
+        if disk is not None:
+            digest = hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+            key = cache_key("markdown", *self.salt, digest)
+            html = disk.get(key)
+        if html is None or html is MISSING:
+            self.misses += 1
+            html = convert(text)
+            if disk is not None:
+                disk.set(key, html)
+                self.evictions += trim_lru(disk.directory / key[:2], self.disk_size // SHARDS)
+        else:
+            self.disk_hits += 1
+        self._remember(text, html)
+        return html
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and the hit rate."""
+
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+def create_markdown_cache(*salt: Any) -> MarkdownCache:
+    """Return a :class:`MarkdownCache` configured from the environment."""
+
+    disk = None
+    if os.getenv("PIE_MD_CACHE_DISK", "") not in {"", "0"}:
+        disk = DiskCache(MARKDOWN_CACHE_DIR)
+    return MarkdownCache(
+        salt,
+        max_size=parse_size(os.getenv("PIE_MD_CACHE_SIZE", DEFAULT_MEMORY_SIZE)),
+        disk=disk,
+        disk_size=parse_size(os.getenv("PIE_MD_CACHE_DISK_SIZE", DEFAULT_DISK_SIZE)),
+    )
@@ -0,0 +1,149 @@
+"""Reuse compiled Jinja snippets across :func:`render_jinja` calls.
+
+``definition`` fields and inline snippets are short strings that repeat
+across a site, yet :meth:`jinja2.Environment.from_string` lexes, parses and
+compiles each one every time. :class:`SnippetCache` keeps the compiled
+templates in a bounded LRU keyed by environment and snippet text.
+
+Snippets whose output depends only on metadata, such as a ``definition``
+made of ``link`` calls, can also have their output kept. A snippet is
+treated that way when rendering it read no file directly
+(:attr:`pie.dependencies.Dependencies.direct`). The documents it read are
+reported again on every hit so depfiles stay complete, and the outputs are
+dropped when ``update-index`` publishes a new index generation.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from jinja2 import Environment, Template
+
+from pie.dependencies import Dependencies, record, record_dependencies
+from pie.logging import logger
+
+__all__ = ["DEFAULT_SIZE", "SnippetCache", "snippet_cache"]
+
+DEFAULT_SIZE = 1024
+
+
+class SnippetCache:
+    """Bounded LRU of compiled snippets and, with *results*, their output.
+
+    At most *maxsize* templates and *maxsize* outputs are kept, least
+    recently used first out; ``0`` turns the cache off. At most every
+    *check_interval* seconds a render compares the index generation with
+    the one the outputs were rendered from, like
+    :class:`pie.metadata.MetadataCache`.
+    """
+
+    def __init__(
+        self, maxsize: int = DEFAULT_SIZE, results: bool = False, check_interval: float = 1.0
+    ) -> None:
+        self.maxsize = maxsize
+        self.results = results
+        self.check_interval = check_interval
+        self.generation: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+        self.invalidations = 0
+        self._templates: OrderedDict[tuple[Environment, str], Template] = OrderedDict()
+        self._outputs: OrderedDict[tuple[Environment, str], tuple[str, Dependencies]] = (
+            OrderedDict()
+        )
+        self._checked: float | None = None
+
+    def _put(self, entries: OrderedDict, key: Any, value: Any) -> None:
+        entries[key] = value
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def template(self, environment: Environment, snippet: str) -> Template:
+        """Return *snippet* compiled by *environment*."""
+
+        key = (environment, snippet)
+        template = self._templates.get(key)
+        if template is not None:
+            self._templates.move_to_end(key)
+            self.hits += 1
+            return template
+        self.misses += 1
+        template = environment.from_string(snippet)
+        if self.maxsize > 0:
+            self._put(self._templates, key, template)
+        return template
+
+    def _validate(self) -> None:
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        from pie.metadata import get_store
+
+        try:
+            generation = get_store().generation()
+        except Exception as exc:
+            logger.debug("Could not check index generation", exception=str(exc))
+            return
+        if generation != self.generation:
+            if self._outputs:
+                self.invalidations += 1
+                self._outputs.clear()
+            self.generation = generation
+
+    def render(self, environment: Environment, snippet: str) -> str:
+        """Render *snippet* with *environment*, reusing earlier work."""
+
+        template = self.template(environment, snippet)
+        if not (self.results and self.maxsize > 0):
+            return template.render()
+        self._validate()
+        key = (environment, snippet)
+        cached = self._outputs.get(key)
+        if cached is not None:
+            self._outputs.move_to_end(key)
+            self.result_hits += 1
+            output, deps = cached
+            record(deps)
+            return output
+        self.result_misses += 1
+        with record_dependencies() as deps:
+            output = template.render()
+        if not deps.direct:
+            self._put(self._outputs, key, (output, deps))
+        return output
+
+    def clear(self) -> None:
+        self._templates.clear()
+        self._outputs.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Return hit/miss counters and hit rates."""
+
+        lookups = self.hits + self.misses
+        renders = self.result_hits + self.result_misses
+        return {
+            "size": len(self._templates),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "result_hits": self.result_hits,
+            "result_misses": self.result_misses,
+            "result_hit_rate": round(self.result_hits / renders, 3) if renders else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+#: Shared by :func:`~pie.render.jinja.render_jinja` and ``definition``.
+#: ``PIE_SNIPPET_CACHE_SIZE`` bounds it and ``PIE_SNIPPET_RESULTS=1`` keeps
+#: metadata-only outputs too.
+snippet_cache = SnippetCache(
+    int(os.getenv("PIE_SNIPPET_CACHE_SIZE", DEFAULT_SIZE)),
+    results=os.getenv("PIE_SNIPPET_RESULTS", "") not in {"", "0"},
+)
@@ -16,7 +16,7 @@ from pathlib import Path
 from pie.cli import create_parser
 from pie.logging import configure_logging
 from pie.render.jinja import render_press
-from pie.utils import read_utf8, write_utf8
+from pie.utils import log_write_stats, read_utf8, write_utf8
 
 
 __all__ = ["parse_args", "render_markdown", "main"]
@@ -45,6 +45,7 @@ def main(argv: list[str] | None = None) -> None:
     configure_logging(args.verbose, args.log)
     html = render_markdown(args.markdown)
     write_utf8(html, args.output)
+    log_write_stats()
 
 
 if __name__ == "__main__":
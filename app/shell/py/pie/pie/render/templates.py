@@ -0,0 +1,192 @@
+"""Inspect the Jinja templates used to render pages.
+
+``pie templates graph`` lists every template found by the loader with the
+templates it extends, includes or imports, and how many rendered pages used
+it according to their ``<output>.d`` depfiles (see :mod:`pie.dependencies`).
+
+``pie templates compile`` compiles the templates to Python modules that
+rendering imports instead of parsing the sources (see
+:mod:`pie.render.jinja.compiled`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+
+from jinja2 import Environment, TemplateSyntaxError, meta
+
+from pie.cli import create_parser
+from pie.dependencies import read_depfile
+from pie.logging import configure_logging, logger
+
+__all__ = ["DYNAMIC", "page_counts", "template_graph", "main"]
+
+#: Reference whose template name is only known at render time.
+DYNAMIC = "(dynamic)"
+
+DEFAULT_EXTENSIONS = (".jinja",)
+
+
+def _relative(filename: str) -> str:
+    relative = os.path.relpath(filename)
+    return filename if relative.startswith("..") else relative
+
+
+def template_graph(
+    env: Environment, extensions: Iterable[str] = DEFAULT_EXTENSIONS
+) -> dict[str, dict]:
+    """Return the templates *env* can load and the templates each references.
+
+    Each entry maps a template name to its ``file`` and the sorted
+    ``references`` found by :func:`jinja2.meta.find_referenced_templates`.
+    Names computed at render time are listed as :data:`DYNAMIC`.
+    """
+
+    suffixes = tuple(extensions)
+    graph: dict[str, dict] = {}
+    for name in env.list_templates(filter_func=lambda n: n.endswith(suffixes)):
+        source, filename, _ = env.loader.get_source(env, name)
+        try:
+            refs = meta.find_referenced_templates(env.parse(source, name, filename))
+        except TemplateSyntaxError as exc:
+            logger.warning("Cannot parse template", template=name, error=str(exc))
+            refs = []
+        graph[name] = {
+            "file": _relative(filename),
+            "references": sorted({DYNAMIC if r is None else r for r in refs}),
+        }
+    return graph
+
+
+def page_counts(build_root: Path) -> dict[str, int]:
+    """Return how many depfiles under *build_root* list each file."""
+
+    counts: dict[str, int] = {}
+    for depfile in build_root.rglob("*.html.d"):
+        for path in read_depfile(depfile):
+            counts[path] = counts.get(path, 0) + 1
+    return counts
+
+
+def _format_text(graph: dict[str, dict]) -> str:
+    lines = []
+    for name, entry in graph.items():
+        pages = entry.get("pages")
+        lines.append(name if pages is None else f"{name}  ({pages} pages)")
+        lines.extend(f"  -> {ref}" for ref in entry["references"])
+    return "\n".join(lines)
+
+
+def _format_dot(graph: dict[str, dict]) -> str:
+    lines = ["digraph templates {"]
+    for name, entry in graph.items():
+        lines.append(f"  {json.dumps(name)};")
+        for ref in entry["references"]:
+            lines.append(f"  {json.dumps(name)} -> {json.dumps(ref)};")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+FORMATS = {
+    "text": _format_text,
+    "dot": _format_dot,
+    "json": lambda graph: json.dumps(graph, indent=2, sort_keys=True),
+}
+
+
+def graph_command(args: argparse.Namespace) -> None:
+    """Print the template graph."""
+
+    from pie.render.jinja import env
+
+    graph = template_graph(env, args.ext)
+    build_root = Path(args.build)
+    if build_root.is_dir():
+        counts = page_counts(build_root)
+        for entry in graph.values():
+            entry["pages"] = counts.get(entry["file"], 0)
+    print(FORMATS[args.format](graph))
+
+
+def compile_command(args: argparse.Namespace) -> None:
+    """Compile the templates to Python modules."""
+
+    from pie.render.jinja import create_env
+    from pie.render.jinja.compiled import compile_templates
+
+    env = create_env()
+    extensions = [ext.lstrip(".") for ext in args.ext]
+    manifest = compile_templates(
+        env, args.output, extensions=extensions, zip=args.zip, log_function=logger.debug
+    )
+    suffixes = tuple(args.ext)
+    listed = env.list_templates(filter_func=lambda n: n.endswith(suffixes))
+    skipped = len(listed) - len(manifest)
+    logger.info(
+        "Compiled templates", count=len(manifest), skipped=skipped, path=args.output
+    )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+
+    parser = create_parser("Inspect the Jinja templates used to render pages")
+    parser.prog = "pie templates"
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    graph = commands.add_parser(
+        "graph", help="Show which templates extend, include or import which"
+    )
+    graph.add_argument(
+        "--build",
+        default="build",
+        help="Count the pages using each template from depfiles here",
+    )
+    graph.add_argument(
+        "--format", choices=sorted(FORMATS), default="text", help="Output format"
+    )
+    graph.add_argument(
+        "--ext",
+        nargs="+",
+        default=list(DEFAULT_EXTENSIONS),
+        help="Template file extensions to list (default: .jinja)",
+    )
+    graph.set_defaults(func=graph_command)
+
+    from pie.render.jinja.compiled import DEFAULT_COMPILED_PATH
+
+    compile_ = commands.add_parser(
+        "compile", help="Compile the templates to Python modules for rendering"
+    )
+    compile_.add_argument(
+        "--output",
+        default=os.getenv("PIE_COMPILED_TEMPLATES", str(DEFAULT_COMPILED_PATH)),
+        help="Directory or zip archive to write (default: build/.cache/jinja-modules)",
+    )
+    compile_.add_argument(
+        "--zip", action="store_true", help="Write a zip archive instead of a directory"
+    )
+    compile_.add_argument(
+        "--ext",
+        nargs="+",
+        default=list(DEFAULT_EXTENSIONS),
+        help="Template file extensions to compile (default: .jinja)",
+    )
+    compile_.set_defaults(func=compile_command)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entry point for ``pie templates``."""
+
+    args = parse_args(argv)
+    configure_logging(args.verbose, args.log)
+    args.func(args)
+
+
+if __name__ == "__main__":  # pragma: no cover - convenience
+    main()
@@ -10,12 +10,11 @@ from __future__ import annotations
 
 import argparse
 import json
-from pathlib import Path
 from typing import Any, Iterable, List
 
 from pie.cli import create_parser
-from pie.logging import logger, configure_logging
-from pie.utils import read_json
+from pie.logging import configure_logging
+from pie.utils import log_write_stats, read_json, write_utf8
 
 from .render.jinja import create_env
 
@@ -76,7 +75,8 @@ def main(argv: list[str] | None = None) -> None:
     output_json = json.dumps(rendered, ensure_ascii=False)
 
     if args.output:
-        Path(args.output).write_text(output_json, encoding="utf-8")
+        write_utf8(output_json, args.output)
+        log_write_stats()
     else:
         print(output_json)
 
@@ -10,7 +10,7 @@ from typing import Sequence
 
 from pie.cli import create_parser
 from pie.logging import configure_logging, logger
-from pie.utils import ExcludeList, load_exclude_file
+from pie.utils import ExcludeList, load_exclude_file, write_utf8
 
 
 DEFAULT_EXCLUDE = Path("cfg/sitemap-exclude.yml")
@@ -48,8 +48,10 @@ def generate(
     lines.extend(f"  <url><loc>{u}</loc></url>" for u in entries)
     lines.append("</urlset>")
     output = build_dir / "sitemap.xml"
-    output.write_text("\n".join(lines) + "\n", encoding="utf-8")
-    logger.info("Wrote sitemap", path=str(output), count=len(entries))
+    if write_utf8("\n".join(lines) + "\n", str(output)):
+        logger.info("Wrote sitemap", path=str(output), count=len(entries))
+    else:
+        logger.info("Sitemap unchanged", path=str(output), count=len(entries))
     return entries
 
 
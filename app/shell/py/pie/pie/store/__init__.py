@@ -0,0 +1,71 @@
+"""Storage backends for the metadata index.
+
+``update-index`` writes documents through a :class:`MetadataStore` and
+:mod:`pie.metadata` reads them back. The backend is chosen with
+``PIE_METADATA_BACKEND``:
+
+* ``redis`` (default) – :class:`RedisMetadataStore` talking to the DragonflyDB
+  container configured by ``REDIS_HOST`` and ``REDIS_PORT``.
+* ``sqlite`` – :class:`SqliteMetadataStore` using the file named by
+  ``PIE_METADATA_DB`` (default ``build/.cache/metadata.sqlite``).
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import redis
+from pie.logging import logger
+
+from .base import MetadataStore
+from .redis import RedisMetadataStore
+from .sqlite import DEFAULT_SQLITE_PATH, SqliteMetadataStore
+
+__all__ = [
+    "BACKENDS",
+    "DEFAULT_SQLITE_PATH",
+    "MetadataStore",
+    "RedisMetadataStore",
+    "SqliteMetadataStore",
+    "default_backend",
+    "open_store",
+]
+
+BACKENDS = ("redis", "sqlite")
+
+
+def default_backend() -> str:
+    """Return the backend named by ``PIE_METADATA_BACKEND`` (default ``redis``)."""
+
+    return os.getenv("PIE_METADATA_BACKEND", "redis")
+
+
+def open_store(
+    backend: str | None = None,
+    *,
+    conn: redis.Redis | None = None,
+    path: str | Path | None = None,
+) -> MetadataStore:
+    """Return a :class:`MetadataStore` for *backend*.
+
+    ``conn`` is used by the Redis backend instead of a connection built from
+    ``REDIS_HOST``/``REDIS_PORT``; ``path`` overrides ``PIE_METADATA_DB`` for
+    the SQLite backend.
+    """
+
+    backend = backend or default_backend()
+    if backend == "redis":
+        if conn is None:
+            conn = redis.Redis(
+                host=os.getenv("REDIS_HOST", "dragonfly"),
+                port=int(os.getenv("REDIS_PORT", "6379")),
+                decode_responses=True,
+            )
+        return RedisMetadataStore(conn)
+    if backend == "sqlite":
+        return SqliteMetadataStore(
+            path or os.getenv("PIE_METADATA_DB") or DEFAULT_SQLITE_PATH
+        )
+    logger.error("Unknown metadata backend", backend=backend, choices=BACKENDS)
+    raise SystemExit(1)
@@ -0,0 +1,125 @@
+"""Interface shared by the metadata storage backends."""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, Iterator, Mapping, Tuple, Union
+
+__all__ = ["DEFAULT_BATCH_SIZE", "Documents", "MetadataStore", "iter_documents"]
+
+# Documents written per pipeline flush or ``executemany`` call.
+DEFAULT_BATCH_SIZE = 500
+
+Documents = Union[
+    Mapping[str, Mapping[str, Any]], Iterable[Tuple[str, Mapping[str, Any]]]
+]
+
+
+def iter_documents(documents: Documents) -> Iterator[tuple[str, Mapping[str, Any]]]:
+    """Yield ``(id, document)`` pairs from a mapping or an iterable of pairs."""
+
+    if isinstance(documents, Mapping):
+        return iter(documents.items())
+    return iter(documents)
+
+
+class MetadataStore(ABC):
+    """Persistent storage for the metadata index written by ``update-index``.
+
+    Documents are the merged metadata mappings produced by
+    :func:`pie.metadata.load_metadata_pair`, keyed by their ``id``. Every
+    backend returns documents in the same shape so callers never need to know
+    which one is active.
+    """
+
+    #: Flattened keys written by this store, used for throughput reporting.
+    keys_written = 0
+
+    @abstractmethod
+    def get_document(self, doc_id: str) -> dict[str, Any] | None:
+        """Return the document stored for ``doc_id`` or ``None``."""
+
+    @abstractmethod
+    def get_many(self, doc_ids: list[str]) -> list[dict[str, Any] | None]:
+        """Return documents for ``doc_ids`` in order, ``None`` when missing."""
+
+    @abstractmethod
+    def get_by_path(self, filepath: str, keypath: str) -> Any | None:
+        """Return the raw value of ``keypath`` for the document at ``filepath``.
+
+        Values are returned as stored: strings unchanged and everything else
+        JSON encoded.
+        """
+
+    @abstractmethod
+    def ids_for_paths(self, filepaths: list[str]) -> dict[str, str]:
+        """Return the document id recorded for each known source path."""
+
+    @abstractmethod
+    def stored_digests(self, doc_ids: list[str]) -> dict[str, dict[str, str]]:
+        """Return the ``{path: sha1}`` source digests recorded for ``doc_ids``.
+
+        Documents without recorded sources are omitted.
+        """
+
+    @abstractmethod
+    def write_index(
+        self,
+        documents: Documents,
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: int = 1,
+        fingerprint: str | None = None,
+    ) -> int:
+        """Store every document and return the new generation.
+
+        ``documents`` may be a mapping or a lazy iterable of ``(id, document)``
+        pairs. It is consumed ``batch_size`` documents at a time so memory use
+        does not grow with the size of the index. Backends that can write
+        concurrently use up to ``workers`` batches in flight. A
+        ``fingerprint`` is published with the generation; see
+        :meth:`fingerprint`.
+        """
+
+    @abstractmethod
+    def delete(self, doc_ids: Iterable[str]) -> None:
+        """Remove ``doc_ids`` and their source path mappings.
+
+        The removal is published as a new generation.
+        """
+
+    @abstractmethod
+    def generation(self) -> str | None:
+        """Return the last published index generation, if any.
+
+        This is always the latest generation, not the one reads are served
+        from; compare the two to decide when to :meth:`refresh`.
+        """
+
+    @abstractmethod
+    def fingerprint(self) -> str | None:
+        """Return the fingerprint last published by :meth:`write_index`.
+
+        ``update-index`` records the code and settings the stored fields were
+        derived with, and reloads every document when they differ.
+        """
+
+    @abstractmethod
+    def known_ids(self) -> frozenset[str]:
+        """Return the ids of every indexed document."""
+
+    def refresh(self) -> None:
+        """Read from the latest generation from now on.
+
+        Readers resolve the generation once and keep serving that snapshot,
+        even while ``update-index`` publishes a new one, until this is called.
+        """
+
+    def wait_for_generation(self, timeout: float) -> str | None:
+        """Return the published generation, waiting up to ``timeout`` seconds.
+
+        Backends whose writes become visible atomically have nothing to wait
+        for and simply return :meth:`generation`.
+        """
+
+        return self.generation()
@@ -0,0 +1,143 @@
+"""Flattened ``<id>.<field>`` representation of metadata documents.
+
+``update-index`` stores each document as dot-separated keys with string
+values, encoding non-string values as JSON. The helpers here convert between
+that layout and nested documents so every backend produces identical data.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Iterable, Mapping
+
+from flatten_dict import unflatten
+from pie.logging import logger
+
+
+def _flatten_mapping(prefix, obj):
+    for k, v in obj.items():
+        yield from _walk(f"{prefix}.{k}", v)
+
+
+def _walk(prefix: str, obj: Any) -> Iterable[tuple[str, str]]:
+    if isinstance(obj, Mapping):
+        yield from _flatten_mapping(prefix, obj)
+    elif isinstance(obj, list):
+        for i, item in enumerate(obj):
+            yield from _walk(f"{prefix}.{i}", item)
+    else:
+        val = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)
+        yield prefix, val
+
+
+def source_digests(props: Mapping[str, Any]) -> dict[str, str]:
+    """Return SHA1 digests of the source files listed under ``props["path"]``.
+
+    Keys are paths relative to the current directory, which is also how
+    :func:`flatten_document` stores the reverse path to ``id`` mapping.
+    """
+
+    paths = props.get("path")
+    sha1_map: dict[str, str] = {}
+    if isinstance(paths, list):
+        for p in paths:
+            try:
+                abs_path = Path(p).resolve()
+                rel_path = abs_path.relative_to(Path.cwd())
+                digest = hashlib.sha1(abs_path.read_bytes()).hexdigest()
+                sha1_map[str(rel_path)] = digest
+            except FileNotFoundError:
+                logger.warning("Source file missing", path=p)
+    return sha1_map
+
+
+def document_fields(
+    doc_id: str, props: Mapping[str, Any], digests: Mapping[str, str]
+) -> Iterable[tuple[str, str]]:
+    """Yield the ``<id>.<field>`` pairs of a document, including ``sha1``."""
+
+    yield from _walk(doc_id, props)
+    if digests:
+        yield from _flatten_mapping(f"{doc_id}.sha1", digests)
+
+
+def flatten_document(
+    doc_id: str, props: Mapping[str, Any]
+) -> Iterable[tuple[str, str]]:
+    """Yield ``(key, value)`` pairs for a single document.
+
+    Besides the ``<id>.<field>`` keys this includes a reverse mapping from each
+    source path to ``doc_id`` and the ``<id>.sha1`` digests of those files.
+    """
+
+    digests = source_digests(props)
+    yield from document_fields(doc_id, props, digests)
+    for path in digests:
+        yield path, doc_id
+
+
+def flatten_index(index: Mapping[str, Mapping[str, Any]]) -> Iterable[tuple[str, str]]:
+    """Yield ``(key, value)`` pairs for insertion into Redis.
+
+    Nested dictionaries are flattened using dot-separated keys. Values that
+    are not strings are encoded as JSON. Paths are stored as a JSON array under
+    ``<id>.path`` and SHA1 hashes of each source file are stored as a JSON
+    object under ``<id>.sha1``.
+    """
+
+    for doc_id, props in index.items():
+        yield from flatten_document(doc_id, props)
+
+
+def decode_value(key: str, val: str | None, *, required: bool = False):
+    """Return ``val`` decoded from JSON, falling back to the raw string."""
+
+    if val is None:
+        if required:
+            logger.error("Missing metadata", key=key)
+            raise SystemExit(1)
+        return None
+
+    try:
+        return json.loads(val)
+    except Exception:
+        return val
+
+
+def convert_lists(obj):
+    """Recursively convert dictionaries with integer keys to lists.
+
+    Example
+    -------
+    >>> convert_lists({"0": "a", "2": {"0": "b"}})
+    ['a', None, ['b']]
+    """
+
+    if isinstance(obj, dict):
+        if obj and all(isinstance(k, str) and k.isdigit() for k in obj):
+            arr = [None] * (max(int(k) for k in obj) + 1)
+            for k, v in obj.items():
+                arr[int(k)] = convert_lists(v)
+            return arr
+        return {k: convert_lists(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [convert_lists(v) for v in obj]
+    return obj
+
+
+def unflatten_document(
+    prefix: str, keys: list[str], values: list[str | None]
+) -> dict | list | None:
+    """Return the nested structure for flattened ``keys`` and ``values``."""
+
+    if not keys:
+        return None
+
+    flat = {}
+    for k, val in zip(keys, values):
+        flat[k[len(prefix) :].lstrip(".")] = decode_value(k, val, required=True)
+
+    data = unflatten(flat, splitter="dot")
+    return convert_lists(data)
@@ -0,0 +1,537 @@
+"""Metadata stored in Redis or DragonflyDB as flattened keys.
+
+Every ``update-index`` run writes the documents it changed into a new
+generation namespace, ``g<N>:<id>.<field>``, with a ``g<N>:<id>.__keys__``
+set naming all of them, so nothing a reader can see is overwritten in place.
+When the run finishes a single ``MULTI`` transaction points
+``__index__.docs`` at the new versions, updates the ``__index__.paths`` map
+from source paths to ids and flips the ``__index__.generation`` pointer.
+Readers resolve that pointer once per process (:meth:`RedisMetadataStore.snapshot`),
+so a render job overlapping an index run sees either the old or the new
+index, never a mix. Superseded versions are deleted after a grace period.
+
+Indexes written before generations keep every field under ``<id>.<field>``
+and each source path as a key holding its id. They remain readable until the
+first generation is published.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping, Tuple
+
+import redis
+from pie.logging import logger
+from pie.utils import batched
+
+from .base import DEFAULT_BATCH_SIZE, Documents, MetadataStore, iter_documents
+from .flatten import document_fields, source_digests, unflatten_document
+
+__all__ = [
+    "DEFAULT_GRACE_PERIOD",
+    "INDEX_CHANNEL",
+    "INDEX_DOCS_KEY",
+    "INDEX_FINGERPRINT_KEY",
+    "INDEX_GENERATION_KEY",
+    "INDEX_NEXT_GENERATION_KEY",
+    "INDEX_PATHS_KEY",
+    "INDEX_PENDING_KEY",
+    "INDEX_RETIRED_KEY",
+    "KEYS_SUFFIX",
+    "RedisMetadataStore",
+    "Snapshot",
+    "manifest_key",
+    "namespace",
+]
+
+# Suffix of the per-document set listing every flattened key of a document.
+# ``update-index`` writes ``g<N>:<id>.__keys__`` so readers can fetch a
+# document without scanning the keyspace.
+KEYS_SUFFIX = "__keys__"
+
+# The current_generation pointer. Flipping it publishes a new index; it also
+# serves as the readiness signal renderers wait for.
+INDEX_GENERATION_KEY = "__index__.generation"
+# Counter handing out generation numbers to ``update-index`` runs.
+INDEX_NEXT_GENERATION_KEY = "__index__.next_generation"
+# Hash of document id -> generation whose namespace holds the document.
+INDEX_DOCS_KEY = "__index__.docs"
+# Hash of source path -> document id.
+INDEX_PATHS_KEY = "__index__.paths"
+# What the stored fields were derived with; set with the generation pointer.
+INDEX_FINGERPRINT_KEY = "__index__.fingerprint"
+# Sorted sets scored by time: superseded ``g<N>:<id>.`` prefixes awaiting
+# garbage collection, and generations still being written.
+INDEX_RETIRED_KEY = "__index__.retired"
+INDEX_PENDING_KEY = "__index__.pending"
+INDEX_CHANNEL = "__index__"
+
+# Seconds a superseded document version stays readable for renderers that
+# resolved an older generation.
+DEFAULT_GRACE_PERIOD = 300.0
+
+# ``(id, generation of the replaced version, its source paths, new paths)``
+Change = Tuple[str, "str | None", "set[str]", "set[str]"]
+
+
+def namespace(generation: int | str) -> str:
+    """Return the key prefix of ``generation``."""
+
+    return f"g{generation}:"
+
+
+def manifest_key(doc_id: str, generation: int | str | None = None) -> str:
+    """Return the key of the set listing all keys stored for ``doc_id``.
+
+    Without ``generation`` the key of an index written before generations is
+    returned.
+    """
+
+    prefix = namespace(generation) if generation is not None else ""
+    return f"{prefix}{doc_id}.{KEYS_SUFFIX}"
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """A published index generation as seen by one reader."""
+
+    generation: str | None
+    versions: Mapping[str, str] = field(default_factory=dict)
+
+    @property
+    def legacy(self) -> bool:
+        """``True`` for indexes written before generations, or none at all."""
+
+        return self.generation is None
+
+    def prefix(self, doc_id: str) -> str | None:
+        """Return the key prefix of ``doc_id``, ``None`` when not indexed."""
+
+        if self.legacy:
+            return f"{doc_id}."
+        version = self.versions.get(doc_id)
+        return None if version is None else f"{namespace(version)}{doc_id}."
+
+
+class RedisMetadataStore(MetadataStore):
+    """:class:`MetadataStore` backed by a Redis compatible server.
+
+    Versions superseded by a new generation are deleted once they have been
+    retired for ``grace_period`` seconds.
+    """
+
+    def __init__(
+        self, conn: redis.Redis, *, grace_period: float = DEFAULT_GRACE_PERIOD
+    ) -> None:
+        self.conn = conn
+        self.grace_period = grace_period
+        self._snapshot: Snapshot | None = None
+        self._legacy_ids: frozenset[str] | None = None
+
+    def snapshot(self) -> Snapshot:
+        """Return the generation reads are served from.
+
+        The pointer and the version map are read in one transaction the first
+        time a published generation is found, and reused until
+        :meth:`refresh`.
+        """
+
+        if self._snapshot is not None:
+            return self._snapshot
+        try:
+            if self.generation() is None:
+                # Nothing to pin before the first publish; look again next time.
+                return Snapshot(None)
+            with self.conn.pipeline(transaction=True) as pipe:
+                pipe.get(INDEX_GENERATION_KEY)
+                pipe.hgetall(INDEX_DOCS_KEY)
+                generation, versions = pipe.execute()
+        except Exception as exc:
+            logger.error("Redis lookup failed", key=INDEX_DOCS_KEY, exception=str(exc))
+            raise SystemExit(1)
+        self._snapshot = Snapshot(generation, versions)
+        logger.debug("Pinned index generation", generation=generation)
+        return self._snapshot
+
+    def refresh(self) -> None:
+        self._snapshot = None
+        self._legacy_ids = None
+
+    def _scan_document_keys(self, prefix: str) -> list[str]:
+        """Return keys under ``prefix`` using ``KEYS`` for indexes without a manifest.
+
+        This walks the entire keyspace and is only kept so indexes written
+        before ``update-index`` recorded ``<id>.__keys__`` remain readable.
+        """
+
+        logger.debug("No key manifest; scanning keyspace", prefix=prefix)
+        manifest = prefix + KEYS_SUFFIX
+        return sorted(k for k in self.conn.keys(prefix + "*") if k != manifest)
+
+    def fetch_prefixes(self, prefixes: list[str]) -> list[dict | list | None]:
+        """Return the documents stored under each of ``prefixes``.
+
+        All manifests are read with one pipelined round trip and every value
+        with a single ``MGET``, regardless of how many documents are requested.
+        """
+
+        if not prefixes:
+            return []
+
+        try:
+            manifests = self._manifests(prefixes)
+            key_lists = [
+                sorted(keys) if keys else self._scan_document_keys(prefix)
+                for prefix, keys in zip(prefixes, manifests)
+            ]
+            all_keys = [k for keys in key_lists for k in keys]
+            values = self.conn.mget(all_keys) if all_keys else []
+        except Exception as exc:
+            logger.error("Redis lookup failed", prefixes=prefixes, exception=str(exc))
+            raise SystemExit(1)
+
+        docs: list[dict | list | None] = []
+        pos = 0
+        for prefix, keys in zip(prefixes, key_lists):
+            doc_values = values[pos : pos + len(keys)]
+            pos += len(keys)
+            docs.append(unflatten_document(prefix, keys, doc_values))
+        return docs
+
+    def qualify(self, key: str) -> str:
+        """Return ``<id>.<field>`` as stored in the pinned generation."""
+
+        doc_id, _, rest = key.partition(".")
+        prefix = self.snapshot().prefix(doc_id)
+        return key if prefix is None else prefix + rest
+
+    def get_document(self, doc_id: str) -> dict[str, Any] | None:
+        return self.get_many([doc_id])[0]
+
+    def get_many(
+        self, doc_ids: list[str], *, _retry: bool = True
+    ) -> list[dict[str, Any] | None]:
+        snapshot = self.snapshot()
+        prefixes = [snapshot.prefix(doc_id) for doc_id in doc_ids]
+        found = iter(self.fetch_prefixes([p for p in prefixes if p is not None]))
+        docs = [next(found) if p is not None else None for p in prefixes]
+
+        # A reader outliving the grace period loses its generation; move on.
+        lost = [i for i, p in enumerate(prefixes) if p and docs[i] is None]
+        if lost and _retry and not snapshot.legacy:
+            logger.debug("Pinned generation collected", generation=snapshot.generation)
+            self.refresh()
+            again = self.get_many([doc_ids[i] for i in lost], _retry=False)
+            for i, doc in zip(lost, again):
+                docs[i] = doc
+        return docs
+
+    def get_by_path(self, filepath: str, keypath: str) -> Any | None:
+        snapshot = self.snapshot()
+        if snapshot.legacy:
+            doc_id = self.conn.get(filepath)
+        else:
+            doc_id = self.conn.hget(INDEX_PATHS_KEY, filepath)
+        prefix = snapshot.prefix(doc_id) if doc_id else None
+        if prefix is None:
+            logger.warning("unknown metadata", filepath=filepath, keypath=keypath)
+            return None
+        return self.conn.get(prefix + keypath)
+
+    def ids_for_paths(self, filepaths: list[str]) -> dict[str, str]:
+        if not filepaths:
+            return {}
+        ids = self.conn.hmget(INDEX_PATHS_KEY, filepaths)
+        return {path: doc_id for path, doc_id in zip(filepaths, ids) if doc_id}
+
+    def _manifests(self, prefixes: list[str]) -> list[set[str]]:
+        with self.conn.pipeline(transaction=False) as pipe:
+            for prefix in prefixes:
+                pipe.smembers(prefix + KEYS_SUFFIX)
+            return pipe.execute()
+
+    def _stored_sources(
+        self, doc_ids: list[str]
+    ) -> dict[str, tuple[str, dict[str, str]]]:
+        """Return ``{id: (generation, {path: sha1 key})}`` for the live index."""
+
+        if not doc_ids:
+            return {}
+        versions = self.conn.hmget(INDEX_DOCS_KEY, doc_ids)
+        live = [(d, v) for d, v in zip(doc_ids, versions) if v is not None]
+        prefixes = [f"{namespace(v)}{d}." for d, v in live]
+        sources: dict[str, tuple[str, dict[str, str]]] = {}
+        for (doc_id, version), prefix, keys in zip(
+            live, prefixes, self._manifests(prefixes)
+        ):
+            sha1_prefix = f"{prefix}sha1."
+            sources[doc_id] = (
+                version,
+                {k[len(sha1_prefix) :]: k for k in keys if k.startswith(sha1_prefix)},
+            )
+        return sources
+
+    def stored_digests(self, doc_ids: list[str]) -> dict[str, dict[str, str]]:
+        sha1_keys = [
+            (doc_id, path, key)
+            for doc_id, (_, paths) in self._stored_sources(doc_ids).items()
+            for path, key in paths.items()
+        ]
+        if not sha1_keys:
+            return {}
+        digests: dict[str, dict[str, str]] = {}
+        values = self.conn.mget([key for _, _, key in sha1_keys])
+        for (doc_id, path, _), digest in zip(sha1_keys, values):
+            if digest:
+                digests.setdefault(doc_id, {})[path] = digest
+        return digests
+
+    def _next_generation(self) -> int:
+        """Reserve a generation number for a new index run."""
+
+        generation = self.conn.incr(INDEX_NEXT_GENERATION_KEY)
+        current = self.conn.get(INDEX_GENERATION_KEY)
+        if current is not None and generation <= int(current):
+            # Published before the counter existed.
+            generation = int(current) + 1
+            self.conn.set(INDEX_NEXT_GENERATION_KEY, generation)
+        self.conn.zadd(INDEX_PENDING_KEY, {str(generation): time.time()})
+        return generation
+
+    def write_documents(
+        self, index: Mapping[str, Mapping[str, Any]], generation: int
+    ) -> tuple[int, list[Change]]:
+        """Write *index* into the namespace of *generation* in one pipeline.
+
+        Every document also gets a ``g<N>:<id>.__keys__`` set naming its
+        flattened keys so readers can fetch it without ``KEYS``. Nothing is
+        visible to readers until :meth:`commit`. Returns the number of keys
+        written and the changes to commit.
+        """
+
+        doc_ids = list(index)
+        if not doc_ids:
+            return 0, []
+        sources = self._stored_sources(doc_ids)
+        prefix = namespace(generation)
+        changes: list[Change] = []
+        count = 0
+        with self.conn.pipeline(transaction=False) as pipe:
+            for doc_id in doc_ids:
+                props = index[doc_id]
+                digests = source_digests(props)
+                doc_keys: list[str] = []
+                for key, value in document_fields(doc_id, props, digests):
+                    pipe.set(prefix + key, value)
+                    logger.debug("Inserted", key=prefix + key, value=value)
+                    doc_keys.append(prefix + key)
+                manifest = manifest_key(doc_id, generation)
+                pipe.delete(manifest)
+                if doc_keys:
+                    pipe.sadd(manifest, *doc_keys)
+                version, old_paths = sources.get(doc_id, (None, {}))
+                changes.append((doc_id, version, set(old_paths), set(digests)))
+                count += len(doc_keys) + len(digests)
+            pipe.execute()
+        return count, changes
+
+    def commit(
+        self,
+        generation: int,
+        written: Iterable[Change] = (),
+        removed: Iterable[Change] = (),
+        fingerprint: str | None = None,
+    ) -> int:
+        """Atomically make *generation* the current index and announce it.
+
+        Written documents now resolve to *generation*, removed ones are
+        dropped, and the versions they replace are retired for
+        :meth:`collect_garbage`. Source paths dropped by a document are
+        unmapped unless another document has claimed them. A *fingerprint*
+        is set in the same transaction.
+        """
+
+        written = list(written)
+        removed = list(removed)
+        claimed = {path: doc_id for doc_id, _, _, new in written for path in new}
+        dropped = {
+            path: doc_id
+            for doc_id, _, old, new in written + removed
+            for path in old - new
+            if path not in claimed
+        }
+        if dropped:
+            owners = self.conn.hmget(INDEX_PATHS_KEY, list(dropped))
+            dropped = {
+                path: doc_id
+                for (path, doc_id), owner in zip(list(dropped.items()), owners)
+                if owner == doc_id
+            }
+        now = time.time()
+        retired = {
+            f"{namespace(version)}{doc_id}.": now
+            for doc_id, version, _, _ in written + removed
+            if version is not None and version != str(generation)
+        }
+
+        with self.conn.pipeline(transaction=True) as pipe:
+            for chunk in batched(written, DEFAULT_BATCH_SIZE):
+                pipe.hset(INDEX_DOCS_KEY, mapping={c[0]: generation for c in chunk})
+            for chunk in batched(removed, DEFAULT_BATCH_SIZE):
+                pipe.hdel(INDEX_DOCS_KEY, *(c[0] for c in chunk))
+            for chunk in batched(list(claimed.items()), DEFAULT_BATCH_SIZE):
+                pipe.hset(INDEX_PATHS_KEY, mapping=dict(chunk))
+            for chunk in batched(list(dropped), DEFAULT_BATCH_SIZE):
+                pipe.hdel(INDEX_PATHS_KEY, *chunk)
+            for chunk in batched(list(retired.items()), DEFAULT_BATCH_SIZE):
+                pipe.zadd(INDEX_RETIRED_KEY, dict(chunk))
+            pipe.zrem(INDEX_PENDING_KEY, str(generation))
+            if fingerprint is not None:
+                pipe.set(INDEX_FINGERPRINT_KEY, fingerprint)
+            pipe.set(INDEX_GENERATION_KEY, generation)
+            pipe.execute()
+        self.conn.publish(INDEX_CHANNEL, generation)
+        logger.debug(
+            "Published index",
+            generation=generation,
+            written=len(written),
+            removed=len(removed),
+        )
+        self.refresh()
+        self.collect_garbage()
+        return generation
+
+    def collect_garbage(self, grace_period: float | None = None) -> int:
+        """Delete versions retired more than *grace_period* seconds ago.
+
+        Generations reserved by an ``update-index`` run that never committed
+        are swept after the same delay. Returns the number of keys deleted.
+        """
+
+        if grace_period is None:
+            grace_period = self.grace_period
+        cutoff = time.time() - grace_period
+        deleted = 0
+        retired = self.conn.zrangebyscore(INDEX_RETIRED_KEY, "-inf", cutoff)
+        for chunk in batched(retired, DEFAULT_BATCH_SIZE):
+            doomed = [k for keys in self._manifests(chunk) for k in keys]
+            doomed.extend(prefix + KEYS_SUFFIX for prefix in chunk)
+            with self.conn.pipeline(transaction=False) as pipe:
+                pipe.delete(*doomed)
+                pipe.zrem(INDEX_RETIRED_KEY, *chunk)
+                deleted += pipe.execute()[0]
+        for generation in self.conn.zrangebyscore(INDEX_PENDING_KEY, "-inf", cutoff):
+            keys = self.conn.scan_iter(match=f"{namespace(generation)}*", count=1000)
+            for chunk in batched(keys, DEFAULT_BATCH_SIZE):
+                deleted += self.conn.delete(*chunk)
+            self.conn.zrem(INDEX_PENDING_KEY, generation)
+        if deleted:
+            logger.debug("Collected old generations", keys=deleted)
+        return deleted
+
+    def write_index(
+        self,
+        documents: Documents,
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: int = 1,
+        fingerprint: str | None = None,
+    ) -> int:
+        """Write ``documents`` into a new generation in pipelined batches.
+
+        At most ``workers`` batches are buffered or in flight at once, each on
+        its own pooled connection, so document memory stays bounded however
+        large the index is. Only ids and source paths are kept for the final
+        :meth:`commit`.
+        """
+
+        generation = self._next_generation()
+        changes: list[Change] = []
+        pending: deque[Future[tuple[int, list[Change]]]] = deque()
+
+        def collect() -> None:
+            count, batch_changes = pending.popleft().result()
+            self.keys_written += count
+            changes.extend(batch_changes)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for batch in batched(iter_documents(documents), batch_size):
+                pending.append(
+                    executor.submit(self.write_documents, dict(batch), generation)
+                )
+                while len(pending) >= max(1, workers):
+                    collect()
+            while pending:
+                collect()
+        return self.commit(generation, changes, fingerprint=fingerprint)
+
+    def delete(self, doc_ids: Iterable[str]) -> None:
+        """Remove ``doc_ids`` by committing a generation without them."""
+
+        sources = self._stored_sources(list(doc_ids))
+        if not sources:
+            return
+        removed = [
+            (doc_id, version, set(paths), set())
+            for doc_id, (version, paths) in sources.items()
+        ]
+        self.commit(self._next_generation(), removed=removed)
+        logger.debug("Deleted documents", ids=list(sources))
+
+    def generation(self) -> str | None:
+        """Return the live current_generation pointer."""
+
+        return self.conn.get(INDEX_GENERATION_KEY)
+
+    def fingerprint(self) -> str | None:
+        return self.conn.get(INDEX_FINGERPRINT_KEY)
+
+    def known_ids(self) -> frozenset[str]:
+        snapshot = self.snapshot()
+        if snapshot.legacy:
+            if self._legacy_ids is None:
+                self._legacy_ids = self._scan_legacy_ids()
+            return self._legacy_ids
+        return frozenset(snapshot.versions)
+
+    def _scan_legacy_ids(self) -> frozenset[str]:
+        """Return the ids of an index written before generations.
+
+        Such an index stores the ``id`` field of every document as
+        ``<id>.id``; nested ``id`` fields are told apart by their value. This
+        walks the keyspace once per snapshot.
+        """
+
+        ids: set[str] = set()
+        keys = self.conn.scan_iter(match="*.id", count=1000)
+        for chunk in batched(keys, DEFAULT_BATCH_SIZE):
+            for key, value in zip(chunk, self.conn.mget(chunk)):
+                if value is not None and key == f"{value}.id":
+                    ids.add(value)
+        return frozenset(ids)
+
+    def wait_for_generation(self, timeout: float) -> str | None:
+        """Return the pinned generation, waiting for a publish if needed."""
+
+        generation = self.snapshot().generation
+        if generation is not None or timeout <= 0:
+            return generation
+
+        pubsub = self.conn.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(INDEX_CHANNEL)
+            # Re-check after subscribing so a publish in between is not missed.
+            generation = self.generation()
+            deadline = time.monotonic() + timeout
+            while generation is None and time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=0.1)
+                if message is None:
+                    generation = self.generation()
+                else:
+                    generation = message["data"]
+        finally:
+            pubsub.close()
+        return self.snapshot().generation if generation is not None else None
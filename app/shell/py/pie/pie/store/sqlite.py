@@ -0,0 +1,240 @@
+"""Metadata stored in an embedded SQLite database.
+
+Builds using this backend need no Redis server: ``update-index`` writes a
+single database file and renderers read it directly. Documents are stored as
+JSON so a lookup is one indexed ``SELECT``, and each index run is a single
+transaction so readers never observe a half-written index. Readers hold a
+read transaction from their first lookup (see
+:meth:`SqliteMetadataStore.refresh`), so every lookup in a process sees the
+same generation.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterable, Mapping
+
+from pie.logging import logger
+
+from .base import DEFAULT_BATCH_SIZE, Documents, MetadataStore, iter_documents
+from .flatten import document_fields, source_digests, unflatten_document
+
+__all__ = ["DEFAULT_SQLITE_PATH", "SqliteMetadataStore"]
+
+DEFAULT_SQLITE_PATH = Path("build/.cache/metadata.sqlite")
+
+# SQLite limits the number of host parameters in a statement.
+_CHUNK_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS fields (
+    key TEXT PRIMARY KEY, id TEXT NOT NULL, value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fields_id ON fields (id);
+CREATE TABLE IF NOT EXISTS paths (path TEXT PRIMARY KEY, id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS paths_id ON paths (id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _chunks(items: list[str]) -> Iterable[list[str]]:
+    for i in range(0, len(items), _CHUNK_SIZE):
+        yield items[i : i + _CHUNK_SIZE]
+
+
+class SqliteMetadataStore(MetadataStore):
+    """:class:`MetadataStore` backed by a local SQLite file.
+
+    ``fields`` keeps the same flattened ``<id>.<field>`` values as the Redis
+    backend so :meth:`get_by_path` returns identical raw values, while
+    ``documents`` holds the nested document for fast whole-document reads.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_SQLITE_PATH) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        # WAL lets parallel render jobs read while update-index writes.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self._pinned = False
+        self._live: sqlite3.Connection | None = None
+
+    def close(self) -> None:
+        self.conn.close()
+        if self._live is not None:
+            self._live.close()
+
+    def _pin(self) -> None:
+        """Open the read transaction lookups are served from.
+
+        WAL mode keeps the snapshot stable while ``update-index`` commits.
+        Before the first publish nothing is pinned so the index shows up as
+        soon as it is written.
+        """
+
+        if self._pinned or self.conn.in_transaction:
+            return
+        self.conn.execute("BEGIN")
+        if self._read_generation(self.conn) is None:
+            self.conn.commit()
+            return
+        self._pinned = True
+
+    def refresh(self) -> None:
+        if self._pinned:
+            self.conn.commit()
+            self._pinned = False
+
+    def get_document(self, doc_id: str) -> dict[str, Any] | None:
+        self._pin()
+        row = self.conn.execute(
+            "SELECT data FROM documents WHERE id = ?", (doc_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, doc_ids: list[str]) -> list[dict[str, Any] | None]:
+        self._pin()
+        found: dict[str, dict[str, Any]] = {}
+        for chunk in _chunks(list(dict.fromkeys(doc_ids))):
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT id, data FROM documents WHERE id IN ({marks})", chunk
+            )
+            found.update((doc_id, json.loads(data)) for doc_id, data in rows)
+        return [found.get(doc_id) for doc_id in doc_ids]
+
+    def get_by_path(self, filepath: str, keypath: str) -> Any | None:
+        self._pin()
+        row = self.conn.execute(
+            "SELECT id FROM paths WHERE path = ?", (filepath,)
+        ).fetchone()
+        if row is None:
+            logger.warning("unknown metadata", filepath=filepath, keypath=keypath)
+            return None
+        row = self.conn.execute(
+            "SELECT value FROM fields WHERE key = ?", (f"{row[0]}.{keypath}",)
+        ).fetchone()
+        return row[0] if row else None
+
+    def ids_for_paths(self, filepaths: list[str]) -> dict[str, str]:
+        found: dict[str, str] = {}
+        for chunk in _chunks(filepaths):
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT path, id FROM paths WHERE path IN ({marks})", chunk
+            )
+            found.update(rows)
+        return found
+
+    def stored_digests(self, doc_ids: list[str]) -> dict[str, dict[str, str]]:
+        digests: dict[str, dict[str, str]] = {}
+        for chunk in _chunks(doc_ids):
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                "SELECT id, key, value FROM fields "
+                f"WHERE id IN ({marks}) AND key LIKE id || '.sha1.%'",
+                chunk,
+            )
+            for doc_id, key, value in rows:
+                path = key[len(f"{doc_id}.sha1.") :]
+                digests.setdefault(doc_id, {})[path] = value
+        return digests
+
+    def _replace(self, doc_id: str, props: Mapping[str, Any]) -> int:
+        prefix = f"{doc_id}."
+        digests = source_digests(props)
+        fields = list(document_fields(doc_id, props, digests))
+        paths = list(digests)
+        document = unflatten_document(
+            prefix, [k for k, _ in fields], [v for _, v in fields]
+        )
+        self._delete_rows([doc_id])
+        self.conn.execute(
+            "INSERT INTO documents (id, data) VALUES (?, ?)",
+            (doc_id, json.dumps(document, ensure_ascii=False)),
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO fields (key, id, value) VALUES (?, ?, ?)",
+            [(key, doc_id, value) for key, value in fields],
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO paths (path, id) VALUES (?, ?)",
+            [(path, doc_id) for path in paths],
+        )
+        return len(fields) + len(paths)
+
+    def _delete_rows(self, doc_ids: list[str]) -> None:
+        for chunk in _chunks(doc_ids):
+            marks = ",".join("?" * len(chunk))
+            for table in ("documents", "fields", "paths"):
+                self.conn.execute(f"DELETE FROM {table} WHERE id IN ({marks})", chunk)
+
+    def write_index(
+        self,
+        documents: Documents,
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: int = 1,
+        fingerprint: str | None = None,
+    ) -> int:
+        """Write ``documents`` in a single transaction.
+
+        Documents are inserted as they are produced, so only the current one
+        is held in memory. SQLite allows one writer, so ``workers`` and
+        ``batch_size`` have no effect.
+        """
+
+        self.refresh()
+        count = 0
+        with self.conn:
+            for doc_id, props in iter_documents(documents):
+                self.keys_written += self._replace(doc_id, props)
+                count += 1
+            if fingerprint is not None:
+                self._write_meta(self.conn, "fingerprint", fingerprint)
+            generation = self._bump_generation()
+        logger.debug("Published index", generation=generation, ids=count)
+        return generation
+
+    def delete(self, doc_ids: Iterable[str]) -> None:
+        self.refresh()
+        with self.conn:
+            self._delete_rows(list(doc_ids))
+            self._bump_generation()
+
+    def _bump_generation(self) -> int:
+        generation = int(self._read_generation(self.conn) or 0) + 1
+        self._write_meta(self.conn, "generation", str(generation))
+        return generation
+
+    @staticmethod
+    def _write_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _read_meta(conn: sqlite3.Connection, key: str) -> str | None:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _read_generation(conn: sqlite3.Connection) -> str | None:
+        return SqliteMetadataStore._read_meta(conn, "generation")
+
+    def generation(self) -> str | None:
+        if not self._pinned:
+            return self._read_generation(self.conn)
+        # The pinned transaction cannot see newer commits.
+        if self._live is None:
+            self._live = sqlite3.connect(str(self.path), timeout=30)
+        return self._read_generation(self._live)
+
+    def fingerprint(self) -> str | None:
+        return self._read_meta(self.conn, "fingerprint")
+
+    def known_ids(self) -> frozenset[str]:
+        self._pin()
+        return frozenset(row[0] for row in self.conn.execute("SELECT id FROM documents"))
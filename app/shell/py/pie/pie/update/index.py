@@ -3,7 +3,10 @@
 
 This command reads a JSON index mapping document ``id`` to metadata and
 inserts each value into a Redis compatible database using keys of the form
-``<id>.<property>``. Complex values are stored as JSON strings.
+``g<generation>:<id>.<property>``. Complex values are stored as JSON strings.
+Each run publishes a new generation atomically once all of its keys are
+written (see :mod:`pie.store.redis`). With
+``--backend sqlite`` the same data is written to a local SQLite file instead.
 """
 
 from __future__ import annotations
@@ -14,14 +17,29 @@ import json
 import os
 import time
 import warnings
-from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
-from typing import Any, Iterable, Mapping
+from typing import Any, Iterable, Iterator, Mapping
 
 import redis
-from pie.cli import create_parser
+from pie.cache import cache_key, code_digest
+from pie.cli import add_jobs_argument, create_parser
 from pie.logging import configure_logging, logger
-from pie.metadata import load_metadata_pair
+from pie.metadata import (
+    load_metadata_pair,
+    load_metadata_pairs,
+    log_parse_cache_stats,
+    metadata_pair_files,
+)
+from pie.store import (
+    BACKENDS,
+    MetadataStore,
+    RedisMetadataStore,
+    default_backend,
+    open_store,
+)
+from pie.store.base import DEFAULT_BATCH_SIZE, Documents, iter_documents
+from pie.store.redis import DEFAULT_GRACE_PERIOD
 
 METADATA_EXTS = {".md", ".mdi", ".yml", ".yaml"}
 
@@ -32,49 +50,6 @@ def load_index(path: str | Path) -> Mapping[str, Mapping[str, Any]]:
     return json.loads(text)
 
 
-def _flatten_mapping(prefix, obj):
-    for k, v in obj.items():
-        yield from _walk(f"{prefix}.{k}", v)
-
-
-def _walk(prefix: str, obj: Any) -> Iterable[tuple[str, str]]:
-    if isinstance(obj, Mapping):
-        yield from _flatten_mapping(prefix, obj)
-    elif isinstance(obj, list):
-        for i, item in enumerate(obj):
-            yield from _walk(f"{prefix}.{i}", item)
-    else:
-        val = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)
-        yield prefix, val
-
-
-def flatten_index(index: Mapping[str, Mapping[str, Any]]) -> Iterable[tuple[str, str]]:
-    """Yield ``(key, value)`` pairs for insertion into Redis.
-
-    Nested dictionaries are flattened using dot-separated keys. Values that
-    are not strings are encoded as JSON. Paths are stored as a JSON array under
-    ``<id>.path`` and SHA1 hashes of each source file are stored as a JSON
-    object under ``<id>.sha1``.
-    """
-
-    for doc_id, props in index.items():
-        yield from _walk(doc_id, props)
-        paths = props.get("path")
-        if isinstance(paths, list):
-            sha1_map: dict[str, str] = {}
-            for p in paths:
-                try:
-                    abs_path = Path(p).resolve()
-                    rel_path = abs_path.relative_to(Path.cwd())
-                    digest = hashlib.sha1(abs_path.read_bytes()).hexdigest()
-                    sha1_map[str(rel_path)] = digest
-                    yield str(rel_path), doc_id
-                except FileNotFoundError:
-                    logger.warning("Source file missing", path=p)
-            if sha1_map:
-                yield from _flatten_mapping(f"{doc_id}.sha1", sha1_map)
-
-
 def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     """Parse command line arguments."""
     parser = create_parser("Insert index values into a DragonflyDB/Redis instance")
@@ -93,33 +68,65 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         default=int(os.getenv("REDIS_PORT", "6379")),
         help="Redis port (default: env REDIS_PORT or 6379)",
     )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Reload every document instead of skipping unchanged sources",
+    )
+    add_jobs_argument(parser)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Documents per pipeline flush (default: {DEFAULT_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=1,
+        help="Batches written concurrently over separate connections (default: 1)",
+    )
+    parser.add_argument(
+        "--grace",
+        type=float,
+        default=float(os.getenv("PIE_INDEX_GRACE", DEFAULT_GRACE_PERIOD)),
+        help="Seconds superseded Redis generations stay readable "
+        f"(default: env PIE_INDEX_GRACE or {DEFAULT_GRACE_PERIOD:g})",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=default_backend(),
+        help="Metadata store (default: env PIE_METADATA_BACKEND or 'redis')",
+    )
+    parser.add_argument(
+        "--db",
+        help="SQLite database for --backend sqlite "
+        "(default: env PIE_METADATA_DB or build/.cache/metadata.sqlite)",
+    )
     return parser.parse_args(list(argv) if argv is not None else None)
 
 
 def update_redis(conn: redis.Redis, index: Mapping[str, Mapping[str, Any]]) -> None:
-    """Insert each value from *index* into *conn* using pipelined writes."""
-    with conn.pipeline(transaction=False) as pipe:
-        for key, value in flatten_index(index):
-            pipe.set(key, value)
-            logger.debug("Inserted", key=key, value=value)
-        pipe.execute()
+    """Insert each value from *index* into *conn* as a new generation.
 
+    Every document also gets a ``g<N>:<id>.__keys__`` set naming its flattened
+    keys so :func:`pie.metadata.build_from_redis` can read it without ``KEYS``.
+    """
+    RedisMetadataStore(conn).write_index(index)
 
-def load_directory_index(path: Path) -> tuple[dict[str, dict[str, Any]], int]:
-    """Return an index built from all metadata files under *path*.
 
-    The directory is scanned for ``.md``, ``.yml``, and ``.yaml`` files. Each
-    pair of files is loaded with :func:`load_metadata_pair` using a thread
-    pool. The returned tuple contains the combined index and the number of
-    files that were processed.
-    """
+def collect_metadata_paths(path: Path) -> list[Path]:
+    """Return one metadata file per document base name under *path*."""
 
     processed: set[Path] = set()
     paths: list[Path] = []
 
-    for root, _, files in os.walk(path):
+    for root, dirs, files in os.walk(path):
+        # Walk in a stable order so results do not depend on the filesystem.
+        dirs.sort()
         root_path = Path(root)
-        for name in files:
+        for name in sorted(files):
             p = root_path / name
             if p.suffix.lower() not in METADATA_EXTS:
                 continue
@@ -128,15 +135,43 @@ def load_directory_index(path: Path) -> tuple[dict[str, dict[str, Any]], int]:
                 continue
             processed.add(base)
             paths.append(p)
+    return paths
+
+
+def iter_metadata(
+    paths: Iterable[Path], jobs: int = 1
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Yield ``(id, metadata)`` for the metadata pairs at *paths*, in order.
+
+    Pairs are parsed lazily with :func:`load_metadata_pairs`, using ``jobs``
+    worker processes, so only a bounded window of documents is held in
+    memory while the consumer writes them.
+    """
+
+    for metadata in load_metadata_pairs(paths, jobs=jobs, loader=load_metadata_pair):
+        if metadata:
+            yield metadata["id"], metadata
 
-    index: dict[str, dict[str, Any]] = {}
-    num_workers = min(10, max(2, os.cpu_count() or 1))
-    with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        for metadata in executor.map(load_metadata_pair, paths):
-            if metadata:
-                index[metadata["id"]] = metadata
 
-    return index, len(paths)
+def load_paths(paths: list[Path], jobs: int = 1) -> dict[str, dict[str, Any]]:
+    """Return an index of the metadata pairs at *paths*."""
+
+    return dict(iter_metadata(paths, jobs))
+
+
+def load_directory_index(
+    path: Path, jobs: int = 1
+) -> tuple[dict[str, dict[str, Any]], int]:
+    """Return an index built from all metadata files under *path*.
+
+    The directory is scanned for ``.md``, ``.yml``, and ``.yaml`` files. Each
+    pair of files is loaded with :func:`load_metadata_pair`, in ``jobs``
+    worker processes when greater than one. The returned tuple contains the
+    combined index and the number of files that were processed.
+    """
+
+    paths = collect_metadata_paths(path)
+    return load_paths(paths, jobs), len(paths)
 
 
 def load_index_from_path(path: Path) -> tuple[dict[str, dict[str, Any]], int]:
@@ -165,6 +200,134 @@ def load_index_from_path(path: Path) -> tuple[dict[str, dict[str, Any]], int]:
     raise SystemExit(1)
 
 
+def _relative(path: Path) -> str:
+    return str(path.resolve().relative_to(Path.cwd()))
+
+
+def _sha1(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def index_fingerprint() -> str:
+    """Return what the stored fields depend on besides their sources.
+
+    Fields such as ``url`` are derived with the :mod:`pie` code and
+    ``BASE_URL``, so skipping a document whose sources are unchanged is only
+    safe while both are the same as when the index was written.
+    """
+
+    return cache_key("index", code_digest(), os.getenv("BASE_URL", ""))
+
+
+def find_unchanged(store: MetadataStore, paths: list[Path]) -> dict[Path, str]:
+    """Return the document id for each path whose sources are unchanged.
+
+    A document is unchanged when its current metadata pair is exactly the set
+    of sources recorded in ``<id>.sha1`` and every SHA1 digest still matches,
+    so it can be skipped without parsing any YAML or Markdown. Callers check
+    :func:`index_fingerprint` first.
+    """
+
+    sources: dict[Path, list[Path]] = {}
+    for p in paths:
+        sources[p] = [f for f in metadata_pair_files(p) if f is not None]
+
+    relative: dict[Path, str] = {}
+    for files in sources.values():
+        for f in files:
+            try:
+                relative[f] = _relative(f)
+            except ValueError:
+                pass
+
+    ids = store.ids_for_paths(sorted(set(relative.values())))
+    digests = store.stored_digests(sorted(set(ids.values())))
+
+    unchanged: dict[Path, str] = {}
+    for p, files in sources.items():
+        if not files or any(f not in relative for f in files):
+            continue
+        doc_ids = {ids.get(relative[f]) for f in files}
+        if len(doc_ids) != 1 or None in doc_ids:
+            continue
+        doc_id = doc_ids.pop()
+        stored = digests.get(doc_id, {})
+        if set(stored) != {relative[f] for f in files}:
+            continue
+        if all(stored[relative[f]] == _sha1(f) for f in files):
+            unchanged[p] = doc_id
+    return unchanged
+
+
+def find_removed(store: MetadataStore, root: Path, seen: set[str]) -> list[str]:
+    """Return indexed ids whose sources all lived under *root* but were not seen.
+
+    Only documents with recorded sources are considered, so entries loaded
+    from a JSON index or another directory are never removed.
+    """
+
+    candidates = sorted(store.known_ids() - seen)
+    if not candidates:
+        return []
+    try:
+        prefix = Path(_relative(root))
+    except ValueError:
+        return []
+    digests = store.stored_digests(candidates)
+    return [
+        doc_id
+        for doc_id in candidates
+        if digests.get(doc_id)
+        and all(Path(p).is_relative_to(prefix) for p in digests[doc_id])
+    ]
+
+
+def update_store(
+    store: MetadataStore,
+    documents: Documents,
+    *,
+    skipped: Iterable[str] = (),
+    root: Path | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    fingerprint: str | None = None,
+) -> dict[str, int]:
+    """Stream *documents* into *store* and return change counts.
+
+    *skipped* names unchanged documents that were not reloaded. When *root*
+    is given, documents under it that were neither written nor skipped are
+    deleted afterwards (see :func:`find_removed`). Nothing is written, and no
+    new generation is published, when there is nothing to write or delete.
+    A *fingerprint* is published with the documents.
+    """
+
+    known = store.known_ids()
+    seen = set(skipped)
+    counts = {"added": 0, "changed": 0, "removed": 0, "skipped": len(seen)}
+
+    def track() -> Iterator[tuple[str, Mapping[str, Any]]]:
+        for doc_id, props in iter_documents(documents):
+            counts["changed" if doc_id in known else "added"] += 1
+            seen.add(doc_id)
+            yield doc_id, props
+
+    stream = track()
+    first = next(stream, None)
+    if first is not None:
+        store.write_index(
+            chain([first], stream),
+            batch_size=batch_size,
+            workers=workers,
+            fingerprint=fingerprint,
+        )
+
+    removed = find_removed(store, root, seen) if root is not None else []
+    if removed:
+        store.delete(removed)
+        counts["removed"] = len(removed)
+    return counts
+
+
 def main(argv: Iterable[str] | None = None) -> None:
     """Entry point for the ``update-index`` console script."""
     args = parse_args(argv)
@@ -172,15 +335,61 @@ def main(argv: Iterable[str] | None = None) -> None:
 
     start = time.perf_counter()
     path = Path(args.path)
-    logger.debug("Connecting to Redis", host=args.host, port=args.port)
-    r = redis.Redis(host=args.host, port=args.port, decode_responses=True)
+    store: MetadataStore
+    if args.backend == "redis":
+        logger.debug("Connecting to Redis", host=args.host, port=args.port)
+        r = redis.Redis(host=args.host, port=args.port, decode_responses=True)
+        store = RedisMetadataStore(r, grace_period=args.grace)
+    else:
+        store = open_store(args.backend, path=args.db)
+
+    fingerprint = index_fingerprint()
+    full = args.full
+    if not full and store.fingerprint() != fingerprint:
+        logger.info("Index fingerprint changed; reloading every document")
+        full = True
 
-    index, files_scanned = load_index_from_path(path)
-    logger.debug("Loaded index", entries=len(index))
-    update_redis(r, index)
+    unchanged: dict[Path, str] = {}
+    root: Path | None = None
+    documents: Documents
+    if path.is_dir():
+        paths = collect_metadata_paths(path)
+        if not full:
+            unchanged = find_unchanged(store, paths)
+        documents = iter_metadata(
+            (p for p in paths if p not in unchanged), args.jobs
+        )
+        files_scanned = len(paths)
+        root = path
+    elif path.suffix.lower() in METADATA_EXTS and not full:
+        unchanged = find_unchanged(store, [path])
+        documents, files_scanned = (
+            ({}, 1) if unchanged else load_index_from_path(path)
+        )
+    else:
+        documents, files_scanned = load_index_from_path(path)
+    logger.debug("Skipping unchanged documents", skipped=len(unchanged))
+    counts = update_store(
+        store,
+        documents,
+        skipped=unchanged.values(),
+        root=root,
+        batch_size=args.batch_size,
+        workers=args.connections,
+        fingerprint=fingerprint,
+    )
 
     elapsed = time.perf_counter() - start
-    logger.info("update complete", files=files_scanned, elapsed=f"{elapsed:.2f}s")
+    rate = store.keys_written / elapsed if elapsed else 0.0
+    logger.info(
+        "update complete",
+        files=files_scanned,
+        **counts,
+        keys=store.keys_written,
+        rate=f"{rate:.0f} keys/s",
+        elapsed=f"{elapsed:.2f}s",
+    )
+    log_parse_cache_stats()
 
 
 if __name__ == "__main__":
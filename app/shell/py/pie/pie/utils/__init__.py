@@ -9,13 +9,18 @@ compatibility.
 
 from __future__ import annotations
 
+import hashlib
 import json
+import os
 import re
+import shutil
 from datetime import datetime
 from fnmatch import fnmatch
+from itertools import islice
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator, TypeVar
 
+from pie.dependencies import record_file
 from pie.logging import logger
 from pie.yaml import read_yaml, write_yaml
 
@@ -31,23 +36,147 @@ def read_json(filename: str):
     """Return JSON-decoded data from *filename*."""
 
     logger.debug("Reading JSON", filename=filename)
+    record_file(filename)
     with open(filename, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def write_json(data, filename: str) -> None:
-    """Write *data* as JSON to *filename*."""
+def write_json(data, filename: str) -> bool:
+    """Write *data* as JSON to *filename*, only if it changed."""
 
     logger.debug("Writing JSON", filename=filename)
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, sort_keys=True)
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return write_utf8(text, filename)
 
 
-def write_utf8(text: str, filename: str) -> None:
-    """Write *text* to *filename* encoded as UTF-8."""
+def write_utf8(text: str, filename: str) -> bool:
+    """Write *text* to *filename* encoded as UTF-8, only if it changed.
 
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(text)
+    See :func:`write_utf8_chunks`; returns whether *filename* was replaced.
+    """
+
+    return write_utf8_chunks((text,), filename)
+
+
+# Characters of output collected before they are encoded and written.
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+class WriteStats:
+    """Count files replaced and writes skipped because nothing changed."""
+
+    def __init__(self) -> None:
+        self.written = 0
+        self.skipped = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """Return the counters and the share of writes skipped."""
+
+        total = self.written + self.skipped
+        return {
+            "written": self.written,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / total, 3) if total else 0.0,
+        }
+
+
+#: Updated by :func:`write_utf8_chunks` and everything built on it.
+write_stats = WriteStats()
+
+
+def log_write_stats() -> None:
+    """Log :data:`write_stats` at debug level if anything was written."""
+
+    if write_stats.written or write_stats.skipped:
+        logger.debug("Output files", **write_stats.stats())
+
+
+def _same_content(filename: str, size: int, digest: str) -> bool:
+    """Return ``True`` if *filename* has *size* bytes with SHA1 *digest*."""
+
+    try:
+        if os.stat(filename).st_size != size:
+            return False
+        with open(filename, "rb") as f:
+            return hashlib.file_digest(f, "sha1").hexdigest() == digest
+    except OSError:
+        return False
+
+
+def write_utf8_chunks(chunks: Iterable[str], filename: str) -> bool:
+    """Write *chunks* to *filename* as UTF-8, atomically and only if changed.
+
+    The chunks are encoded and hashed in batches of about
+    :data:`WRITE_BUFFER_SIZE` characters as they are written to a temporary
+    file next to *filename*, so memory use is bounded by that or the largest
+    chunk rather than the whole text, and the file is renamed into place
+    once complete. When *filename* already holds the same bytes the
+    temporary file is dropped instead and the existing file is left alone,
+    modification time included, so it does not trigger downstream rebuilds
+    or uploads; make rules producing such files record their own freshness
+    in a stamp file. A symlinked *filename* is written through to its
+    target, and the mode of an existing file is kept. Returns whether
+    *filename* was replaced; :data:`write_stats` counts both outcomes.
+    """
+
+    filename = os.path.realpath(filename)
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    sha1 = hashlib.sha1()
+    size = 0
+
+    def flush(f, pending: list[str]) -> None:
+        nonlocal size
+        data = "".join(pending).encode("utf-8")
+        pending.clear()
+        sha1.update(data)
+        size += len(data)
+        f.write(data)
+
+    try:
+        with open(tmp, "wb") as f:
+            # Templates yield many small pieces; encode them in batches.
+            pending: list[str] = []
+            buffered = 0
+            for chunk in chunks:
+                pending.append(chunk)
+                buffered += len(chunk)
+                if buffered >= WRITE_BUFFER_SIZE:
+                    flush(f, pending)
+                    buffered = 0
+            flush(f, pending)
+        if _same_content(filename, size, sha1.hexdigest()):
+            write_stats.skipped += 1
+            return False
+        try:
+            shutil.copymode(filename, tmp)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, filename)
+        write_stats.written += 1
+        return True
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+T = TypeVar("T")
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Yield lists of up to *size* consecutive items from *items*.
+
+    Example
+    -------
+    >>> list(batched(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
 
 
 class ExcludeList:
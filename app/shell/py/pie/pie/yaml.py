@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from io import StringIO
 from pathlib import Path
 from typing import Any
 
@@ -25,9 +26,15 @@ def read_yaml(filename: str | Path):
         return yaml.load(f)
 
 
-def write_yaml(data: Any, filename: str | Path) -> None:
-    """Write *data* as YAML to *filename*."""
+def write_yaml(data: Any, filename: str | Path) -> bool:
+    """Write *data* as YAML to *filename*, only if it changed.
+
+    See :func:`pie.utils.write_utf8`; returns whether *filename* was replaced.
+    """
+
+    from pie.utils import write_utf8  # pie.utils imports this module
 
     logger.debug("Writing YAML", filename=str(filename))
-    with open(filename, "w", encoding="utf-8") as f:
-        yaml.dump(data, f)
+    buf = StringIO()
+    yaml.dump(data, buf)
+    return write_utf8(buf.getvalue(), str(filename))
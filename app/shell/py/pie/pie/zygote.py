@@ -0,0 +1,363 @@
+"""Fork server that keeps the ``pie`` console scripts warm.
+
+``make`` starts a fresh interpreter for every ``render-html``,
+``process-yaml`` or ``include-filter`` call, and most of that time goes on
+imports. ``pie-zygote`` imports the heavy modules once, listens on a Unix
+socket and forks a child for each request. The child adopts the caller's
+argv, working directory, environment and standard streams, runs the tool and
+reports its exit status.
+
+Every console script in ``setup.py`` points at a launcher in this module.
+Without ``PIE_ZYGOTE`` the launcher imports and runs the tool in process as
+before. With ``PIE_ZYGOTE`` set to a socket path (or ``1`` for the default
+path) the request is handed to the server, and the tool falls back to running
+in process when no server is listening or the server declines the request.
+
+This module only imports the standard library so the launchers stay cheap.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import tempfile
+from importlib import import_module
+from typing import Callable, Iterable
+
+__all__ = [
+    "DEFAULT_PRELOAD",
+    "SCRIPTS",
+    "call",
+    "launch",
+    "main",
+    "serve",
+    "socket_path",
+]
+
+#: Console script names mapped to the ``module:function`` they run.
+SCRIPTS: dict[str, str] = {
+    "pie": "pie.__main__:main",
+    "check-author": "pie.check.author:main",
+    "check-breadcrumbs": "pie.check.breadcrumbs:main",
+    "check-canonical": "pie.check.canonical:main",
+    "check-page-title": "pie.check.page_title:main",
+    "check-post-build": "pie.check.post_build:main",
+    "check-sitemap-hostname": "pie.check.sitemap_hostname:main",
+    "check-unexpanded-jinja": "pie.check.unexpanded_jinja:main",
+    "check-underscores": "pie.check.underscores:main",
+    "check-all": "pie.check.all:main",
+    "create-post": "pie.create.post:main",
+    "create-site": "pie.create.site:main",
+    "emojify": "pie.filter.emojify:main",
+    "gen-markdown-index": "pie.gen_markdown_index:main",
+    "indextree-create": "pie.create.indextree:main",
+    "include-filter": "pie.filter.include:main",
+    "indextree-json": "pie.indextree_json:main",
+    "nginx-permalinks": "pie.nginx_permalinks:main",
+    "picasso": "pie.build.picasso:main",
+    "render-html": "pie.render.html:main",
+    "render-press": "pie.render.press:main",
+    "render-jinja-template": "pie.render.jinja:main",
+    "render-study-json": "pie.render_study_json:main",
+    "report-static-links": "pie.report.static_links:main",
+    "store-files": "pie.store_files:main",
+    "update-author": "pie.update.author:main",
+    "update-breadcrumbs": "pie.update.breadcrumbs:main",
+    "update-index": "pie.update.index:main",
+    "update-link-filters": "pie.update.link_filters:main",
+    "update-metadata": "pie.update.metadata:main",
+    "update-pubdate": "pie.update.pubdate:main",
+    "update-url": "pie.update.url:main",
+    "migrate-metadata": "pie.update.migrate_metadata:main",
+    "upgrade-indextree": "pie.update.indextree:main",
+    "process-yaml": "pie.process_yaml:main",
+    "sitemap": "pie.sitemap:main",
+}
+
+#: Modules imported by the server before it accepts requests.
+DEFAULT_PRELOAD: tuple[str, ...] = (
+    "pie.render.html",
+    "pie.render.jinja",
+    "pie.process_yaml",
+    "pie.filter.include",
+    "pie.filter.emojify",
+    "pie.metadata",
+)
+
+#: Prefixes of environment variables read while modules are imported. A
+#: request whose values differ from the server's is run in process instead.
+PINNED_ENV_PREFIXES = ("PIE_", "REDIS_")
+
+_LENGTH = struct.Struct("!I")
+_STATUS = struct.Struct("!i")
+_DECLINED = -1
+
+
+def socket_path(value: str | None = None) -> str | None:
+    """Return the socket path configured by ``PIE_ZYGOTE``.
+
+    ``1``, ``true`` and ``yes`` select a per-user path in the temporary
+    directory. ``None`` is returned when the zygote is disabled.
+    """
+
+    if value is None:
+        value = os.environ.get("PIE_ZYGOTE", "")
+    if not value or value.lower() in {"0", "false", "no"}:
+        return None
+    if value.lower() in {"1", "true", "yes"}:
+        return os.path.join(tempfile.gettempdir(), f"pie-zygote-{os.getuid()}.sock")
+    return value
+
+
+def _pinned_env(env: dict[str, str]) -> dict[str, str]:
+    return {
+        key: value
+        for key, value in env.items()
+        if key.startswith(PINNED_ENV_PREFIXES) and key != "PIE_ZYGOTE"
+    }
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("zygote connection closed")
+        data += chunk
+    return data
+
+
+def _exit_status(code: object) -> int:
+    """Translate a ``SystemExit`` code the way the interpreter does."""
+
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run(target: str) -> int:
+    module, _, function = target.partition(":")
+    try:
+        return _exit_status(getattr(import_module(module), function)())
+    except SystemExit as exc:
+        return _exit_status(exc.code)
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+
+def call(target: str, argv: list[str], path: str) -> int | None:
+    """Run *target* with *argv* in the zygote listening on *path*.
+
+    Standard input, output and error are passed to the server as file
+    descriptors. Returns the exit status, or ``None`` when no server is
+    listening or it declined the request, in which case the caller runs the
+    tool itself.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        request = json.dumps(
+            {
+                "target": target,
+                "argv": argv,
+                "cwd": os.getcwd(),
+                "env": dict(os.environ),
+            }
+        ).encode()
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+        socket.send_fds(sock, [_LENGTH.pack(len(request))], [0, 1, 2])
+        sock.sendall(request)
+
+        try:
+            (pid,) = _STATUS.unpack(_recv_exact(sock, _STATUS.size))
+        except ConnectionError:
+            return None
+        if pid == _DECLINED:
+            return None
+
+        def forward(signum, frame) -> None:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+        previous = {
+            signum: signal.signal(signum, forward)
+            for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+        }
+        try:
+            (status,) = _STATUS.unpack(_recv_exact(sock, _STATUS.size))
+        except ConnectionError:
+            # The child died before reporting, e.g. from a forwarded signal.
+            status = 1
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+    return status
+
+
+def launch(name: str) -> int:
+    """Run the console script *name* through the zygote or in process."""
+
+    target = SCRIPTS[name]
+    path = socket_path()
+    if path is not None:
+        status = call(target, sys.argv, path)
+        if status is not None:
+            return status
+    return _run(target)
+
+
+def _launcher(name: str) -> Callable[[], None]:
+    def entry() -> None:
+        sys.exit(launch(name))
+
+    entry.__name__ = entry.__qualname__ = name.replace("-", "_")
+    entry.__doc__ = f"Entry point used by the ``{name}`` console script."
+    return entry
+
+
+for _name in SCRIPTS:
+    globals()[_name.replace("-", "_")] = _launcher(_name)
+del _name
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+
+def _handle(conn: socket.socket, pinned: dict[str, str]) -> int:
+    """Serve one request inside a freshly forked child."""
+
+    message, fds, _flags, _addr = socket.recv_fds(conn, _LENGTH.size, 3)
+    try:
+        (length,) = _LENGTH.unpack(message)
+        request = json.loads(_recv_exact(conn, length))
+        if len(fds) != 3 or _pinned_env(request["env"]) != pinned:
+            conn.sendall(_STATUS.pack(_DECLINED))
+            return 0
+        for fd, target in zip(fds, (0, 1, 2)):
+            os.dup2(fd, target)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    sys.argv = list(request["argv"])
+    conn.sendall(_STATUS.pack(os.getpid()))
+
+    try:
+        status = _run(request["target"])
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+        status = 1
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except OSError:
+            pass
+    try:
+        conn.sendall(_STATUS.pack(status))
+    except OSError:
+        pass
+    return status
+
+
+def serve(path: str, preload: Iterable[str] = DEFAULT_PRELOAD) -> None:
+    """Import *preload* and fork a child for each request on *path*."""
+
+    from pie.logging import logger
+
+    for module in preload:
+        try:
+            import_module(module)
+        except Exception as exc:  # pragma: no cover - depends on environment
+            logger.warning("Could not preload module", module=module, error=str(exc))
+    pinned = _pinned_env(dict(os.environ))
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(64)
+
+    # Children are reaped by the kernel; each child restores the default.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info("Zygote listening", socket=path, pid=os.getpid())
+    try:
+        while True:
+            conn, _ = server.accept()
+            for stream in (sys.stdout, sys.stderr):
+                stream.flush()
+            if os.fork() == 0:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                server.close()
+                try:
+                    status = _handle(conn, pinned)
+                except BaseException:
+                    status = 1
+                os._exit(status & 0xFF)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        logger.info("Zygote stopped", socket=path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Entry point used by the ``pie-zygote`` console script."""
+
+    from pie.cli import create_parser
+    from pie.logging import configure_logging
+
+    parser = create_parser("Serve pie console scripts from a pre-loaded fork server")
+    parser.add_argument(
+        "--socket",
+        help="Unix socket to listen on (default: $PIE_ZYGOTE or a per-user path)",
+    )
+    parser.add_argument(
+        "--preload",
+        nargs="*",
+        default=list(DEFAULT_PRELOAD),
+        help="Modules to import before accepting requests",
+    )
+    args = parser.parse_args(argv)
+    configure_logging(args.verbose, args.log)
+
+    path = args.socket or socket_path() or socket_path("1")
+    serve(path, args.preload)
+
+
+if __name__ == "__main__":  # pragma: no cover - convenience
+    main()
@@ -4,7 +4,7 @@ setup(
     name="pie",
     version="0.1.0",
     packages=find_packages(),
-    install_requires=["emoji", "markdown"],
+    install_requires=["emoji>=2.0,<3", "markdown"],
     author="Brian Lee",
     author_email="",
     description="",
@@ -15,43 +15,47 @@ setup(
         "Operating System :: OS Independent",
     ],
     python_requires='>=3.6',
+    # Console scripts start through pie.zygote so that PIE_ZYGOTE can hand
+    # them to a warm fork server; see pie.zygote.SCRIPTS for their targets.
     entry_points={
         'console_scripts': [
-            'check-author=pie.check.author:main',
-            'check-breadcrumbs=pie.check.breadcrumbs:main',
-            'check-canonical=pie.check.canonical:main',
-            'check-page-title=pie.check.page_title:main',
-            'check-post-build=pie.check.post_build:main',
-            'check-sitemap-hostname=pie.check.sitemap_hostname:main',
-            'check-unexpanded-jinja=pie.check.unexpanded_jinja:main',
-            'check-underscores=pie.check.underscores:main',
-            'check-all=pie.check.all:main',
-            'create-post=pie.create.post:main',
-            'create-site=pie.create.site:main',
-            'emojify=pie.filter.emojify:main',
-            'gen-markdown-index=pie.gen_markdown_index:main',
-            'indextree-create=pie.create.indextree:main',
-            'include-filter=pie.filter.include:main',
-            'indextree-json=pie.indextree_json:main',
-            'nginx-permalinks=pie.nginx_permalinks:main',
-            'picasso=pie.build.picasso:main',
-            'render-html=pie.render.html:main',
-            'render-press=pie.render.press:main',
-            'render-jinja-template=pie.render.jinja:main',
-            'render-study-json=pie.render_study_json:main',
-            'report-static-links=pie.report.static_links:main',
-            'store-files=pie.store_files:main',
-            'update-author=pie.update.author:main',
-            'update-breadcrumbs=pie.update.breadcrumbs:main',
-            'update-index=pie.update.index:main',
-            'update-link-filters=pie.update.link_filters:main',
-            'update-metadata=pie.update.metadata:main',
-            'update-pubdate=pie.update.pubdate:main',
-            'update-url=pie.update.url:main',
-            'migrate-metadata=pie.update.migrate_metadata:main',
-            'upgrade-indextree=pie.update.indextree:main',
-            'process-yaml=pie.process_yaml:main',
-            'sitemap=pie.sitemap:main',
+            'pie=pie.zygote:pie',
+            'check-author=pie.zygote:check_author',
+            'check-breadcrumbs=pie.zygote:check_breadcrumbs',
+            'check-canonical=pie.zygote:check_canonical',
+            'check-page-title=pie.zygote:check_page_title',
+            'check-post-build=pie.zygote:check_post_build',
+            'check-sitemap-hostname=pie.zygote:check_sitemap_hostname',
+            'check-unexpanded-jinja=pie.zygote:check_unexpanded_jinja',
+            'check-underscores=pie.zygote:check_underscores',
+            'check-all=pie.zygote:check_all',
+            'create-post=pie.zygote:create_post',
+            'create-site=pie.zygote:create_site',
+            'emojify=pie.zygote:emojify',
+            'gen-markdown-index=pie.zygote:gen_markdown_index',
+            'indextree-create=pie.zygote:indextree_create',
+            'include-filter=pie.zygote:include_filter',
+            'indextree-json=pie.zygote:indextree_json',
+            'nginx-permalinks=pie.zygote:nginx_permalinks',
+            'picasso=pie.zygote:picasso',
+            'render-html=pie.zygote:render_html',
+            'render-press=pie.zygote:render_press',
+            'render-jinja-template=pie.zygote:render_jinja_template',
+            'render-study-json=pie.zygote:render_study_json',
+            'report-static-links=pie.zygote:report_static_links',
+            'store-files=pie.zygote:store_files',
+            'update-author=pie.zygote:update_author',
+            'update-breadcrumbs=pie.zygote:update_breadcrumbs',
+            'update-index=pie.zygote:update_index',
+            'update-link-filters=pie.zygote:update_link_filters',
+            'update-metadata=pie.zygote:update_metadata',
+            'update-pubdate=pie.zygote:update_pubdate',
+            'update-url=pie.zygote:update_url',
+            'migrate-metadata=pie.zygote:migrate_metadata',
+            'upgrade-indextree=pie.zygote:upgrade_indextree',
+            'process-yaml=pie.zygote:process_yaml',
+            'sitemap=pie.zygote:sitemap',
+            'pie-zygote=pie.zygote:main',
         ],
     },
 )
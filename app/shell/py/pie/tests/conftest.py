@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+# Also set at import time: test modules import pie.render.jinja, which
+# compiles macros.jinja through the bytecode cache before any fixture runs.
+os.environ["PIE_NO_CACHE"] = "1"
+
+
+@pytest.fixture(autouse=True)
+def _no_disk_caches(monkeypatch):
+    """Keep tests hermetic; cache tests opt back in with ``delenv``."""
+    monkeypatch.setenv("PIE_NO_CACHE", "1")
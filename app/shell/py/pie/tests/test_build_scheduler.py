@@ -0,0 +1,191 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from pie import __main__ as pie_main
+from pie.build import scheduler
+from pie.build.scheduler import Node, build, build_graph, critical_path
+
+
+def _copy(src, dst, *deps):
+    return Node(
+        name=dst,
+        label=f"Copy {src}",
+        targets=[dst],
+        deps=[src, *deps],
+        steps=[("pie.build.scheduler:copy_file", (src, dst))],
+    )
+
+
+def _age(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10**9))
+
+
+def test_build_runs_stale_nodes_in_dependency_order(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    Path("a.txt").write_text("a")
+    graph = {
+        "b.txt": _copy("a.txt", "b.txt"),
+        "c.txt": _copy("b.txt", "c.txt"),
+    }
+
+    result = build(graph)
+    assert result.built == ["b.txt", "c.txt"]
+    assert Path("c.txt").read_text() == "a"
+    assert "==> Copy a.txt" in capsys.readouterr().out
+
+    result = build(graph)
+    assert result.built == []
+    assert sorted(result.skipped) == ["b.txt", "c.txt"]
+
+    _age("b.txt")
+    _age("c.txt")
+    Path("a.txt").write_text("A")
+    result = build(graph, dry_run=True)
+    assert result.built == ["b.txt", "c.txt"]
+    assert Path("c.txt").read_text() == "a"
+
+    result = build(graph, ["b.txt"])
+    assert result.built == ["b.txt"]
+    assert Path("c.txt").read_text() == "a"
+
+
+def test_order_only_prerequisites_do_not_trigger_rebuilds(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Path("a.txt").write_text("a")
+    Path("s.txt").write_text("s")
+    stamp = _copy("s.txt", "stamp")
+    page = _copy("a.txt", "page")
+    page.order_only = ["stamp"]
+    graph = {"stamp": stamp, "page": page}
+
+    assert build(graph).built == ["stamp", "page"]
+    _age("a.txt", 20)
+    _age("page")
+    Path("s.txt").write_text("S")
+    assert build(graph).built == ["stamp"]
+
+
+def test_failure_stops_dependents(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Path("a.txt").write_text("a")
+    graph = {
+        "b.txt": _copy("missing.txt", "b.txt"),
+        "c.txt": _copy("b.txt", "c.txt"),
+        "d.txt": _copy("a.txt", "d.txt"),
+    }
+
+    result = build(graph, keep_going=True)
+    assert result.failed == ["b.txt"]
+    assert result.built == ["d.txt"]
+    assert not Path("c.txt").exists()
+
+
+def test_build_with_worker_pool(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    graph = {}
+    for i in range(4):
+        Path(f"{i}.txt").write_text(str(i))
+        graph[f"out/{i}.txt"] = _copy(f"{i}.txt", f"out/{i}.txt")
+    graph["all"] = Node(name="all", label="All", deps=list(graph))
+
+    result = build(graph, jobs=2)
+    assert result.ok
+    assert sorted(result.built) == sorted(graph)
+    assert Path("out/3.txt").read_text() == "3"
+
+
+def test_critical_path_follows_slowest_chain():
+    graph = {
+        "a": Node(name="a", label="a", targets=["a"]),
+        "b": Node(name="b", label="b", targets=["b"], deps=["a"]),
+        "c": Node(name="c", label="c", targets=["c"]),
+        "d": Node(name="d", label="d", targets=["d"], deps=["b", "c"]),
+    }
+    length, path = critical_path(graph, {"a": 1.0, "b": 2.0, "c": 2.5, "d": 0.5})
+    assert path == ["a", "b", "d"]
+    assert length == pytest.approx(3.5)
+
+
+def test_build_graph_matches_picasso_rules(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    src = Path("src")
+    (src / "css").mkdir(parents=True)
+    (src / "css" / "site.css").write_text("")
+    (src / "a.md").write_text('{{ "b" | link }}\n')
+    (src / "a.yml").write_text("id: a\n")
+    (src / "b.md").write_text("B\n")
+    (src / "b.yml").write_text("id: b\ntemplate: src/templates/other.html.jinja\n")
+
+    graph = build_graph(src, Path("build"))
+
+    page = graph["build/a.html"]
+    assert page.deps == [
+        "build/a.md",
+        "build/a.yml",
+        "src/templates/template.html.jinja",
+    ]
+    assert page.order_only == ["build/.update-index"]
+    assert graph["build/b.html"].deps[-1] == "src/templates/other.html.jinja"
+    assert "build/b.md" in graph["build/a.md"].deps
+    assert graph["build/a.yml"].steps[-1] == ("pie.process_yaml:main", ("build/a.yml",))
+    assert graph["build/.update-index"].deps == ["src/a.yml", "src/b.yml"]
+    assert graph["build/sitemap.xml"].deps == ["build/a.html.d", "build/b.html.d"]
+    assert graph["build/sitemap.xml"].targets == ["build/.sitemap"]
+    assert graph["build/a.html"].targets == ["build/a.html.d"]
+    assert "build/css/site.css" in graph
+    assert "check" not in graph
+
+
+def test_main_reports_critical_path(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    Path("src").mkdir()
+    Path("a.txt").write_text("a")
+
+    def fake_graph(*args, **kwargs):
+        return {"b.txt": _copy("a.txt", "b.txt")}
+
+    monkeypatch.setattr(scheduler, "build_graph", fake_graph)
+    pie_main.main(["build", "-j", "1"])
+    out = capsys.readouterr().out
+    assert "==> Built 1, up to date 0, failed 0" in out
+    assert "==> Critical path" in out
+
+    with pytest.raises(SystemExit):
+        pie_main.main(["build", "-j", "1", "nope"])
+
+
+def test_pie_command_usage(capsys):
+    assert pie_main.main([]) == 0
+    assert "build" in capsys.readouterr().out
+    assert pie_main.main(["bogus"]) == 2
+
+
+def test_discovered_prerequisites_trigger_rebuilds(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Path("a.txt").write_text("a")
+    Path("data.json").write_text("{}")
+    node = _copy("a.txt", "b.txt")
+    node.discovered = ["data.json", "gone.json"]
+    graph = {"b.txt": node}
+
+    # A missing discovered file forces a rebuild instead of failing.
+    assert build(graph).built == ["b.txt"]
+    node.discovered = ["data.json"]
+    assert build(graph).skipped == ["b.txt"]
+    later = os.stat("b.txt").st_mtime_ns + 10**9
+    os.utime("data.json", ns=(later, later))
+    assert build(graph).built == ["b.txt"]
+
+
+def test_report_shows_render_cache_counts(capsys):
+    result = scheduler.BuildResult(built=["a.html"])
+    result.cache.update(
+        hits=3, remote_hits=2, misses=1, writes=1, files_written=2, files_unchanged=5
+    )
+    scheduler.report({}, result, 1)
+    out = capsys.readouterr().out
+    assert "==> Render cache: 3 restored (2 remote), 1 rendered, 1 stored" in out
+    assert "==> Output files: 2 written, 5 unchanged" in out
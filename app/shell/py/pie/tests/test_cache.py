@@ -0,0 +1,75 @@
+import os
+
+from pie import cache
+from pie.cli import create_parser
+
+
+def test_disk_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.delenv("PIE_NO_CACHE")
+    store = cache.DiskCache(tmp_path / "c")
+    key = cache.cache_key("a", 1)
+
+    assert store.get(key) is cache.MISSING
+    store.set(key, {"x": [1, 2]})
+    store.set(cache.cache_key("none"), None)
+
+    assert store.get(key) == {"x": [1, 2]}
+    assert store.get(cache.cache_key("none")) is None
+    assert store.stats() == {
+        "hits": 2,
+        "misses": 1,
+        "writes": 2,
+        "errors": 0,
+        "hit_rate": 0.667,
+    }
+
+
+def test_disk_cache_ignores_corrupt_entries(tmp_path, monkeypatch):
+    monkeypatch.delenv("PIE_NO_CACHE")
+    store = cache.DiskCache(tmp_path)
+    key = cache.cache_key("k")
+    store.set(key, "v")
+    next(tmp_path.rglob("*.pickle")).write_bytes(b"garbage")
+
+    assert store.get(key, "default") == "default"
+    assert store.errors == 1
+
+
+def test_disk_cache_disabled(tmp_path):
+    store = cache.DiskCache(tmp_path)
+    store.set("k", "v")
+    assert store.get("k") is cache.MISSING
+    assert not any(tmp_path.iterdir())
+
+
+def test_no_cache_flag_sets_environment(monkeypatch):
+    monkeypatch.delenv("PIE_NO_CACHE")
+    args = create_parser("test").parse_args(["--no-cache"])
+    assert args.no_cache is True
+    assert os.environ["PIE_NO_CACHE"] == "1"
+
+
+def test_parse_size():
+    assert cache.parse_size("512") == 512
+    assert cache.parse_size("2k") == 2048
+    assert cache.parse_size("1.5G") == 3 << 29
+    assert cache.parse_size("10MB") == 10 << 20
+
+
+def test_code_digest_changes_with_sources(tmp_path, monkeypatch):
+    (tmp_path / "cache.py").write_text("a = 1\n")
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "page.jinja").write_text("{{ a }}")
+    (tmp_path / "__pycache__").mkdir()
+    monkeypatch.setattr(cache, "__file__", str(tmp_path / "cache.py"))
+
+    def digest():
+        cache.code_digest.cache_clear()
+        return cache.code_digest()
+
+    first = digest()
+    (tmp_path / "__pycache__" / "cache.pyc").write_bytes(b"\0")
+    assert digest() == first
+    (tmp_path / "templates" / "page.jinja").write_text("{{ b }}")
+    assert digest() != first
+    cache.code_digest.cache_clear()
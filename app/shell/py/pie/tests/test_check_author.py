@@ -150,7 +150,7 @@ def test_main_uses_default_exclude_file(tmp_path: Path, monkeypatch) -> None:
     default_exclude = cfg / "check-author-exclude.yml"
     default_exclude.write_text("- doc.md\n", encoding="utf-8")
 
-    def fake_iter(root: Path, base_dir: Path):
+    def fake_iter(root: Path, base_dir: Path, jobs: int = 1):
         yield doc, [doc], {"doc": {}}
 
     monkeypatch.setattr(check_author, "_iter_metadata", fake_iter)
@@ -169,7 +169,7 @@ def test_main_skips_absolute_paths(tmp_path: Path, monkeypatch) -> None:
     outside = tmp_path / "outside.md"
     outside.write_text("---\ntitle: Outside\n---\n", encoding="utf-8")
 
-    def fake_iter(root: Path, base_dir: Path):
+    def fake_iter(root: Path, base_dir: Path, jobs: int = 1):
         yield doc, [outside], {"doc": {"author": "Jane"}}
 
     monkeypatch.setattr(check_author, "_iter_metadata", fake_iter)
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from pie import dependencies, metadata
+from pie.dependencies import (
+    format_depfile,
+    read_depfile,
+    record_dependencies,
+    record_file,
+    write_depfile,
+)
+
+
+def test_depfile_round_trip(tmp_path):
+    text = format_depfile("build/a.html", ["src/b.yml", "src/my page.md", "src/b.yml"])
+    assert text == (
+        "build/a.html: \\\n"
+        " src/b.yml \\\n"
+        " src/my\\ page.md\n"
+        "src/b.yml src/my\\ page.md:\n"
+    )
+    path = tmp_path / "a.html.d"
+    path.write_text(text, encoding="utf-8")
+    assert read_depfile(path) == ["src/b.yml", "src/my page.md"]
+    assert read_depfile(tmp_path / "missing.d") == []
+
+    empty = tmp_path / "empty.d"
+    empty.write_text(format_depfile("build/a.html", []), encoding="utf-8")
+    assert read_depfile(empty) == []
+
+
+def test_recorders_collect_documents_and_files(tmp_path, monkeypatch):
+    class Store:
+        def get_document(self, name):
+            return {"id": name, "path": [f"src/{name}.yml"]}
+
+        def get_many(self, names):
+            return [self.get_document(n) if n != "gone" else None for n in names]
+
+    monkeypatch.setattr(metadata, "metadata_store", Store())
+    metadata.clear_cached_metadata()
+    with record_dependencies() as outer:
+        metadata.get_cached_metadata("a")
+        with record_dependencies() as inner:
+            metadata.get_cached_metadata("a")  # cache hit still counts
+            record_file("data.json")
+        dependencies.record_document("b")
+        dependencies.record_document("gone")
+    record_file("ignored.json")
+
+    assert inner.files == {"src/a.yml", "data.json"}
+    assert outer.unresolved == {"b", "gone"}
+    outer.resolve()
+    assert outer.ids == {"a", "b", "gone"}
+    assert outer.files == {"src/a.yml", "src/b.yml", "data.json"}
+
+    target = tmp_path / "a.html"
+    write_depfile(str(target), outer)
+    assert read_depfile(f"{target}.d") == ["data.json", "src/a.yml", "src/b.yml"]
+    assert Path(f"{target}.d").read_text().startswith(f"{target}.stamp: \\\n")
@@ -15,3 +15,71 @@ def test_emojify_reads_stdin(capsys, monkeypatch):
     emojify.main([])
     out = capsys.readouterr().out
     assert out == "Good 🐶\n"
+
+
+def test_emojify_text_matches_emoji_emojize():
+    import emoji
+
+    text = (
+        "Hi :smile: :thumbsup::+1: :thumbs_up: :Smile: :ｓｍｉｌｅ: :piñata: "
+        "https://example.com:8080/a:b 10:30 `:dog:` :not_an_emoji: ::"
+    )
+    assert emojify.emojify_text(text) == emoji.emojize(text, language="alias")
+    for name in list(emojify.emoji_names())[::50]:
+        assert emojify.emojify_text(name) == emoji.emojize(name, language="alias")
+
+
+def test_emojify_text_without_codes_is_unchanged():
+    text = "no shortcodes here\n" * 100
+    assert emojify.emojify_text(text) is text
+
+
+def _reset(monkeypatch):
+    monkeypatch.setattr(emojify, "_supported", True)
+    monkeypatch.setattr(emojify, "_pattern", None)
+    monkeypatch.setattr(emojify, "_names", {})
+    monkeypatch.setattr(emojify, "_complete", False)
+
+
+def test_emojify_text_reads_no_emoji_data_without_candidates(monkeypatch):
+    _reset(monkeypatch)
+    text = "Note: see https://example.com/a at 10:30"
+    assert emojify.emojify_text(text) is text
+    assert emojify._pattern is None and emojify._names == {}
+
+
+def test_emojify_text_scans_few_codes_then_builds_table(monkeypatch):
+    import emoji
+
+    _reset(monkeypatch)
+    codes = [f":{name}:" for name in ("smile", "dog", "cat", "+1", "nope", "fire")]
+    text = " ".join(codes * 2)
+    assert emojify.emojify_text(text) == emoji.emojize(text, language="alias")
+    assert not emojify._complete and len(emojify._names) == len(codes)
+
+    names = [f":{i}:" for i in range(emojify._SCAN_LIMIT)] + [":thumbsup:", ":piñata:"]
+    text = " ".join(names)
+    assert emojify.emojify_text(text) == emoji.emojize(text, language="alias")
+    assert emojify._complete
+
+
+def test_emoji_name_characters_are_cached(tmp_path, monkeypatch):
+    from pie.cache import DiskCache
+
+    _reset(monkeypatch)
+    monkeypatch.delenv("PIE_NO_CACHE")
+    cache = DiskCache(tmp_path / "emoji")
+    monkeypatch.setattr(emojify, "name_chars_cache", cache)
+    chars = emojify._all_name_chars()
+    assert not any(c.isspace() or c == ":" for c in chars)
+    assert emojify._all_name_chars() == chars
+    assert (cache.writes, cache.hits) == (1, 1)
+
+
+def test_emojify_text_falls_back_to_emojize(monkeypatch):
+    import emoji
+
+    _reset(monkeypatch)
+    monkeypatch.delattr(emoji, "STATUS")
+    assert emojify.emojify_text("Hi :smile:") == emoji.emojize("Hi :smile:", language="alias")
+    assert emojify.emoji_names() == {}
@@ -43,8 +43,7 @@ def test_show_property(tmp_path, monkeypatch):
 
     monkeypatch.setattr(index_tree, "get_metadata_by_path", fake_meta)
 
-    def fake_build(prefix: str):
-        doc_id = prefix.rstrip(".")
+    def fake_get(doc_id: str):
         for p in tmp_path.rglob("*.yml"):
             data = yaml.load(p.read_text()) or {}
             if "doc" not in data and "title" in data:
@@ -53,7 +52,7 @@ def test_show_property(tmp_path, monkeypatch):
                 return data
         return None
 
-    monkeypatch.setattr(metadata, "build_from_redis", fake_build)
+    monkeypatch.setattr(metadata, "get_metadata", fake_get)
 
     lines = list(generate(tmp_path))
     assert lines == [
@@ -82,8 +81,7 @@ def test_missing_id_uses_filename(tmp_path, monkeypatch):
 
     monkeypatch.setattr(index_tree, "get_metadata_by_path", fake_meta)
 
-    def fake_build(prefix: str):
-        doc_id = prefix.rstrip(".")
+    def fake_get(doc_id: str):
         for p in tmp_path.rglob("*.yml"):
             data = yaml.load(p.read_text()) or {}
             if "doc" not in data and "title" in data:
@@ -92,7 +90,7 @@ def test_missing_id_uses_filename(tmp_path, monkeypatch):
                 return data
         return None
 
-    monkeypatch.setattr(metadata, "build_from_redis", fake_build)
+    monkeypatch.setattr(metadata, "get_metadata", fake_get)
 
     lines = list(generate(tmp_path))
 
@@ -166,8 +164,7 @@ def test_numeric_filenames_sort(tmp_path, monkeypatch):
 
     monkeypatch.setattr(index_tree, "get_metadata_by_path", fake_meta)
 
-    def fake_build(prefix: str):
-        doc_id = prefix.rstrip(".")
+    def fake_get(doc_id: str):
         for p in tmp_path.rglob("*.yml"):
             data = yaml.load(p.read_text()) or {}
             if "doc" not in data and "title" in data:
@@ -176,7 +173,7 @@ def test_numeric_filenames_sort(tmp_path, monkeypatch):
                 return data
         return None
 
-    monkeypatch.setattr(metadata, "build_from_redis", fake_build)
+    monkeypatch.setattr(metadata, "get_metadata", fake_get)
 
     lines = list(generate(tmp_path))
 
@@ -3,7 +3,7 @@ from pathlib import Path
 from pie import index_tree, metadata
 
 
-def test_build_from_redis_used(monkeypatch):
+def test_get_metadata_used(monkeypatch):
     path = Path("/doc.yml")
 
     def fake_get_metadata_by_path(filepath: str, keypath: str):
@@ -13,8 +13,8 @@ def test_build_from_redis_used(monkeypatch):
 
     calls: list[str] = []
 
-    def fake_build(prefix: str):
-        calls.append(prefix)
+    def fake_get(name: str):
+        calls.append(name)
         return {
             "id": "doc1",
             "title": "Title",
@@ -23,7 +23,7 @@ def test_build_from_redis_used(monkeypatch):
         }
 
     monkeypatch.setattr(index_tree, "get_metadata_by_path", fake_get_metadata_by_path)
-    monkeypatch.setattr(metadata, "build_from_redis", fake_build)
+    monkeypatch.setattr(metadata, "get_metadata", fake_get)
 
     meta = index_tree.load_from_redis(path)
 
@@ -33,5 +33,5 @@ def test_build_from_redis_used(monkeypatch):
         "url": "URL",
         "indextree": {"link": "1", "show": "0"},
     }
-    assert calls == ["doc1."]
+    assert calls == ["doc1"]
 
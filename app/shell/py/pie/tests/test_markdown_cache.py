@@ -0,0 +1,48 @@
+from pie.cache import DiskCache
+from pie.render import jinja
+from pie.render.jinja.markdown import MarkdownCache
+
+
+def test_render_press_converts_repeated_text_once(monkeypatch):
+    cache = MarkdownCache(("press",))
+    monkeypatch.setattr(jinja, "markdown_cache", cache)
+    converted = []
+    press_html = jinja._press_html
+    monkeypatch.setattr(
+        jinja, "_press_html", lambda text: converted.append(text) or press_html(text)
+    )
+    for _ in range(3):
+        assert jinja.render_press("**hi** :smile:") == "<p><strong>hi</strong> 😄</p>\n"
+    assert converted == ["**hi** :smile:"]
+    assert cache.stats()["hits"] == 2
+
+
+def test_markdown_cache_evicts_by_size():
+    cache = MarkdownCache(max_size=12)
+    for text in ("aa", "bb", "cc"):
+        cache.get(text, str.upper)
+    assert cache.size == 12
+    cache.get("dd", str.upper)
+    assert cache.evictions == 1 and cache.size == 12
+    cache.get("aa", str.upper)
+    assert cache.stats()["misses"] == 5
+
+
+def test_markdown_cache_on_disk(tmp_path, monkeypatch):
+    monkeypatch.delenv("PIE_NO_CACHE", raising=False)
+    converted = []
+
+    def convert(text):
+        converted.append(text)
+        return text.upper()
+
+    first = MarkdownCache(("v1",), disk=DiskCache(tmp_path))
+    assert first.get("text", convert) == "TEXT"
+    second = MarkdownCache(("v1",), disk=DiskCache(tmp_path))
+    assert second.get("text", convert) == "TEXT"
+    assert second.stats()["disk_hits"] == 1
+    assert converted == ["text"]
+
+    # Other options or library versions do not share entries.
+    MarkdownCache(("v2",), disk=DiskCache(tmp_path)).get("text", convert)
+    assert converted == ["text", "text"]
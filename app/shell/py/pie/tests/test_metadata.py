@@ -6,6 +6,8 @@ import ruamel.yaml as yaml
 from pathlib import Path
 
 from pie import metadata
+from pie.store import RedisMetadataStore
+from pie.store.redis import INDEX_GENERATION_KEY
 
 
 def test_get_url_from_src_md(tmp_path):
@@ -185,3 +187,223 @@ def test__get_redis_value_missing_returns_none():
     finally:
         metadata.redis_conn = None
 
+
+
+def test_build_from_redis_uses_manifest(monkeypatch):
+    """<id>.__keys__ lists the document keys so KEYS is never called."""
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    fake.set("doc.title", '"T"')
+    fake.set("doc.tags.0", '"a"')
+    fake.set("doc.extra", '"not indexed"')
+    fake.sadd("doc.__keys__", "doc.title", "doc.tags.0")
+
+    def no_keys(pattern):
+        raise AssertionError("KEYS should not be used")
+
+    monkeypatch.setattr(fake, "keys", no_keys)
+    monkeypatch.setattr(metadata, "redis_conn", fake)
+    assert metadata.build_from_redis("doc.") == {"title": "T", "tags": ["a"]}
+
+
+def test_build_from_redis_without_manifest_scans():
+    """Indexes without a manifest are still readable via KEYS."""
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    fake.set("doc.title", '"T"')
+    metadata.redis_conn = fake
+    try:
+        assert metadata.build_from_redis("doc.") == {"title": "T"}
+    finally:
+        metadata.redis_conn = None
+
+
+def test_build_from_redis_fetches_values_with_mget(monkeypatch):
+    """Document values are read with one MGET, not a GET per key."""
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    fake.set("doc.title", '"T"')
+    fake.set("doc.url", '"/doc.html"')
+    fake.sadd("doc.__keys__", "doc.title", "doc.url")
+
+    original_get = fake.get
+
+    def no_get(key):
+        # Only the generation pointer is read with GET.
+        assert key == INDEX_GENERATION_KEY, "GET should not be used"
+        return original_get(key)
+
+    monkeypatch.setattr(fake, "get", no_get)
+    monkeypatch.setattr(metadata, "redis_conn", fake)
+    assert metadata.build_from_redis("doc.") == {"title": "T", "url": "/doc.html"}
+
+
+def test_get_metadata_many_fills_cache(monkeypatch):
+    """Several ids are fetched together and cached; unknown ids map to None."""
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    fake.set("a.title", '"A"')
+    fake.sadd("a.__keys__", "a.title")
+    fake.set("b.title", '"B"')
+    monkeypatch.setattr(metadata, "redis_conn", fake)
+    monkeypatch.setattr(metadata, "_metadata_cache", {})
+
+    calls = []
+    original_mget = fake.mget
+
+    def counting_mget(keys):
+        calls.append(list(keys))
+        return original_mget(keys)
+
+    monkeypatch.setattr(fake, "mget", counting_mget)
+
+    result = metadata.get_metadata_many(["a", "b", "missing", "a"])
+
+    assert result == {"a": {"title": "A"}, "b": {"title": "B"}, "missing": None}
+    assert calls == [["a.title", "b.title"]]
+    assert metadata._metadata_cache == {"a": {"title": "A"}, "b": {"title": "B"}}
+
+
+def test_get_cached_metadata_unknown_id_fails_fast(monkeypatch):
+    """Ids absent from a published index fail without another lookup."""
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    RedisMetadataStore(fake).write_index({"known": {"title": "K"}})
+    monkeypatch.setattr(metadata, "redis_conn", fake)
+    monkeypatch.setattr(metadata, "_metadata_cache", {})
+    monkeypatch.setattr(metadata, "_index_state", None)
+    monkeypatch.setattr(metadata.time, "sleep", lambda s: pytest.fail("slept"))
+
+    calls = []
+    original = metadata.get_metadata
+
+    def counting_get(name):
+        calls.append(name)
+        return original(name)
+
+    monkeypatch.setattr(metadata, "get_metadata", counting_get)
+
+    assert metadata.get_cached_metadata("known") == {"title": "K"}
+    for _ in range(2):
+        with pytest.raises(SystemExit):
+            metadata.get_cached_metadata("unknown")
+    assert calls == ["known", "unknown"]
+    assert "unknown" in metadata._index_state.missing
+
+
+def test_get_index_state_without_generation(monkeypatch):
+    """Indexes without a generation are not ready and may contain any id."""
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(metadata, "redis_conn", fake)
+    monkeypatch.setattr(metadata, "_index_state", None)
+    monkeypatch.setenv("PIE_INDEX_TIMEOUT", "0")
+
+    state = metadata.get_index_state()
+
+    assert not state.ready
+    assert state.may_contain("anything")
+    assert metadata.get_index_state() is state
+
+
+def test_metadata_cache_evicts_least_recently_used(monkeypatch):
+    """Entries beyond maxsize are evicted oldest first; stats count lookups."""
+    monkeypatch.setattr(metadata, "redis_conn", fakeredis.FakeRedis(decode_responses=True))
+    cache = metadata.MetadataCache(maxsize=2, check_interval=60)
+    cache["a"] = {"id": "a"}
+    cache["b"] = {"id": "b"}
+    assert cache.get("a") == {"id": "a"}
+    cache["c"] = {"id": "c"}
+
+    assert "b" not in cache
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+
+
+def test_metadata_cache_invalidated_by_generation(monkeypatch):
+    """A new index generation drops cached documents."""
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    writer = RedisMetadataStore(fake)
+    writer.write_index({"doc": {"title": "Old"}})
+    monkeypatch.setattr(metadata, "redis_conn", fake)
+    monkeypatch.setattr(metadata, "_index_state", None)
+    cache = metadata.enable_metadata_cache(maxsize=8, check_interval=0)
+    try:
+        assert metadata.get_cached_metadata("doc") == {"title": "Old"}
+        assert metadata.get_cached_metadata("doc") == {"title": "Old"}
+
+        writer.write_index({"doc": {"title": "New"}})
+
+        assert metadata.get_cached_metadata("doc") == {"title": "New"}
+        stats = metadata.metadata_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["invalidations"] == 1
+        assert stats["generation"] == "2"
+    finally:
+        metadata._metadata_cache = {}
+    assert cache.maxsize == 8
+
+
+def test_load_metadata_pairs_process_pool_keeps_order(tmp_path, monkeypatch):
+    """Results from worker processes come back in input order."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    paths = []
+    for i in range(40):
+        path = Path("src") / f"doc{i}.yml"
+        path.write_text(f"title: Doc {i}\n")
+        paths.append(path)
+
+    results = list(metadata.load_metadata_pairs(paths, jobs=3, chunksize=2))
+
+    assert [r["id"] for r in results] == [f"doc{i}" for i in range(40)]
+    assert list(metadata.load_metadata_pairs(paths[:2])) == results[:2]
+
+
+def _title_loader(path):
+    return {"loaded": str(path)}
+
+
+def test_load_metadata_pairs_custom_loader_skips_parse_cache(tmp_path, monkeypatch):
+    """A custom loader is never answered with load_metadata_pair's results."""
+    from pie.cache import DiskCache
+
+    monkeypatch.delenv("PIE_NO_CACHE")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(metadata, "parse_cache", DiskCache(tmp_path / "cache"))
+    (tmp_path / "src").mkdir()
+    paths = [Path(f"src/doc{i}.yml") for i in range(3)]
+    for path in paths:
+        path.write_text("title: Doc\n")
+        metadata.load_metadata_pair(path)
+
+    results = list(
+        metadata.load_metadata_pairs(paths, jobs=2, chunksize=1, loader=_title_loader)
+    )
+
+    assert results == [{"loaded": str(path)} for path in paths]
+
+
+def test_load_metadata_pair_uses_parse_cache(tmp_path, monkeypatch):
+    """Unchanged pairs come from the parse cache without YAML parsing."""
+    from pie.cache import DiskCache
+
+    monkeypatch.delenv("PIE_NO_CACHE")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(metadata, "parse_cache", DiskCache(tmp_path / "cache"))
+    (tmp_path / "src").mkdir()
+    yml = Path("src/doc.yml")
+    yml.write_text("title: One\n")
+
+    first = metadata.load_metadata_pair(yml)
+
+    def no_parse(path):
+        raise AssertionError("parsed " + path)
+
+    original = metadata.read_from_yaml
+    monkeypatch.setattr(metadata, "read_from_yaml", no_parse)
+    assert metadata.load_metadata_pair(yml) == first
+    assert metadata.parse_cache.stats()["hits"] == 1
+
+    monkeypatch.setattr(metadata, "read_from_yaml", original)
+    yml.write_text("title: Changed\n")
+    assert metadata.load_metadata_pair(yml)["title"] == "Changed"
+    assert metadata.parse_cache.stats()["misses"] == 2
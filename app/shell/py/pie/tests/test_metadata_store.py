@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+
+import fakeredis
+import pytest
+from pie import metadata
+from pie.store import RedisMetadataStore, SqliteMetadataStore, open_store
+from pie.store.flatten import flatten_index, unflatten_document
+from pie.update import index as update_index
+
+INDEX = {
+    "doc": {
+        "title": "Doc",
+        "tags": ["a", "b"],
+        "doc": {"author": {"name": "Alice"}, "draft": False},
+    },
+    "other": {"title": "Other", "weight": 3},
+}
+
+
+@pytest.fixture(params=["redis", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "redis":
+        yield RedisMetadataStore(fakeredis.FakeRedis(decode_responses=True))
+        return
+    db = SqliteMetadataStore(tmp_path / "metadata.sqlite")
+    yield db
+    db.close()
+
+
+def test_store_round_trips_documents(store):
+    assert store.generation() is None
+    assert store.write_index(INDEX) == 1
+
+    assert store.get_document("doc") == INDEX["doc"]
+    assert store.get_many(["other", "missing", "doc"]) == [
+        INDEX["other"],
+        None,
+        INDEX["doc"],
+    ]
+    assert store.known_ids() == {"doc", "other"}
+    assert int(store.generation()) == 1
+
+
+def test_store_get_by_path_and_delete(store, tmp_path):
+    src = tmp_path / "doc.md"
+    src.write_text("body")
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        store.write_index({"doc": {"title": "Doc", "path": ["doc.md"]}})
+    finally:
+        os.chdir(cwd)
+
+    assert store.get_by_path("doc.md", "title") == "Doc"
+    assert store.get_by_path("doc.md", "path.0") == "doc.md"
+    assert store.ids_for_paths(["doc.md", "nope.md"]) == {"doc.md": "doc"}
+    assert store.stored_digests(["doc", "other"]) == {
+        "doc": {"doc.md": hashlib.sha1(b"body").hexdigest()}
+    }
+
+    store.delete(["doc"])
+    assert store.get_document("doc") is None
+    assert store.get_by_path("doc.md", "title") is None
+    assert "doc" not in store.known_ids()
+
+
+def test_store_streams_batches(store):
+    documents = ((f"d{i}", {"title": f"T{i}", "n": i}) for i in range(7))
+
+    assert store.write_index(documents, batch_size=2, workers=2) == 1
+
+    assert store.known_ids() == {f"d{i}" for i in range(7)}
+    assert store.get_document("d6") == {"title": "T6", "n": 6}
+    assert store.keys_written == 14
+
+
+def test_store_publishes_fingerprint_with_documents(store):
+    assert store.fingerprint() is None
+    store.write_index({"doc": {"title": "Doc"}}, fingerprint="f1")
+    assert store.fingerprint() == "f1"
+
+    store.write_index({"doc": {"title": "New"}})
+    store.delete(["doc"])
+    assert store.fingerprint() == "f1"
+
+
+def test_flatten_index_round_trips_and_maps_sources(tmp_path, monkeypatch):
+    (tmp_path / "doc.md").write_text("body")
+    monkeypatch.chdir(tmp_path)
+    index = {"doc": dict(INDEX["doc"], path=["doc.md"])}
+
+    pairs = dict(flatten_index(index))
+
+    assert pairs["doc.title"] == "Doc"
+    assert pairs["doc.md"] == "doc"
+    assert pairs["doc.sha1.doc.md"] == hashlib.sha1(b"body").hexdigest()
+    fields = {
+        k: v
+        for k, v in pairs.items()
+        if k.startswith("doc.") and not k.startswith("doc.sha1.") and k != "doc.md"
+    }
+    assert unflatten_document("doc.", list(fields), list(fields.values())) == index["doc"]
+
+
+def _reader(store):
+    if isinstance(store, RedisMetadataStore):
+        return RedisMetadataStore(store.conn)
+    return SqliteMetadataStore(store.path)
+
+
+def test_store_reader_keeps_its_generation(store):
+    store.write_index({"doc": {"title": "Old"}, "gone": {"title": "Gone"}})
+    reader = _reader(store)
+    assert reader.get_document("doc") == {"title": "Old"}
+
+    store.write_index({"doc": {"title": "New"}})
+    store.delete(["gone"])
+
+    assert reader.get_many(["doc", "gone"]) == [{"title": "Old"}, {"title": "Gone"}]
+    assert reader.known_ids() == {"doc", "gone"}
+    assert reader.generation() == "3"
+    reader.refresh()
+    assert reader.get_many(["doc", "gone"]) == [{"title": "New"}, None]
+    assert reader.known_ids() == {"doc"}
+
+
+def test_redis_collects_retired_generations():
+    conn = fakeredis.FakeRedis(decode_responses=True)
+    store = RedisMetadataStore(conn, grace_period=0)
+    reader = RedisMetadataStore(conn)
+    store.write_index({"doc": {"title": "Old"}})
+    assert reader.get_document("doc") == {"title": "Old"}
+
+    store.write_index({"doc": {"title": "New"}})
+    assert conn.keys("g1:*") == []
+    # A reader whose generation was collected moves to the current one.
+    assert reader.get_document("doc") == {"title": "New"}
+
+    abandoned = store._next_generation()
+    conn.set(f"g{abandoned}:doc.title", "Partial")
+    assert store.collect_garbage() == 1
+    assert conn.get(f"g{abandoned}:doc.title") is None
+    assert reader.get_document("doc") == {"title": "New"}
+
+
+def test_redis_reads_index_written_before_generations():
+    """The key layout of update-index before generations stays readable."""
+    conn = fakeredis.FakeRedis(decode_responses=True)
+    conn.mset(
+        {
+            "doc.id": "doc",
+            "doc.title": "Doc",
+            "doc.link.id": "elsewhere",
+            "doc.path.0": "src/doc.md",
+            "doc.sha1.src/doc.md": hashlib.sha1(b"body").hexdigest(),
+            "src/doc.md": "doc",
+            "other.id": "other",
+            "other.weight": "3",
+        }
+    )
+    store = RedisMetadataStore(conn)
+
+    assert store.snapshot().legacy
+    assert store.known_ids() == {"doc", "other"}
+    assert store.get_document("other") == {"id": "other", "weight": 3}
+    assert store.get_by_path("src/doc.md", "title") == "Doc"
+
+    # A published generation is never read as legacy, even when empty.
+    store.write_index({"new": {"title": "New"}})
+    store.delete(["new"])
+    assert not store.snapshot().legacy
+    assert store.known_ids() == frozenset()
+    assert store.get_document("other") is None
+
+
+def test_sqlite_generation_increments(tmp_path):
+    store = SqliteMetadataStore(tmp_path / "metadata.sqlite")
+    store.write_index({"doc": {"title": "One"}})
+    assert store.write_index({"doc": {"title": "Two"}}) == 2
+    assert store.get_document("doc") == {"title": "Two"}
+
+
+def test_open_store_unknown_backend():
+    with pytest.raises(SystemExit):
+        open_store("lmdb")
+
+
+def test_update_index_sqlite_backend(tmp_path, monkeypatch):
+    idx = tmp_path / "index.json"
+    idx.write_text(json.dumps(INDEX))
+    db = tmp_path / "metadata.sqlite"
+
+    def no_redis(*a, **kw):
+        raise AssertionError("redis used")
+
+    monkeypatch.setattr(update_index.redis, "Redis", no_redis)
+    update_index.main([str(idx), "--backend", "sqlite", "--db", str(db)])
+
+    monkeypatch.setattr(metadata, "metadata_store", open_store("sqlite", path=db))
+    monkeypatch.setattr(metadata, "_metadata_cache", {})
+    monkeypatch.setattr(metadata, "_index_state", None)
+    assert metadata.get_metadata("doc") == INDEX["doc"]
+    assert metadata.get_cached_metadata("other")["weight"] == 3
+    assert metadata.get_metadata_many(["doc", "nope"])["nope"] is None
@@ -33,7 +33,7 @@ def test_load_metadata_adds_missing_id(monkeypatch):
         nginx_permalinks, "get_metadata_by_path", lambda fp, key: "doc"
     )
     monkeypatch.setattr(
-        nginx_permalinks, "build_from_redis", lambda prefix: {"url": "/doc.html"}
+        nginx_permalinks, "get_metadata", lambda name: {"url": "/doc.html"}
     )
 
     meta = nginx_permalinks._load_metadata("doc.md")
@@ -19,9 +19,10 @@ def test_generate_rule_basic(tmp_path, monkeypatch):
         "\t$(call status,Preprocess $<)\n"
         "\t$(Q)mkdir -p $(dir build/foo/bar.yml)\n"
         "\t$(Q)cp $< $@; process-yaml $@\n"
-        "build/foo/bar.html: build/foo/bar.md build/foo/bar.yml $(HTML_TEMPLATE) | $(BUILD_DIR)/.update-index\n"
-        "\t$(call status,Generate HTML $@)\n"
-        "\t$(Q)render-html $(HTML_TEMPLATE) build/foo/bar.md build/foo/bar.yml $@"
+        "build/foo/bar.html.stamp: build/foo/bar.md build/foo/bar.yml $(HTML_TEMPLATE) | $(BUILD_DIR)/.update-index\n"
+        "\t$(call status,Generate HTML build/foo/bar.html)\n"
+        "\t$(Q)render-html $(HTML_TEMPLATE) build/foo/bar.md build/foo/bar.yml build/foo/bar.html\n"
+        "\t$(Q)touch $@"
     )
     assert rule == expected
     assert "render-html" in rule
@@ -48,9 +49,10 @@ def test_generate_rule_with_template(tmp_path, monkeypatch):
         "\t$(call status,Preprocess $<)\n"
         "\t$(Q)mkdir -p $(dir build/foo/bar.yml)\n"
         "\t$(Q)cp $< $@; process-yaml $@\n"
-        "build/foo/bar.html: build/foo/bar.md build/foo/bar.yml src/templates/blog/template.html.jinja | $(BUILD_DIR)/.update-index\n"
-        "\t$(call status,Generate HTML $@)\n"
-        "\t$(Q)render-html src/templates/blog/template.html.jinja build/foo/bar.md build/foo/bar.yml $@"
+        "build/foo/bar.html.stamp: build/foo/bar.md build/foo/bar.yml src/templates/blog/template.html.jinja | $(BUILD_DIR)/.update-index\n"
+        "\t$(call status,Generate HTML build/foo/bar.html)\n"
+        "\t$(Q)render-html src/templates/blog/template.html.jinja build/foo/bar.md build/foo/bar.yml build/foo/bar.html\n"
+        "\t$(Q)touch $@"
     )
     assert rule == expected
     assert "render-html" in rule
@@ -371,3 +373,118 @@ def test_main_prints_dependencies(tmp_path, capsys, monkeypatch):
     picasso.main(["--src", str(src), "--build", str(build)])
     out = capsys.readouterr().out
     assert "build/index.md: build/quickstart.md" in out
+
+
+def test_collect_ids_with_jobs(tmp_path, monkeypatch):
+    """Worker processes yield the same ids, including for bad YAML."""
+    src = tmp_path / "src"
+    src.mkdir()
+    monkeypatch.chdir(tmp_path)
+    (src / "bad.yml").write_text(":\n- [")
+    for i in range(5):
+        (src / f"doc{i}.yml").write_text(f"id: spam{i}\n")
+
+    src = Path("src")
+    assert picasso.collect_ids(src, jobs=2) == picasso.collect_ids(src)
+    assert set(picasso.collect_ids(src, jobs=2)) == {"bad"} | {
+        f"spam{i}" for i in range(5)
+    }
+
+
+def test_main_batch_emits_one_rule_per_shard(tmp_path, capsys, monkeypatch):
+    """--batch renders each directory shard with a single render-html call."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("a", "b", "c", "blog/d"):
+        path = tmp_path / "src" / f"{name}.yml"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("{}")
+    monkeypatch.setattr(picasso, "load_metadata_pair", lambda path: None)
+
+    picasso.main(["--batch", "--shard-size", "2"])
+    out = capsys.readouterr().out
+
+    assert "render-html $(HTML_TEMPLATE)" not in out
+    assert out.count("build/a.yml: src/a.yml") == 1
+    assert out.count("| render-html --batch - --stale-only") == 3
+    assert (
+        "build/a.html.stamp build/b.html.stamp &: build/a.md build/a.yml $(HTML_TEMPLATE) "
+        "build/b.md build/b.yml | $(BUILD_DIR)/.update-index"
+    ) in out
+    assert "build/blog/d.html.stamp &: build/blog/d.md" in out
+    assert "\t$(Q)touch build/a.html.stamp build/b.html.stamp" in out
+    assert "Generate HTML batch build (2/2)" in out
+    assert (
+        '\t  \'{"template": "$(HTML_TEMPLATE)", "markdown": "build/c.md", '
+        '"context": "build/c.yml", "output": "build/c.html"}\' \\\n'
+    ) in out
+
+
+def test_write_rules_writes_one_fragment_per_source(tmp_path, monkeypatch):
+    """Each fragment is made from its own source; links resolve through ids."""
+    monkeypatch.chdir(tmp_path)
+    src = Path("src")
+    build = Path("build")
+    rules = build / ".rules"
+    (src / "blog").mkdir(parents=True)
+    (src / "parts").mkdir()
+    (src / "parts" / "a.md").write_text("A")
+    (src / "index.yml").write_text("id: index\n")
+    (src / "index.md").write_text(
+        '{{"post"|link}} {{"later"|link}}\n```python\ninclude("parts")\n```\n'
+    )
+    (src / "blog" / "post.yml").write_text("id: post\n")
+    (src / "other.md").write_text("---\nid: other\n---\n")
+
+    fragments = picasso.write_rules(src, build, rules)
+    assert fragments == [
+        rules / "pages/blog/post.mk",
+        rules / "pages/index.mk",
+        rules / "pages/other.mk",
+        rules / "pages/parts/a.mk",
+    ]
+    assert (rules / "pages/index.mk").read_text() == (
+        "pie_id_index := src/index.md src/index.yml\n"
+        + picasso.generate_rule(src / "index.yml", src, build, {})
+        + "\nbuild/index.md: $$(value pie_id_later)"
+        + "\nbuild/index.md: $$(value pie_id_post)"
+        + "\nbuild/index.md: build/parts/a.md"
+        + "\nbuild/.rules/pages/index.mk: src/parts\n"
+    )
+    assert (rules / "pages/other.mk").read_text() == "pie_id_other := src/other.md\n"
+    assert "render-html" in (rules / "pages/blog/post.mk").read_text()
+
+    parsed = []
+    load = picasso.load_metadata_pairs
+    monkeypatch.setattr(
+        picasso,
+        "load_metadata_pairs",
+        lambda paths, **kw: parsed.extend(paths) or load(paths, **kw),
+    )
+    text = (rules / "pages/index.mk").read_text()
+    (src / "blog" / "post.yml").write_text("id: post\ntitle: Post\n")
+    assert picasso.write_rules(src, build, rules, [src / "blog" / "post.yml"]) == [
+        rules / "pages/blog/post.mk"
+    ]
+    assert parsed == [src / "blog" / "post.yml"]
+    assert (rules / "pages/index.mk").read_text() == text
+
+
+def test_id_variable_escapes_characters_make_rejects():
+    assert picasso.id_variable("a-b_c.1") == "pie_id_a-b_c.1"
+    assert picasso.id_variable("a b:c+é") == "pie_id_a+20b+3Ac+2B+C3+A9"
+
+
+def test_main_rules_batch_writes_directory_fragments(tmp_path, monkeypatch):
+    """--rules --batch leaves rendering to one fragment per directory."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    Path("src/doc.yml").write_text("{}")
+    Path("src/a.yml").write_text("{}")
+
+    picasso.main(["--rules", "build/.rules", "--batch", "src/a.yml", "src"])
+    page = Path("build/.rules/pages/a.mk").read_text()
+    assert page.startswith("pie_id_a := src/a.yml\n")
+    assert "render-html" not in page
+    assert not Path("build/.rules/pages/doc.mk").exists()
+    batch = Path("build/.rules/batch/src.mk").read_text()
+    assert "build/a.html.stamp build/doc.html.stamp &:" in batch
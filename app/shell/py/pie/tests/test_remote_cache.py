@@ -0,0 +1,83 @@
+import hashlib
+import json
+import threading
+import urllib.request
+
+import pytest
+
+from pie import remote_cache
+from pie.cache_server import CacheServer
+from pie.remote_cache import RemoteCache
+from pie.render.cache import RenderCache
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = CacheServer(("127.0.0.1", 0), tmp_path / "server", 1 << 20)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def test_remote_cache_round_trip(server):
+    client = RemoteCache(_url(server), connections=2)
+    data = b"<p>hi</p>"
+    digest = hashlib.sha1(data).hexdigest()
+
+    assert client.get("cas", digest) is None
+    assert client.put("cas", digest, data)
+    assert client.get("cas", digest) == data
+    assert not client.put("cas", "0" * 40, data)
+    client.put_later("ac", "1" * 40, b"[]")
+    client.flush()
+    assert client.get("ac", "1" * 40) == b"[]"
+
+    # Every request went over one kept-alive connection.
+    assert client._idle.qsize() == 1
+    assert client.stats()["hits"] == 2
+    assert client.stats()["uploads"] == 2
+    with urllib.request.urlopen(_url(server) + "/status") as response:
+        counts = json.load(response)
+    assert counts == {"evictions": 0, "hits": 2, "misses": 1, "puts": 2, "rejected": 1}
+
+
+def test_unreachable_remote_cache_is_ignored(server):
+    url = _url(server)
+    server.shutdown()
+    server.server_close()
+    client = RemoteCache(url, timeout=1)
+    for _ in range(5):
+        assert client.get("ac", "1" * 40) is None
+    assert not client.available
+    assert client.errors == remote_cache.MAX_FAILURES
+
+
+def test_render_cache_shares_pages_through_the_server(tmp_path, server, monkeypatch):
+    monkeypatch.delenv("PIE_NO_CACHE", raising=False)
+    monkeypatch.setenv("PIE_REMOTE_CACHE", _url(server))
+    data = tmp_path / "data.json"
+    data.write_text("{}")
+
+    first = RenderCache(tmp_path / "first")
+    first.store("a" * 40, "<p>", [str(data)], [])
+    first.remote.flush()
+
+    second = RenderCache(tmp_path / "second")
+    assert second.restore("a" * 40, tmp_path / "a.html") == [str(data)]
+    assert (tmp_path / "a.html").read_text() == "<p>"
+    assert (second.hits, second.remote_hits) == (1, 1)
+    # The entry is now local too.
+    assert second.restore("a" * 40, tmp_path / "b.html") == [str(data)]
+    assert second.remote_hits == 1
+
+    data.write_text("[]")
+    assert RenderCache(tmp_path / "third").restore("a" * 40, tmp_path / "c.html") is None
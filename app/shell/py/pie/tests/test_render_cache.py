@@ -0,0 +1,157 @@
+import hashlib
+import importlib
+import os
+
+import pytest
+
+from pie import metadata
+from pie.dependencies import read_depfile
+from pie.render.cache import SHARDS, RenderCache
+
+
+@pytest.fixture
+def html(tmp_path, monkeypatch):
+    monkeypatch.delenv("PIE_NO_CACHE", raising=False)
+    monkeypatch.setenv("PIE_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("PIE_CACHE_DIR", str(tmp_path / "build" / ".cache"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "macros.jinja").write_text("{% macro anchor(id) %}{% endmacro %}")
+    (tmp_path / "page.jinja").write_text(
+        "<main>{% include 'partial.jinja' %}{% include markdown_path %}</main>"
+    )
+    (tmp_path / "partial.jinja").write_text("one ")
+    (tmp_path / "a.md").write_text("a")
+    (tmp_path / "ctx.yml").write_text("")
+    from pie.render import jinja as jinja_module
+
+    importlib.reload(jinja_module)
+    from pie.render import html as html_module
+
+    importlib.reload(html_module)
+    html_module.render_cache = RenderCache(tmp_path / "render-cache")
+    return html_module
+
+
+def test_render_cache_restores_unchanged_pages(tmp_path, html):
+    argv = ["page.jinja", "a.md", "ctx.yml", "a.html"]
+    html.main(argv)
+    assert html.render_cache.stats()["writes"] == 1
+    deps = read_depfile("a.html.d")
+
+    # A clean build restores the page and its depfile without rendering.
+    os.unlink("a.html")
+    os.unlink("a.html.d")
+    html.main(argv)
+    assert (tmp_path / "a.html").read_text() == "<main>one a</main>"
+    assert os.stat("a.html").st_nlink == 1
+    assert read_depfile("a.html.d") == deps
+    assert (html.render_cache.hits, html.render_cache.writes) == (1, 1)
+
+    # Editing an included template misses, and the new output leaves the
+    # cached copy alone.
+    (tmp_path / "partial.jinja").write_text("two ")
+    html.main(argv)
+    assert (tmp_path / "a.html").read_text() == "<main>two a</main>"
+    assert html.render_cache.misses == 2
+    (tmp_path / "partial.jinja").write_text("one ")
+    html.main(argv)
+    assert (tmp_path / "a.html").read_text() == "<main>one a</main>"
+    assert html.render_cache.hits == 2
+
+
+def test_render_cache_survives_outputs_rewritten_in_place(tmp_path, html):
+    argv = ["page.jinja", "a.md", "ctx.yml", "a.html"]
+    html.main(argv)
+    # A minifier rewriting the output must not reach the cached copy.
+    with open("a.html", "w") as f:
+        f.write("<main>minified</main>")
+    os.unlink("a.html.d")
+    html.main(argv)
+    assert (tmp_path / "a.html").read_text() == "<main>one a</main>"
+    assert html.render_cache.hits == 1
+
+    # A damaged entry is dropped and the page rendered again.
+    (entry,) = (tmp_path / "render-cache").glob("*/*.html")
+    entry.write_text("<main>damaged</main>")
+    os.unlink("a.html")
+    html.main(argv)
+    assert (tmp_path / "a.html").read_text() == "<main>one a</main>"
+    assert html.render_cache.stats()["errors"] == 1
+    assert entry.read_text() == "<main>one a</main>"
+
+
+def test_render_cache_is_disabled_by_no_cache(tmp_path, html, monkeypatch):
+    monkeypatch.setenv("PIE_NO_CACHE", "1")
+    html.main(["page.jinja", "a.md", "ctx.yml", "a.html"])
+    assert not (tmp_path / "render-cache").exists()
+
+
+def test_render_cache_checks_metadata_documents(tmp_path, monkeypatch):
+    class Store:
+        digests = {"doc": {"src/doc.yml": "1"}}
+
+        def stored_digests(self, ids):
+            return {i: self.digests[i] for i in ids if i in self.digests}
+
+    store = Store()
+    monkeypatch.setattr(metadata, "metadata_store", store)
+    monkeypatch.delenv("PIE_NO_CACHE", raising=False)
+    data = tmp_path / "data.json"
+    data.write_text("{}")
+    cache = RenderCache(tmp_path / "cache")
+    cache.store("key", "<p>", [str(data)], ["doc"])
+
+    assert cache.restore("key", tmp_path / "a.html") == [str(data)]
+    store.digests = {"doc": {"src/doc.yml": "2"}}
+    assert cache.restore("key", tmp_path / "b.html") is None
+    assert not (tmp_path / "b.html").exists()
+
+
+def test_render_cache_skips_pages_reading_undigested_documents(tmp_path, html, monkeypatch):
+    """Documents without source digests, as from a JSON index, can change
+    unnoticed, so pages reading them are rendered every time."""
+    documents = {"doc": {"title": "Old"}}
+
+    class Store:
+        def get_document(self, doc_id):
+            return documents.get(doc_id)
+
+        def stored_digests(self, ids):
+            return {}
+
+    monkeypatch.setattr(metadata, "metadata_store", Store())
+    (tmp_path / "page.jinja").write_text(
+        "<main>{{ get_desc('doc')['title'] }} {% include markdown_path %}</main>"
+    )
+    argv = ["page.jinja", "a.md", "ctx.yml", "a.html"]
+    html.main(argv)
+    assert (tmp_path / "a.html").read_text() == "<main>Old a</main>"
+    assert html.render_cache.stats()["uncacheable"] == 1
+
+    documents["doc"] = {"title": "New"}
+    os.unlink("a.html")
+    html.main(argv)
+    assert (tmp_path / "a.html").read_text() == "<main>New a</main>"
+    assert html.render_cache.hits == 0
+
+    # Entries stored before such pages were skipped are not restored either.
+    cache = html.render_cache
+    source = cache._path(hashlib.sha1(b"<p>").hexdigest(), ".html")
+    source.parent.mkdir(parents=True, exist_ok=True)
+    source.write_bytes(b"<p>")
+    cache._add_entry("key", {"files": {}, "ids": {"doc": {}}, "output": source.stem})
+    assert cache.restore("key", tmp_path / "b.html") is None
+
+
+def test_trim_removes_least_recently_used_files(tmp_path):
+    cache = RenderCache(tmp_path, max_size=SHARDS * 100)
+    shard = tmp_path / "ab"
+    shard.mkdir()
+    for age, name in enumerate(["new", "mid", "old"]):
+        path = shard / name
+        path.write_bytes(b"x" * 40)
+        os.utime(path, ns=(10**9 * (10 - age),) * 2)
+    cache.trim(shard)
+    assert sorted(p.name for p in shard.iterdir()) == ["mid", "new"]
+    assert cache.evictions == 1
+
@@ -1,4 +1,12 @@
 import importlib
+import io
+import json
+import os
+
+import pytest
+
+from pie.dependencies import read_depfile
+from pie.render import jinja as render_jinja
 
 
 def _load_html(tmp_path, monkeypatch):
@@ -33,7 +41,7 @@ def test_main_renders_file(tmp_path, monkeypatch):
     out = tmp_path / "out.html"
     template = _write_template(tmp_path)
     html = _load_html(tmp_path, monkeypatch)
-    html.env = html.create_env()
+    html.env = render_jinja.create_env()
     monkeypatch.chdir(tmp_path)
     html.main([template.name, "page.md", "ctx.yml", "out.html"])
     assert "bar" in out.read_text(encoding="utf-8")
@@ -50,7 +58,7 @@ def test_main_renders_table(tmp_path, monkeypatch):
     out = tmp_path / "out.html"
     template = _write_template(tmp_path)
     html = _load_html(tmp_path, monkeypatch)
-    html.env = html.create_env()
+    html.env = render_jinja.create_env()
     monkeypatch.chdir(tmp_path)
     html.main([template.name, "table.md", "ctx.yml", "out.html"])
     text = out.read_text(encoding="utf-8")
@@ -62,7 +70,203 @@ def test_render_page_allows_raw_html(tmp_path, monkeypatch):
     md.write_text("---\n---\n<div>raw</div>", encoding="utf-8")
     template = _write_template(tmp_path)
     html = _load_html(tmp_path, monkeypatch)
-    html.env = html.create_env()
+    html.env = render_jinja.create_env()
     monkeypatch.chdir(tmp_path)
     rendered = html.render_page(template.name, "raw.md")
     assert "<div>raw</div>" in rendered
+
+
+def _write_pages(tmp_path, names):
+    manifest = []
+    for name in names:
+        (tmp_path / f"{name}.md").write_text(f"---\n---\n{{{{ {name} }}}}", encoding="utf-8")
+        (tmp_path / f"{name}.yml").write_text(f"{name}: value-{name}", encoding="utf-8")
+        manifest.append(
+            {
+                "template": "template.html.jinja",
+                "markdown": f"{name}.md",
+                "context": f"{name}.yml",
+                "output": f"{name}.html",
+            }
+        )
+    return manifest
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_main_batch_renders_manifest(tmp_path, monkeypatch, jobs):
+    _write_template(tmp_path)
+    manifest = _write_pages(tmp_path, ["a", "b"])
+    # Lists in template/markdown/context/output order work too.
+    manifest.append(list(_write_pages(tmp_path, ["c"])[0].values()))
+    (tmp_path / "pages.jsonl").write_text(
+        "\n".join(json.dumps(entry) for entry in manifest) + "\n\n",
+        encoding="utf-8",
+    )
+    html = _load_html(tmp_path, monkeypatch)
+    monkeypatch.chdir(tmp_path)
+
+    html.main(["--batch", "pages.jsonl", "--jobs", jobs])
+
+    for name in "abc":
+        assert f"value-{name}" in (tmp_path / f"{name}.html").read_text(encoding="utf-8")
+    (tmp_path / "a.md").write_text("---\n---\n{{ a }}!", encoding="utf-8")
+    jobs_list = html.read_manifest("pages.jsonl")
+    counts = html.render_batch(jobs_list, jobs=int(jobs))
+    assert counts == {"rendered": 3, "unchanged": 2, "skipped": 0, "failed": 0}
+
+
+def test_main_batch_reports_failures_and_skips_fresh_pages(tmp_path, monkeypatch):
+    _write_template(tmp_path)
+    manifest = _write_pages(tmp_path, ["a", "b", "c"])
+    (tmp_path / "b.md").write_text("---\n---\n{{ undefined_name }}", encoding="utf-8")
+    (tmp_path / "c.html").write_text("fresh", encoding="utf-8")
+    (tmp_path / "c.html.d").write_text("c.html.stamp:\n", encoding="utf-8")
+    later = os.stat(tmp_path / "c.yml").st_mtime_ns + 10**9
+    os.utime(tmp_path / "c.html.d", ns=(later, later))
+    html = _load_html(tmp_path, monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    stdin = io.StringIO("\n".join(json.dumps(entry) for entry in manifest))
+    monkeypatch.setattr(html.sys, "stdin", stdin)
+
+    with pytest.raises(SystemExit):
+        html.main(["--batch", "-", "--stale-only"])
+
+    assert "value-a" in (tmp_path / "a.html").read_text(encoding="utf-8")
+    assert not (tmp_path / "b.html").exists()
+    assert (tmp_path / "c.html").read_text(encoding="utf-8") == "fresh"
+
+
+def test_parse_args_batch_excludes_positionals(tmp_path, monkeypatch):
+    html = _load_html(tmp_path, monkeypatch)
+    with pytest.raises(SystemExit):
+        html.parse_args(["--batch", "pages.jsonl", "template.html.jinja"])
+    with pytest.raises(SystemExit):
+        html.parse_args(["template.html.jinja", "page.md"])
+
+
+def test_main_writes_depfile_from_metadata_reads(tmp_path, monkeypatch):
+    from pie import metadata
+    from pie.dependencies import read_depfile
+    from pie.store import SqliteMetadataStore
+
+    store = SqliteMetadataStore(tmp_path / "metadata.sqlite")
+    store.write_index(
+        {
+            "b": {"title": "Bee", "path": ["src/b.yml", "src/b.md"]},
+            "c": {"title": "Sea", "path": ["src/c.yml"]},
+        }
+    )
+    monkeypatch.setattr(metadata, "metadata_store", store)
+    metadata.clear_cached_metadata()
+    _write_template(tmp_path)
+    (tmp_path / "toc.yml").write_text("toc: [x]\n", encoding="utf-8")
+    (tmp_path / "a.md").write_text(
+        "---\n---\n{{ get_desc('b').title }} "
+        "{% for item in read_yaml('toc.yml') %}{{ item }}{% endfor %}",
+        encoding="utf-8",
+    )
+    (tmp_path / "a.yml").write_text("", encoding="utf-8")
+    html = _load_html(tmp_path, monkeypatch)
+    monkeypatch.chdir(tmp_path)
+
+    html.main(["template.html.jinja", "a.md", "a.yml", "a.html"])
+
+    assert "Bee x" in (tmp_path / "a.html").read_text(encoding="utf-8")
+    assert read_depfile(tmp_path / "a.html.d") == [
+        "a.md",
+        "macros.jinja",
+        "src/b.md",
+        "src/b.yml",
+        "template.html.jinja",
+        "toc.yml",
+    ]
+
+    # A newer prerequisite from the depfile makes the page stale.
+    job = html.RenderJob("template.html.jinja", "a.md", "a.yml", "a.html")
+    later = os.stat(tmp_path / "a.html.d").st_mtime_ns + 10**9
+    os.utime(tmp_path / "toc.yml", ns=(later, later))
+    assert html.is_stale(job)
+
+
+def test_depfile_lists_transitive_templates(tmp_path, monkeypatch):
+    (tmp_path / "macros.jinja").write_text("{% macro anchor(id) %}{% endmacro %}")
+    (tmp_path / "base.jinja").write_text("<main>{% block body %}{% endblock %}</main>")
+    (tmp_path / "partial.jinja").write_text("{% import 'helpers.jinja' as h %}{{ h.hi() }}")
+    (tmp_path / "helpers.jinja").write_text("{% macro hi() %}hi{% endmacro %}")
+    (tmp_path / "unused.jinja").write_text("unused")
+    (tmp_path / "page.jinja").write_text(
+        "{% extends 'base.jinja' %}{% block body %}{% include 'partial.jinja' %}"
+        "{% include markdown_path %}{% endblock %}"
+    )
+    (tmp_path / "ctx.yml").write_text("")
+    for name in "ab":
+        (tmp_path / f"{name}.md").write_text(name)
+    html = _load_html(tmp_path, monkeypatch)
+    monkeypatch.chdir(tmp_path)
+
+    # The second page reuses the cached templates and still records them.
+    for name in "ab":
+        html.main(["page.jinja", f"{name}.md", "ctx.yml", f"{name}.html"])
+        assert "<main>hi" in (tmp_path / f"{name}.html").read_text()
+        deps = read_depfile(tmp_path / f"{name}.html.d")
+        assert deps == sorted(
+            [
+                "base.jinja",
+                "helpers.jinja",
+                "macros.jinja",
+                f"{name}.md",
+                "page.jinja",
+                "partial.jinja",
+            ]
+        )
+
+
+def test_templates_graph_report(tmp_path, monkeypatch, capsys):
+    from pie.render import templates
+
+    (tmp_path / "macros.jinja").write_text("{% macro anchor(id) %}{% endmacro %}")
+    (tmp_path / "page.jinja").write_text(
+        "{% extends 'base.jinja' %}{% include name %}"
+    )
+    (tmp_path / "base.jinja").write_text("base")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "a.html.d").write_text("build/a.html: \\\n base.jinja\n")
+    _load_html(tmp_path, monkeypatch)
+    monkeypatch.chdir(tmp_path)
+
+    templates.main(["graph"])
+    lines = capsys.readouterr().out.splitlines()
+    assert "base.jinja  (1 pages)" in lines
+    page = lines.index("page.jinja  (0 pages)")
+    assert lines[page + 1 : page + 3] == ["  -> (dynamic)", "  -> base.jinja"]
+    templates.main(["graph", "--format", "dot", "--build", "none"])
+    assert '"page.jinja" -> "base.jinja";' in capsys.readouterr().out
+
+
+def test_write_page_streams_and_skips_unchanged_output(tmp_path, monkeypatch):
+    (tmp_path / "macros.jinja").write_text("{% macro anchor(id) %}{% endmacro %}")
+    (tmp_path / "rows.html.jinja").write_text(
+        "{% for i in range(n) %}<tr><td>{{ i }}</td></tr>\n{% endfor %}"
+    )
+    (tmp_path / "page.md").write_text("---\nn: 3\n---\n")
+    html = _load_html(tmp_path, monkeypatch)
+    html.env = render_jinja.create_env()
+    monkeypatch.chdir(tmp_path)
+    job = html.RenderJob("rows.html.jinja", "page.md", None, "out.html")
+
+    assert html.write_page(job) is True
+    out = tmp_path / "out.html"
+    assert out.read_text().count("<tr>") == 3
+    inode = out.stat().st_ino
+    os.utime(out, ns=(0, 0))
+    os.utime(tmp_path / "out.html.d", ns=(0, 0))
+
+    assert html.write_page(job) is False
+    assert out.stat().st_ino == inode
+    assert out.stat().st_mtime_ns == 0
+    assert (tmp_path / "out.html.d").stat().st_mtime_ns > 0
+
+    (tmp_path / "page.md").write_text("---\nn: 4\n---\n")
+    html.write_page(job)
+    assert out.read_text().count("<tr>") == 4
+    assert sorted(p.name for p in tmp_path.glob("out.html*")) == ["out.html", "out.html.d"]
@@ -1,5 +1,6 @@
 
 import json
+import os
 import runpy
 import sys
 from pathlib import Path
@@ -93,3 +94,102 @@ def test_render_press_renders_footnotes():
     html = jinja.render_press(text)
     assert '<section class="footnotes"' in str(html)
 
+
+
+def test_bytecode_cache_shares_compiled_templates(tmp_path, monkeypatch):
+    monkeypatch.delenv("PIE_NO_CACHE", raising=False)
+    monkeypatch.setenv("PIE_DATA_DIR", str(tmp_path))
+    (tmp_path / "macros.jinja").write_text("{% macro anchor(id) %}{% endmacro %}")
+    page = tmp_path / "page.jinja"
+    page.write_text("one")
+    cache_dir = tmp_path / "cache"
+
+    first = jinja.BytecodeCache(cache_dir)
+    assert jinja.create_env(first).get_template("page.jinja").render() == "one"
+    assert (first.hits, first.writes) == (0, 2)
+
+    second = jinja.BytecodeCache(cache_dir)
+    assert jinja.create_env(second).get_template("page.jinja").render() == "one"
+    assert (second.hits, second.misses, second.writes) == (2, 0, 0)
+
+    page.write_text("two")
+    third = jinja.BytecodeCache(cache_dir)
+    assert jinja.create_env(third).get_template("page.jinja").render() == "two"
+    assert (third.hits, third.misses) == (1, 1)
+
+    monkeypatch.setenv("PIE_NO_CACHE", "1")
+    off = jinja.BytecodeCache(tmp_path / "off")
+    jinja.create_env(off).get_template("page.jinja")
+    assert not (tmp_path / "off").exists()
+
+
+@pytest.mark.parametrize("zip", [False, True])
+def test_compiled_templates_fall_back_to_changed_sources(tmp_path, monkeypatch, zip):
+    from pie.render import templates
+
+    monkeypatch.delenv("PIE_NO_CACHE", raising=False)
+    monkeypatch.setenv("PIE_DATA_DIR", str(tmp_path))
+    (tmp_path / "macros.jinja").write_text("{% macro anchor(id) %}{% endmacro %}")
+    page = tmp_path / "page.jinja"
+    page.write_text("one")
+    compiled = tmp_path / ("templates.zip" if zip else "templates")
+    monkeypatch.setenv("PIE_COMPILED_TEMPLATES", str(compiled))
+    templates.main(["compile"] + (["--zip"] if zip else []))
+    (tmp_path / "new.jinja").write_text("new")
+
+    env = jinja.create_env(jinja.BytecodeCache(tmp_path / "cache"))
+    template = env.get_template("page.jinja")
+    assert template.render() == "one"
+    assert template.filename == str(page)
+    assert env.get_template("new.jinja").render() == "new"
+    assert (env.loader.compiled, env.loader.stale) == (2, 0)
+
+    os.utime(page, ns=(0, 0))
+    page.write_text("two")
+    env = jinja.create_env(jinja.BytecodeCache(tmp_path / "cache"))
+    assert env.get_template("page.jinja").render() == "two"
+    assert (env.loader.compiled, env.loader.stale) == (1, 1)
+
+    monkeypatch.setenv("PIE_NO_CACHE", "1")
+    assert isinstance(jinja.create_env().loader, FileSystemLoader)
+
+
+def test_link_memo_evicts_least_recently_used():
+    memo = jinja.LinkMemo(maxsize=2)
+    memo.get(("a",), (), lambda: "A")
+    memo.get(("b",), (), lambda: "B")
+    assert memo.get(("a",), (), lambda: "stale") == "A"
+    memo.get(("c",), (), lambda: "C")
+
+    assert memo.get(("a",), (), lambda: "stale") == "A"
+    assert memo.get(("b",), (), lambda: "B2") == "B2"
+    assert memo.stats() == {
+        "size": 2,
+        "hits": 2,
+        "misses": 4,
+        "evictions": 2,
+        "hit_rate": 0.333,
+    }
+
+
+def test_render_link_memoized_per_document(monkeypatch):
+    docs = {"ref": {"url": "/ref", "doc": {"citation": "a guide to it"}}}
+    monkeypatch.setattr(jinja, "get_cached_metadata", lambda name: docs[name])
+    monkeypatch.setattr(jinja, "link_memo", jinja.LinkMemo())
+    formatted = []
+    format_link = jinja._format_link
+    monkeypatch.setattr(
+        jinja, "_format_link", lambda *a: formatted.append(a[1]) or format_link(*a)
+    )
+
+    assert jinja.linktitle("ref") == jinja.linktitle("ref")
+    assert ">a Guide to It<" in jinja.linktitle("ref")
+    jinja.linkcap("ref")
+    assert formatted == ["title", "cap"]
+    assert jinja.cite("ref") == jinja.cite("ref")
+    assert jinja.link_memo.stats()["hits"] == 3
+
+    # A new generation loads new documents; the links are rendered again.
+    docs["ref"] = {"url": "/new", "doc": {"citation": "a guide to it"}}
+    assert 'href="/new"' in jinja.linktitle("ref")
+    assert formatted == ["title", "cap", "plain", "title"]
@@ -6,6 +6,7 @@ import pytest
 
 from pie.render import jinja as render_template
 from pie import metadata
+from pie.store.flatten import convert_lists
 
 
 def test_get_redis_value_initialises(monkeypatch):
@@ -58,7 +59,7 @@ def test_build_from_redis_initialises(monkeypatch):
 def test_convert_lists():
     """Nested dict with numeric keys -> lists."""
     obj = {"0": {"0": "x", "1": "y"}, "1": [{"0": "z"}]}
-    assert metadata._convert_lists(obj) == [["x", "y"], [["z"]]]
+    assert convert_lists(obj) == [["x", "y"], [["z"]]]
 
 
 def test_get_cached_metadata_caches(monkeypatch):
@@ -1,3 +1,5 @@
+import os
+
 from pie import sitemap
 
 
@@ -26,6 +28,20 @@ def test_generates_urls_without_index_html(tmp_path):
     assert content == expected
 
 
+def test_unchanged_sitemap_is_kept(tmp_path):
+    build = tmp_path / "build"
+    build.mkdir()
+    (build / "index.html").write_text("", encoding="utf-8")
+    sitemap.main([str(build), "http://example.com"])
+    output = build / "sitemap.xml"
+    inode = output.stat().st_ino
+    os.utime(output, ns=(0, 0))
+
+    sitemap.main([str(build), "http://example.com"])
+    assert output.stat().st_ino == inode
+    assert output.stat().st_mtime_ns == 0
+
+
 def test_reads_base_url_from_env(tmp_path, monkeypatch):
     build = tmp_path / "build"
     build.mkdir()
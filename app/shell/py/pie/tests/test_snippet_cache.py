@@ -0,0 +1,68 @@
+from jinja2 import Environment
+
+import pie.metadata
+from pie.dependencies import record_dependencies, record_document, record_file
+from pie.render import jinja
+from pie.render.jinja.snippets import SnippetCache
+
+
+class GenerationStore:
+    def __init__(self):
+        self.current = "g1"
+
+    def generation(self):
+        return self.current
+
+
+def test_render_jinja_compiles_each_snippet_once(monkeypatch):
+    cache = SnippetCache(maxsize=2)
+    monkeypatch.setattr(jinja, "snippet_cache", cache)
+    compiled = []
+    from_string = jinja.env.from_string
+    monkeypatch.setattr(
+        jinja.env, "from_string", lambda s: compiled.append(s) or from_string(s)
+    )
+    for _ in range(3):
+        assert jinja.render_jinja("{{ 1 + 1 }}") == "2"
+    assert compiled == ["{{ 1 + 1 }}"]
+    assert cache.stats()["hits"] == 2
+
+    jinja.render_jinja("a")
+    jinja.render_jinja("b")
+    jinja.render_jinja("{{ 1 + 1 }}")
+    assert len(compiled) == 4  # evicted least recently used
+
+
+def test_snippet_results_cached_for_metadata_only(monkeypatch):
+    store = GenerationStore()
+    monkeypatch.setattr(pie.metadata, "get_store", lambda: store)
+    renders = []
+
+    def lookup(doc_id):
+        renders.append(doc_id)
+        record_document(doc_id, {"path": [f"src/{doc_id}.yml"]})
+        return doc_id.upper()
+
+    def read(path):
+        record_file(path)
+        return path
+
+    env = Environment()
+    env.globals.update(lookup=lookup, read=read)
+    cache = SnippetCache(results=True, check_interval=0)
+
+    for _ in range(2):
+        with record_dependencies() as deps:
+            assert cache.render(env, "{{ lookup('a') }}") == "A"
+        assert deps.ids == {"a"} and deps.files == {"src/a.yml"}
+    assert renders == ["a"]
+    assert cache.stats()["result_hits"] == 1
+
+    cache.render(env, "{{ read('data.json') }}{{ lookup('b') }}")
+    cache.render(env, "{{ read('data.json') }}{{ lookup('b') }}")
+    assert renders == ["a", "b", "b"]
+
+    store.current = "g2"
+    cache.render(env, "{{ lookup('a') }}")
+    assert renders == ["a", "b", "b", "a"]
+    assert cache.stats()["invalidations"] == 1
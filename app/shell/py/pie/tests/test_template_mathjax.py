@@ -3,6 +3,8 @@ import importlib
 from bs4 import BeautifulSoup
 from jinja2 import Undefined
 
+from pie.render import jinja as render_jinja
+
 
 def _load_html(tmp_path, monkeypatch):
     monkeypatch.setenv("PIE_DATA_DIR", str(tmp_path))
@@ -34,7 +36,7 @@ def _setup_template(tmp_path, monkeypatch):
         "html": {"scripts": []},
     }
     html = _load_html(tmp_path, monkeypatch)
-    html.env = html.create_env()
+    html.env = render_jinja.create_env()
     html.env.undefined = Undefined
     monkeypatch.chdir(tmp_path)
     return html, template.name, md.name, ctx
@@ -1,4 +1,8 @@
 import json
+import os
+import stat
+
+import pytest
 
 from pie import utils
 
@@ -30,3 +34,76 @@ def test_load_exclude_file_patterns(tmp_path):
     assert (tmp_path / "a.md") in exclude
     assert (tmp_path / "note.txt") in exclude
     assert (tmp_path / "error.log") in exclude
+
+
+def test_batched_splits_lazily():
+    items = iter(range(5))
+    batches = utils.batched(items, 2)
+    assert next(batches) == [0, 1]
+    assert next(items) == 2
+    assert list(batches) == [[3, 4]]
+
+
+def test_write_utf8_chunks_replaces_only_changed_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "write_stats", utils.WriteStats())
+    path = tmp_path / "page.html"
+    assert utils.write_utf8_chunks(iter(["<p>", "π", "</p>"]), str(path)) is True
+    assert path.read_text(encoding="utf-8") == "<p>π</p>"
+    inode = path.stat().st_ino
+    os.utime(path, ns=(0, 0))
+
+    assert utils.write_utf8_chunks(["<p>π", "</p>"], str(path)) is False
+    assert path.stat().st_ino == inode
+    assert path.stat().st_mtime_ns == 0
+
+    assert utils.write_utf8_chunks(["<p>x</p>"], str(path)) is True
+    assert path.read_text(encoding="utf-8") == "<p>x</p>"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["page.html"]
+    assert utils.write_stats.stats() == {"written": 2, "skipped": 1, "skip_rate": 0.333}
+
+
+def test_write_utf8_chunks_keeps_mode_and_symlinks(tmp_path):
+    target = tmp_path / "real.html"
+    target.write_text("old", encoding="utf-8")
+    target.chmod(0o640)
+    link = tmp_path / "page.html"
+    link.symlink_to(target.name)
+
+    assert utils.write_utf8_chunks(["new"], str(link)) is True
+    assert link.is_symlink()
+    assert target.read_text(encoding="utf-8") == "new"
+    assert stat.S_IMODE(target.stat().st_mode) == 0o640
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["page.html", "real.html"]
+
+
+def test_writers_skip_unchanged_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "write_stats", utils.WriteStats())
+    data = {"b": 1, "a": "π"}
+    for write, name in (
+        (utils.write_json, "data.json"),
+        (utils.write_yaml, "data.yml"),
+        (utils.write_utf8, "data.txt"),
+    ):
+        path = tmp_path / name
+        value = str(data) if name.endswith(".txt") else data
+        assert write(value, str(path)) is True
+        os.utime(path, ns=(0, 0))
+        assert write(value, str(path)) is False
+        assert path.stat().st_mtime_ns == 0
+    assert utils.read_json(str(tmp_path / "data.json")) == data
+    assert utils.read_yaml(str(tmp_path / "data.yml")) == data
+    assert utils.write_stats.skipped == 3
+
+
+def test_write_utf8_chunks_keeps_file_on_error(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text("old", encoding="utf-8")
+
+    def chunks():
+        yield "new"
+        raise RuntimeError("template failed")
+
+    with pytest.raises(RuntimeError):
+        utils.write_utf8_chunks(chunks(), str(path))
+    assert path.read_text(encoding="utf-8") == "old"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["page.html"]
@@ -0,0 +1,101 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from pie import zygote
+
+ROOT = Path(__file__).resolve().parents[1]
+
+CLIENT = """
+import sys
+from pie import zygote
+status = zygote.call("pie.filter.emojify:main", sys.argv[2:], sys.argv[1])
+sys.stderr.write(f"status={status}\\n")
+"""
+
+
+def _env(**extra):
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("PIE_", "REDIS_"))}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    env.update(extra)
+    return env
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "zygote.sock")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "pie.zygote", "--socket", path, "--preload", "pie.filter.emojify"],
+        env=_env(),
+    )
+    deadline = time.monotonic() + 20
+    while not os.path.exists(path):
+        assert proc.poll() is None and time.monotonic() < deadline
+        time.sleep(0.05)
+    yield path
+    proc.terminate()
+    proc.wait(timeout=10)
+    assert not os.path.exists(path)
+
+
+def _client(path, *argv, stdin="", **env):
+    return subprocess.run(
+        [sys.executable, "-c", CLIENT, path, "emojify", *argv],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        env=_env(**env),
+        cwd=ROOT,
+    )
+
+
+def test_zygote_passes_argv_streams_and_status(server):
+    result = _client(server, ":smile:")
+    assert result.stdout == "😄\n"
+    assert "status=0" in result.stderr
+
+    result = _client(server, stdin=":+1: ok")
+    assert result.stdout == "👍 ok"
+
+    result = _client(server, "--bogus")
+    assert "unrecognized arguments" in result.stderr
+    assert "status=2" in result.stderr
+
+
+def test_zygote_declines_different_environment(server):
+    result = _client(server, ":smile:", PIE_DATA_DIR="/elsewhere")
+    assert result.stdout == ""
+    assert "status=None" in result.stderr
+
+
+def test_call_without_server(tmp_path):
+    assert zygote.call("pie.filter.emojify:main", ["emojify"], str(tmp_path / "none")) is None
+
+
+def test_launch_runs_in_process_without_zygote(monkeypatch, capsys):
+    monkeypatch.delenv("PIE_ZYGOTE", raising=False)
+    monkeypatch.setattr(sys, "argv", ["emojify", ":smile:"])
+    assert zygote.launch("emojify") == 0
+    assert capsys.readouterr().out == "😄\n"
+
+
+def test_socket_path(monkeypatch):
+    monkeypatch.delenv("PIE_ZYGOTE", raising=False)
+    assert zygote.socket_path() is None
+    assert zygote.socket_path("/tmp/x.sock") == "/tmp/x.sock"
+    assert zygote.socket_path("1").endswith(f"pie-zygote-{os.getuid()}.sock")
+
+
+def test_console_scripts_use_launchers():
+    setup = (ROOT / "setup.py").read_text()
+    entries = dict(re.findall(r"'([\w-]+)=(pie\.[\w.]+:\w+)'", setup))
+    assert entries.pop("pie-zygote") == "pie.zygote:main"
+    assert set(entries) == set(zygote.SCRIPTS)
+    for name, target in entries.items():
+        assert target == f"pie.zygote:{name.replace('-', '_')}"
+        assert callable(getattr(zygote, name.replace("-", "_")))
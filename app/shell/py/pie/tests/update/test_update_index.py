@@ -2,16 +2,22 @@ import hashlib
 import json
 import os
 import sys
-import threading
 
 import fakeredis
 import pytest
 from pie import metadata
+from pie.store import RedisMetadataStore, open_store
+from pie.store.redis import (
+    INDEX_CHANNEL,
+    INDEX_DOCS_KEY,
+    INDEX_GENERATION_KEY,
+    INDEX_PATHS_KEY,
+)
 from pie.update import index as update_index
 
 
 def test_main_inserts_keys(tmp_path, monkeypatch):
-    """JSON index -> Redis keys like quickstart.title."""
+    """JSON index -> Redis keys like g1:quickstart.title."""
     index_data = {
         "quickstart": {
             "title": "Quickstart",
@@ -30,10 +36,10 @@ def test_main_inserts_keys(tmp_path, monkeypatch):
 
     update_index.main([str(idx)])
 
-    assert fake.get("quickstart.title") == "Quickstart"
-    assert fake.get("quickstart.url") == "/quickstart.html"
-    assert fake.get("quickstart.meta.subtitle") == "Intro"
-    assert fake.get("quickstart.meta.author.name") == "Alice"
+    assert fake.get("g1:quickstart.title") == "Quickstart"
+    assert fake.get("g1:quickstart.url") == "/quickstart.html"
+    assert fake.get("g1:quickstart.meta.subtitle") == "Intro"
+    assert fake.get("g1:quickstart.meta.author.name") == "Alice"
 
 
 def test_main_handles_arrays(tmp_path, monkeypatch):
@@ -55,10 +61,10 @@ def test_main_handles_arrays(tmp_path, monkeypatch):
 
     update_index.main([str(idx)])
 
-    assert fake.get("quickstart.tags.0") == "foo"
-    assert fake.get("quickstart.tags.1") == "bar"
-    assert fake.get("quickstart.authors.0.name") == "Alice"
-    assert fake.get("quickstart.authors.1.name") == "Bob"
+    assert fake.get("g1:quickstart.tags.0") == "foo"
+    assert fake.get("g1:quickstart.tags.1") == "bar"
+    assert fake.get("g1:quickstart.authors.0.name") == "Alice"
+    assert fake.get("g1:quickstart.authors.1.name") == "Bob"
 
 
 def test_main_directory_processes_yamls(tmp_path, monkeypatch):
@@ -77,10 +83,10 @@ def test_main_directory_processes_yamls(tmp_path, monkeypatch):
     finally:
         os.chdir("/tmp")
 
-    assert fake.get("a.title") == "Foo"
-    assert fake.get("a.url") == "/a.html"
-    assert fake.get("b.title") == "Bar"
-    assert fake.get("b.url") == "/b.html"
+    assert fake.get("g1:a.title") == "Foo"
+    assert fake.get("g1:a.url") == "/a.html"
+    assert fake.get("g1:b.title") == "Bar"
+    assert fake.get("g1:b.url") == "/b.html"
 
 
 def test_main_single_yaml_file(tmp_path, monkeypatch):
@@ -99,8 +105,8 @@ def test_main_single_yaml_file(tmp_path, monkeypatch):
     finally:
         os.chdir("/tmp")
 
-    assert fake.get("item.title") == "Foo"
-    assert fake.get("item.url") == "/item.html"
+    assert fake.get("g1:item.title") == "Foo"
+    assert fake.get("g1:item.url") == "/item.html"
 
 
 def test_main_combines_md_and_yaml(tmp_path, monkeypatch):
@@ -130,9 +136,9 @@ def test_main_combines_md_and_yaml(tmp_path, monkeypatch):
 
     assert messages
 
-    assert fake.get("doc.foo") == "bar"
-    assert fake.get("doc.baz") == "qux"
-    assert fake.get("doc.title") == "Yaml"
+    assert fake.get("g1:doc.foo") == "bar"
+    assert fake.get("g1:doc.baz") == "qux"
+    assert fake.get("g1:doc.title") == "Yaml"
 
 
 def test_main_adds_path_id_mapping(tmp_path, monkeypatch):
@@ -153,8 +159,8 @@ def test_main_adds_path_id_mapping(tmp_path, monkeypatch):
     finally:
         os.chdir("/tmp")
 
-    assert fake.get("src/doc.md") == "doc"
-    assert fake.get("src/doc.yml") == "doc"
+    assert fake.hget(INDEX_PATHS_KEY, "src/doc.md") == "doc"
+    assert fake.hget(INDEX_PATHS_KEY, "src/doc.yml") == "doc"
 
 
 def test_main_missing_id_generates(tmp_path, monkeypatch):
@@ -173,36 +179,28 @@ def test_main_missing_id_generates(tmp_path, monkeypatch):
     finally:
         os.chdir("/tmp")
 
-    assert fake.get("doc.title") == "T"
+    assert fake.get("g1:doc.title") == "T"
 
 
 def test_directory_processed_in_parallel(tmp_path, monkeypatch):
-    """Concurrent processing still populates Redis."""
+    """--jobs parses metadata in worker processes and still populates Redis."""
     src = tmp_path / "src"
     src.mkdir()
-    (src / "a.yml").write_text('{"title": "A"}')
-    (src / "b.yml").write_text('{"title": "B"}')
+    for name in "abcde":
+        (src / f"{name}.yml").write_text(f'{{"title": "{name.upper()}"}}')
 
     fake = fakeredis.FakeRedis(decode_responses=True)
     monkeypatch.setattr(update_index.redis, "Redis", lambda *a, **kw: fake)
 
-    barrier = threading.Barrier(2)
-
-    def fake_loader(path):
-        barrier.wait(timeout=1)
-        base = path.with_suffix("")
-        return {"id": base.name, "title": base.name}
-
-    monkeypatch.setattr(update_index, "load_metadata_pair", fake_loader)
-
     os.chdir(tmp_path)
     try:
-        update_index.main(["src"])
+        update_index.main(["src", "--jobs", "2"])
     finally:
         os.chdir("/tmp")
 
-    assert fake.get("a.title") == "a"
-    assert fake.get("b.title") == "b"
+    assert fake.get("g1:a.title") == "A"
+    assert fake.get("g1:e.title") == "E"
+    assert set(fake.hkeys(INDEX_DOCS_KEY)) == set("abcde")
 
 
 def test_logs_execution_time_and_count(tmp_path, monkeypatch):
@@ -258,3 +256,145 @@ def test_verbose_enables_debug_logging(tmp_path, monkeypatch):
     from pie.logging import LOG_FORMAT
 
     update_index.logger.add(sys.stderr, format=LOG_FORMAT, level="INFO")
+
+
+def test_main_writes_key_manifest(tmp_path, monkeypatch):
+    """Each document gets a g<N>:<id>.__keys__ set of its flattened keys."""
+    idx = tmp_path / "index.json"
+    idx.write_text('{"doc": {"title": "T", "tags": ["a", "b"]}}')
+
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(update_index.redis, "Redis", lambda *a, **kw: fake)
+
+    update_index.main([str(idx)])
+
+    assert fake.smembers("g1:doc.__keys__") == {
+        "g1:doc.title",
+        "g1:doc.tags.0",
+        "g1:doc.tags.1",
+    }
+
+
+def test_main_publishes_generation_and_ids(tmp_path, monkeypatch):
+    """A finished run records known ids and bumps the index generation."""
+    idx = tmp_path / "index.json"
+    idx.write_text('{"a": {"title": "A"}, "b": {"title": "B"}}')
+
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(update_index.redis, "Redis", lambda *a, **kw: fake)
+    pubsub = fake.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(INDEX_CHANNEL)
+
+    update_index.main([str(idx)])
+    update_index.main([str(idx)])
+
+    assert fake.hgetall(INDEX_DOCS_KEY) == {"a": "2", "b": "2"}
+    assert fake.get(INDEX_GENERATION_KEY) == "2"
+    # Superseded versions stay readable for the grace period.
+    assert fake.get("g1:a.title") == "A"
+    messages = [pubsub.get_message(timeout=1) for _ in range(3)]
+    assert [m["data"] for m in messages if m] == ["1", "2"]
+
+
+def _run_incremental(tmp_path, fake, monkeypatch, *extra):
+    loaded = []
+    original = update_index.load_metadata_pair
+
+    def counting(path):
+        loaded.append(path.name)
+        return original(path)
+
+    monkeypatch.setattr(update_index, "load_metadata_pair", counting)
+    monkeypatch.setattr(update_index.redis, "Redis", lambda *a, **kw: fake)
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        update_index.main(["src", *extra])
+    finally:
+        os.chdir(cwd)
+    return loaded
+
+
+def test_main_skips_unchanged_documents(tmp_path, monkeypatch):
+    """A second run only reparses the edited document."""
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.yml").write_text("title: A\ntags: [x, y]\n")
+    (src / "b.yml").write_text("title: B\n")
+    fake = fakeredis.FakeRedis(decode_responses=True)
+
+    assert sorted(_run_incremental(tmp_path, fake, monkeypatch)) == ["a.yml", "b.yml"]
+    assert _run_incremental(tmp_path, fake, monkeypatch) == []
+    assert fake.get(INDEX_GENERATION_KEY) == "1"
+
+    (src / "a.yml").write_text("title: A2\ntags: [x]\n")
+    assert _run_incremental(tmp_path, fake, monkeypatch) == ["a.yml"]
+    assert fake.hgetall(INDEX_DOCS_KEY) == {"a": "2", "b": "1"}
+    assert fake.get("g2:a.title") == "A2"
+    assert fake.get("g2:a.tags.1") is None
+    assert "g2:a.tags.1" not in fake.smembers("g2:a.__keys__")
+    assert fake.get("g1:b.title") == "B"
+
+    assert len(_run_incremental(tmp_path, fake, monkeypatch, "--full")) == 2
+
+
+def test_main_reloads_everything_after_base_url_or_code_change(tmp_path, monkeypatch):
+    """Unchanged sources are reparsed when the fields would come out different."""
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.yml").write_text("title: A\n")
+    (src / "b.yml").write_text("title: B\n")
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setenv("BASE_URL", "http://one.test")
+
+    assert len(_run_incremental(tmp_path, fake, monkeypatch)) == 2
+    assert _run_incremental(tmp_path, fake, monkeypatch) == []
+
+    monkeypatch.setenv("BASE_URL", "http://two.test")
+    assert len(_run_incremental(tmp_path, fake, monkeypatch)) == 2
+    assert fake.get("g2:a.doc.link.canonical") == "http://two.test/a.html"
+    assert _run_incremental(tmp_path, fake, monkeypatch) == []
+
+    monkeypatch.setattr(update_index, "code_digest", lambda: "other code")
+    assert len(_run_incremental(tmp_path, fake, monkeypatch)) == 2
+    assert _run_incremental(tmp_path, fake, monkeypatch) == []
+
+
+def test_main_removes_deleted_documents(tmp_path, monkeypatch):
+    """Documents whose sources disappear are dropped in a new generation."""
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.yml").write_text("title: A\n")
+    (src / "b.yml").write_text("title: B\n")
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    RedisMetadataStore(fake).write_index({"other": {"title": "Other"}})
+
+    _run_incremental(tmp_path, fake, monkeypatch)
+    (src / "b.yml").unlink()
+    _run_incremental(tmp_path, fake, monkeypatch)
+
+    assert fake.get(INDEX_GENERATION_KEY) == "3"
+    assert fake.hgetall(INDEX_DOCS_KEY) == {"a": "2", "other": "1"}
+    assert fake.hget(INDEX_PATHS_KEY, "src/b.yml") is None
+    assert fake.get("g2:b.title") == "B"
+
+    RedisMetadataStore(fake).collect_garbage(0)
+    assert fake.get("g2:b.title") is None
+    assert fake.get("g1:other.title") == "Other"
+
+
+def test_update_store_reports_counts(tmp_path):
+    """added/changed/skipped are counted against known ids while streaming."""
+    store = open_store("sqlite", path=tmp_path / "metadata.sqlite")
+    store.write_index({"a": {"title": "A"}, "b": {"title": "B"}})
+
+    documents = iter([("a", {"title": "A2"}), ("c", {"title": "C"})])
+    counts = update_index.update_store(store, documents, skipped=["b"])
+
+    assert counts == {"added": 1, "changed": 1, "removed": 0, "skipped": 1}
+    assert store.known_ids() == {"a", "b", "c"}
+    assert store.get_document("a") == {"title": "A2"}
+    assert store.generation() == "2"
+
+    update_index.update_store(store, iter([]), skipped=["a", "b", "c"])
+    assert store.generation() == "2"